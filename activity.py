@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Columnar Activity
+Lightweight container for per-second ride data backed by contiguous NumPy
+arrays, with the metric helpers the analysis scripts need. pandas is only
+imported when exporting to a DataFrame.
+"""
+
+from lazy_import import lazy_import
+from datetime import datetime, timedelta
+
+from zones import MAX_SAMPLE_GAP
+
+np = lazy_import('numpy')
+
+
+CHANNELS = (
+    'power',
+    'heart_rate',
+    'cadence',
+    'speed',
+    'altitude',
+    'temperature',
+    'torque_effectiveness',
+)
+
+CHANNEL_DTYPE = 'float32'
+
+UNIX_EPOCH = datetime(1970, 1, 1)
+
+# int64 minimum, NumPy's NaT
+NAT = -2 ** 63
+
+# How resample() treats pauses (gaps longer than MAX_SAMPLE_GAP): leave them
+# out of the grid, fill them with missing samples, or with zeros for the
+# channels that read zero while stopped
+PAUSE_POLICIES = ('skip', 'nan', 'zero')
+ZERO_WHEN_STOPPED = ('power', 'cadence', 'speed')
+
+# Pauses longer than this (seconds) are always left out of the grid, so a bad
+# timestamp can't blow it up
+MAX_PAUSE_FILL = 6 * 3600
+
+
+def to_epoch_seconds(value):
+    """Unix seconds for a naive UTC datetime."""
+    return (value - UNIX_EPOCH) // timedelta(seconds=1)
+
+
+def to_epoch_seconds_or_nat(value):
+    """Unix seconds for a naive UTC datetime, or NAT when it's missing."""
+    if isinstance(value, datetime):
+        return to_epoch_seconds(value)
+    return NAT
+
+
+def lap_windows(laps):
+    """
+    Inclusive [start, end] Unix-second windows of lap dicts (start_time,
+    total_elapsed_time) for Activity.bounds(). Laps missing either value get
+    an empty window before the first record.
+    """
+    starts = np.array([to_epoch_seconds_or_nat(lap.get('start_time')) for lap in laps], dtype=np.int64)
+    ends = starts + np.array([lap.get('total_elapsed_time') for lap in laps], dtype=float)
+    missing = (starts == NAT) | np.isnan(ends)
+    starts[missing] = NAT
+    ends[missing] = NAT
+    return starts, ends
+
+
+def from_epoch_seconds(seconds):
+    """Naive UTC datetime for Unix seconds."""
+    return UNIX_EPOCH + timedelta(seconds=int(seconds))
+
+
+def nan_mean(values):
+    """Mean ignoring NaN as float64; NaN when nothing is left."""
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    return values.mean() if len(values) else np.nan
+
+
+def nan_max(values):
+    """Max ignoring NaN as float64; NaN when nothing is left."""
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    return values.max() if len(values) else np.nan
+
+
+def prefix_sums(values):
+    """
+    Running totals of the non-NaN values and of how many there are, each with a
+    leading zero, so any range lo:hi sums as totals[hi] - totals[lo].
+
+    Integral data (watts, bpm, rpm) is summed in int64 so range sums are exact.
+    """
+    values = np.asarray(values, dtype=float)
+    present = ~np.isnan(values)
+    values = np.where(present, values, 0.0)
+    limit = float(np.abs(values).max()) * len(values) if len(values) else 0.0
+    if limit < 2 ** 62 and np.array_equal(values, np.round(values)):
+        values = values.astype(np.int64)
+    totals = np.concatenate(([0], np.cumsum(values)))
+    counts = np.concatenate(([0], np.cumsum(present)))
+    return totals, counts
+
+
+def range_means(totals, counts, lo, hi):
+    """Mean over each range lo:hi from prefix sums; NaN for ranges with no values."""
+    n = counts[hi] - counts[lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 0, (totals[hi] - totals[lo]) / np.maximum(n, 1), np.nan)
+
+
+class Activity:
+    """
+    Per-second ride data as parallel arrays.
+
+    timestamps are int64 seconds (Unix time for FIT files, offsets from the start
+    for Strava streams); channels are float32 with NaN for missing samples.
+    Channels that weren't recorded at all are NaN-filled and excluded from
+    `channel in activity`.
+    """
+
+    __slots__ = ('timestamps', 'recorded') + CHANNELS
+
+    def __init__(self, timestamps, **channels):
+        self.timestamps = np.ascontiguousarray(timestamps, dtype=np.int64)
+        self.recorded = frozenset(name for name, values in channels.items() if values is not None)
+        n = len(self.timestamps)
+        for name in CHANNELS:
+            values = channels.get(name)
+            if values is None:
+                values = np.full(n, np.nan, dtype=CHANNEL_DTYPE)
+            else:
+                values = np.ascontiguousarray(values, dtype=CHANNEL_DTYPE)
+            setattr(self, name, values)
+
+    @classmethod
+    def from_streams(cls, streams, names):
+        """Build from Strava streams keyed by type; names maps stream type to channel."""
+        if 'time' in streams:
+            timestamps = streams['time']['data']
+        else:
+            timestamps = np.arange(max(len(s['data']) for s in streams.values()))
+        channels = {
+            channel: np.asarray(streams[key]['data'], dtype=float)
+            for key, channel in names.items() if key in streams
+        }
+        return cls(timestamps, **channels)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __contains__(self, channel):
+        return channel in self.recorded
+
+    def select(self, index):
+        """Rows picked by a boolean mask or index array (a slice gives views)."""
+        selected = Activity.__new__(Activity)
+        selected.timestamps = self.timestamps[index]
+        selected.recorded = self.recorded
+        for name in CHANNELS:
+            setattr(selected, name, getattr(self, name)[index])
+        return selected
+
+    def slice(self, start, stop):
+        """Rows start:stop as views, without copying."""
+        return self.select(slice(start, stop))
+
+    def dropna(self, channel):
+        """Copy with only the rows where channel has a value."""
+        return self.select(~np.isnan(getattr(self, channel)))
+
+    def has_values(self, channel):
+        return bool((~np.isnan(getattr(self, channel))).any())
+
+    def count(self, channel):
+        """Samples with a value (seconds, once resampled)."""
+        return int(np.count_nonzero(~np.isnan(getattr(self, channel))))
+
+    def values(self, channel):
+        """Channel as float64 for arithmetic."""
+        return getattr(self, channel).astype(float)
+
+    def mean(self, channel):
+        return nan_mean(getattr(self, channel))
+
+    def max(self, channel):
+        return nan_max(getattr(self, channel))
+
+    def duration(self):
+        """Seconds between the first and last sample."""
+        return float(self.timestamps[-1] - self.timestamps[0]) if len(self) else 0.0
+
+    def sample_interval(self):
+        """Median seconds between consecutive timestamps (0 with fewer than two samples)."""
+        gaps = np.diff(self.timestamps[self.timestamps != NAT])
+        return float(np.median(gaps)) if len(gaps) else 0.0
+
+    def start_time(self):
+        return from_epoch_seconds(self.timestamps[0])
+
+    def normalized_power(self):
+        """Fourth-root mean of power^4 over recorded samples."""
+        return nan_mean(self.values('power') ** 4) ** 0.25
+
+    def hr_drift(self):
+        """Percent change in mean heart rate from the first half of samples to the second (NaN if undefined)."""
+        half = len(self) // 2
+        first_half = nan_mean(self.heart_rate[:half])
+        second_half = nan_mean(self.heart_rate[half:])
+        if not first_half > 0:
+            return np.nan
+        return (second_half - first_half) / first_half * 100
+
+    def mask_missing(self, channel):
+        """Copy on the same rows with every channel blanked where channel has no value; dropna() without the gaps."""
+        missing = np.isnan(getattr(self, channel))
+        masked = self.select(slice(None))
+        for name in CHANNELS:
+            values = getattr(self, name).copy()
+            values[missing] = np.nan
+            setattr(masked, name, values)
+        return masked
+
+    def resample(self, pauses='skip', max_gap=MAX_SAMPLE_GAP):
+        """
+        Copy on a uniform 1 Hz grid, so one row is one second for every metric.
+
+        Each sample is held until the next one, filling dropouts and
+        smart-recording gaps of up to max_gap seconds. Longer gaps are pauses,
+        handled by the `pauses` policy (see PAUSE_POLICIES). Rows without a
+        timestamp are dropped and, of rows sharing one, the last is kept.
+        """
+        if pauses not in PAUSE_POLICIES:
+            raise ValueError(f"Unknown pause policy {pauses!r} (choose from {', '.join(PAUSE_POLICIES)})")
+        activity = self.select(self.timestamps != NAT).sorted_by_time()
+        timestamps = activity.timestamps
+        if not len(timestamps):
+            return activity
+        last = np.append(timestamps[1:] != timestamps[:-1], True)
+        if not last.all():
+            activity = activity.select(last)
+            timestamps = activity.timestamps
+
+        # Grid seconds each row covers: up to the next row, or only itself before a skipped pause
+        gaps = np.diff(timestamps)
+        paused = gaps > max_gap
+        skipped = paused if pauses == 'skip' else gaps > MAX_PAUSE_FILL
+        spans = np.append(np.where(skipped, 1, gaps), 1)
+
+        rows = np.repeat(np.arange(len(timestamps)), spans)
+        offsets = np.arange(len(rows)) - (np.cumsum(spans) - spans)[rows]
+        grid = activity.select(rows)
+        grid.timestamps = timestamps[rows] + offsets
+
+        in_pause = (offsets > 0) & np.append(paused, False)[rows]
+        if in_pause.any():
+            for name in CHANNELS:
+                zero = pauses == 'zero' and name in ZERO_WHEN_STOPPED and activity.has_values(name)
+                getattr(grid, name)[in_pause] = 0.0 if zero else np.nan
+        return grid
+
+    def sorted_by_time(self):
+        """Self if timestamps are already ascending, else a copy stably sorted by time."""
+        if np.all(self.timestamps[1:] >= self.timestamps[:-1]):
+            return self
+        return self.select(np.argsort(self.timestamps, kind='stable'))
+
+    def bounds(self, starts, ends):
+        """
+        Row ranges [lo, hi) covering each inclusive time window [start, end].
+
+        One searchsorted per edge over the timestamps (which must be ascending,
+        see sorted_by_time), instead of a boolean mask over the whole ride per window.
+        """
+        lo = np.searchsorted(self.timestamps, starts, side='left')
+        hi = np.searchsorted(self.timestamps, ends, side='right')
+        return lo, np.maximum(hi, lo)
+
+    def range_summaries(self, lo, hi):
+        """
+        Metrics for many row ranges at once, from one prefix sum per channel.
+
+        Returns a dict of arrays aligned with lo/hi: samples, duration, avg_power,
+        np_power, avg_hr, hr_drift, avg_cadence and avg_torque_eff.
+        """
+        lo = np.asarray(lo, dtype=np.int64)
+        hi = np.asarray(hi, dtype=np.int64)
+        samples = hi - lo
+        nonempty = samples > 0
+        duration = np.zeros(len(lo))
+        duration[nonempty] = self.timestamps[hi[nonempty] - 1] - self.timestamps[lo[nonempty]]
+
+        power = self.values('power')
+        power_totals, power_counts = prefix_sums(power)
+        power4_totals, _ = prefix_sums(power ** 4)
+        hr_totals, hr_counts = prefix_sums(self.heart_rate)
+        cad_totals, cad_counts = prefix_sums(self.cadence)
+        te_totals, te_counts = prefix_sums(self.torque_effectiveness)
+
+        # Root taken per scalar: the vectorised pow can differ from normalized_power() in the last bit
+        np_power = np.array([m ** 0.25 for m in range_means(power4_totals, power_counts, lo, hi)])
+
+        # Heart rate halves split by sample count, like hr_drift()
+        mid = lo + samples // 2
+        first_half = range_means(hr_totals, hr_counts, lo, mid)
+        second_half = range_means(hr_totals, hr_counts, mid, hi)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            hr_drift = np.where(first_half > 0, (second_half - first_half) / first_half * 100, np.nan)
+
+        return {
+            'samples': samples,
+            'duration': duration,
+            'avg_power': range_means(power_totals, power_counts, lo, hi),
+            'np_power': np_power,
+            'avg_hr': range_means(hr_totals, hr_counts, lo, hi),
+            'hr_drift': hr_drift,
+            'avg_cadence': range_means(cad_totals, cad_counts, lo, hi),
+            'avg_torque_eff': range_means(te_totals, te_counts, lo, hi),
+        }
+
+    def to_dataframe(self):
+        """Export to a pandas DataFrame indexed by timestamp (requires pandas)."""
+        import pandas as pd
+        index = pd.DatetimeIndex(self.timestamps.astype('datetime64[s]'), name='timestamp')
+        return pd.DataFrame({name: getattr(self, name) for name in CHANNELS}, index=index)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Persistent Activity Cache
+Stores decoded FIT activities and their extracted ride/lap data in a SQLite
+file next to the .fit files, so re-running a review skips FIT decoding.
+
+The cache file lives in the data folder, which may be synced or shared, so
+nothing in it is ever unpickled: messages and results are stored as JSON and
+record columns as a NumPy .npz loaded with allow_pickle=False.
+"""
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+from lazy_import import lazy_import
+from activity import Activity, CHANNELS
+from fit_loader import FitActivity
+
+np = lazy_import('numpy')
+
+
+CACHE_FILENAME = '.fitparse_cache.sqlite'
+
+# Bump when the layout of cached activities or ride/lap dicts changes
+CACHE_VERSION = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activities (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    thresholds TEXT NOT NULL,
+    activity TEXT NOT NULL,
+    records BLOB NOT NULL,
+    results TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS activities_content_hash ON activities (content_hash, size);
+"""
+
+_COLUMNS = "mtime_ns, size, version, thresholds, content_hash, activity, records, results, path"
+
+
+def file_content_hash(filepath):
+    """Hash the full contents of a file."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def thresholds_key(thresholds):
+    """Stable string for the athlete thresholds the cached results were computed with."""
+    return ';'.join(f"{k}={thresholds[k]}" for k in sorted(thresholds))
+
+
+def _tag(value):
+    """value with the types JSON lacks (tuples, dates, NumPy values, bytes) as tagged dicts."""
+    if isinstance(value, dict):
+        return {key: _tag(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_tag(item) for item in value]
+    if isinstance(value, tuple):
+        return {'$tuple': [_tag(item) for item in value]}
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'$date': value.isoformat()}
+    if isinstance(value, bytes):
+        return {'$bytes': value.hex()}
+    if isinstance(value, np.ndarray):
+        return {'$array': value.tolist(), 'dtype': value.dtype.str}
+    if isinstance(value, np.generic):
+        return {'$scalar': value.item(), 'dtype': value.dtype.str}
+    return value
+
+
+_UNTAG = {
+    '$tuple': lambda obj: tuple(obj['$tuple']),
+    '$datetime': lambda obj: datetime.fromisoformat(obj['$datetime']),
+    '$date': lambda obj: date.fromisoformat(obj['$date']),
+    '$bytes': lambda obj: bytes.fromhex(obj['$bytes']),
+    '$array': lambda obj: np.array(obj['$array'], dtype=obj['dtype']),
+    '$scalar': lambda obj: np.dtype(obj['dtype']).type(obj['$scalar']),
+}
+
+
+def _untag(obj):
+    for tag, restore in _UNTAG.items():
+        if tag in obj:
+            return restore(obj)
+    return obj
+
+
+def dump_json(value):
+    """JSON text for cached messages and results; load_json() restores the original types."""
+    return json.dumps(_tag(value), separators=(',', ':'))
+
+
+def load_json(text):
+    return json.loads(text, object_hook=_untag)
+
+
+def dump_records(records):
+    """Record columns as an uncompressed .npz."""
+    buffer = io.BytesIO()
+    np.savez(buffer, timestamps=records.timestamps,
+             **{name: getattr(records, name) for name in CHANNELS if name in records})
+    return buffer.getvalue()
+
+
+def load_records(data):
+    """Record columns from dump_records(); plain arrays only, never pickles."""
+    with np.load(io.BytesIO(data), allow_pickle=False) as columns:
+        return Activity(columns['timestamps'],
+                        **{name: columns[name] for name in CHANNELS if name in columns.files})
+
+
+class ActivityCache:
+    """
+    SQLite-backed cache of decoded activities and extracted ride/lap data.
+
+    Entries are keyed by path and validated by mtime/size; when those change the
+    content hash decides whether the file really changed. Ride/lap results are
+    only reused when the thresholds they were computed with still match, but the
+    decoded activity is reused either way.
+    """
+
+    def __init__(self, path, thresholds, shared=False):
+        self.path = str(path)
+        self.thresholds = thresholds_key(thresholds)
+        self.conn = sqlite3.connect(self.path, timeout=30 if shared else 5)
+        if shared:
+            # Write-ahead logging lets reviews read while a watcher keeps writing
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(activities)")}
+        if columns and 'records' not in columns:
+            # Pickled entries from before the JSON layout; never read, so drop them
+            self.conn.execute("DROP TABLE activities")
+        self.conn.executescript(SCHEMA)
+        self.stats = {'hits': 0, 'recomputed': 0, 'misses': 0, 'stored': 0}
+        # Content hashes computed by get(), reused by the put() that follows a miss
+        self._content_hashes = {}
+
+    @classmethod
+    def for_folder(cls, folder_path, thresholds, shared=False):
+        return cls(Path(folder_path) / CACHE_FILENAME, thresholds, shared)
+
+    def is_current(self, filepath):
+        """Whether a file's ride/lap data is cached for its current mtime/size and thresholds, without loading it."""
+        stat = os.stat(filepath)
+        row = self.conn.execute(
+            "SELECT 1 FROM activities WHERE path = ? AND mtime_ns = ? AND size = ? AND version = ? AND thresholds = ?",
+            (str(filepath), stat.st_mtime_ns, stat.st_size, CACHE_VERSION, self.thresholds),
+        ).fetchone()
+        return row is not None
+
+    def get(self, filepath):
+        """
+        Look up a .fit file.
+
+        Returns None on a miss, otherwise a dict with the cached 'activity' and,
+        if it was cached for this path and the thresholds still match, its
+        'ride_data' and 'lap_data'.
+        """
+        filepath = str(filepath)
+        stat = os.stat(filepath)
+        content_hash = None
+        row = self.conn.execute(
+            f"SELECT {_COLUMNS} FROM activities WHERE path = ?", (filepath,),
+        ).fetchone()
+
+        if not row or (row[2] == CACHE_VERSION and (row[0], row[1]) != (stat.st_mtime_ns, stat.st_size)):
+            # New, touched or replaced file; the same content may be cached under this or another path
+            content_hash = file_content_hash(filepath)
+            row = self.conn.execute(
+                f"SELECT {_COLUMNS} FROM activities WHERE content_hash = ? AND size = ? AND version = ? "
+                "ORDER BY path = ? DESC",
+                (content_hash, stat.st_size, CACHE_VERSION, filepath),
+            ).fetchone()
+            if row and row[8] == filepath:
+                # Only touched; the row still describes this file
+                self.conn.execute(
+                    "UPDATE activities SET mtime_ns = ? WHERE path = ?",
+                    (stat.st_mtime_ns, filepath),
+                )
+
+        key = (filepath, stat.st_mtime_ns, stat.st_size)
+        if not row or row[2] != CACHE_VERSION:
+            if content_hash:
+                self._content_hashes[key] = content_hash
+            self.stats['misses'] += 1
+            return None
+
+        entry = {'activity': FitActivity.from_cache_state(filepath, load_json(row[5]), load_records(row[6]))}
+        if row[3] == self.thresholds and row[8] == filepath:
+            entry['ride_data'], entry['lap_data'] = load_json(row[7])
+            self.stats['hits'] += 1
+        else:
+            # Thresholds changed, or the content was cached for another file whose
+            # results carry its name; the caller recomputes and put() stores a row for this path
+            self._content_hashes[key] = row[4]
+            self.stats['recomputed'] += 1
+        return entry
+
+    def put(self, activity, ride_data, lap_data):
+        """Store a decoded activity with the ride/lap data extracted from it."""
+        stat = os.stat(activity.filepath)
+        content_hash = self._content_hashes.pop((activity.filepath, stat.st_mtime_ns, stat.st_size), None)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO activities "
+            "(path, mtime_ns, size, content_hash, version, thresholds, activity, records, results, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                activity.filepath,
+                stat.st_mtime_ns,
+                stat.st_size,
+                content_hash or file_content_hash(activity.filepath),
+                CACHE_VERSION,
+                self.thresholds,
+                dump_json(activity.cache_state()),
+                dump_records(activity.records),
+                dump_json([ride_data, lap_data]),
+                time.time(),
+            ),
+        )
+        self.stats['stored'] += 1
+
+    def format_stats(self):
+        return (f"Cache: {self.stats['hits']} hits, {self.stats['recomputed']} recomputed "
+                f"(thresholds changed or copied file), {self.stats['misses']} misses, "
+                f"{self.stats['stored']} stored ({self.path})")
+
+    def commit(self):
+        """Make stored entries visible to other connections."""
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
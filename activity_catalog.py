@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Activity Catalog
+One summary row per ride (the ride-level metrics of extract_ride_data) in an
+indexed SQLite file next to the .fit files, so totals by week or month and the
+hardest rides of any date range come from SQL instead of decoding a season of
+files again.
+"""
+
+import os
+import sqlite3
+from datetime import date, timedelta
+from pathlib import Path
+
+from activity_cache import thresholds_key
+
+
+CATALOG_FILENAME = '.activity_catalog.sqlite'
+
+# Ride metrics kept per row, as named in extract_ride_data's dict
+SUMMARY_FIELDS = (
+    'duration_seconds', 'distance_m', 'elevation_gain_m', 'calories',
+    'avg_power', 'max_power', 'normalized_power', 'intensity_factor', 'tss',
+    'avg_hr', 'max_hr', 'hr_drift', 'avg_speed_mps', 'avg_cadence', 'max_cadence',
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    thresholds TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_folder ON files (folder);
+CREATE TABLE IF NOT EXISTS rides (
+    path TEXT PRIMARY KEY REFERENCES files (path) ON DELETE CASCADE,
+    athlete TEXT NOT NULL,
+    sport TEXT NOT NULL,
+    ride_id TEXT NOT NULL,
+    name TEXT,
+    date TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    {columns}
+);
+CREATE INDEX IF NOT EXISTS rides_start_time ON rides (start_time);
+CREATE INDEX IF NOT EXISTS rides_sport ON rides (sport, start_time);
+CREATE INDEX IF NOT EXISTS rides_athlete ON rides (athlete, start_time);
+""".format(columns=',\n    '.join(f"{field} REAL NOT NULL DEFAULT 0" for field in SUMMARY_FIELDS))
+
+# Monday of a ride's week, from its YYYY-MM-DD date
+_WEEK_SQL = "date(date, 'weekday 0', '-6 days')"
+_MONTH_SQL = "strftime('%Y-%m', date)"
+
+_TOTALS_SQL = """
+    COUNT(*) AS rides,
+    COALESCE(SUM(duration_seconds), 0) AS total_time_seconds,
+    COALESCE(SUM(distance_m), 0) AS total_distance_m,
+    COALESCE(SUM(tss), 0) AS total_tss,
+    COALESCE(SUM(elevation_gain_m), 0) AS total_elevation_m,
+    COALESCE(AVG(CASE WHEN intensity_factor > 0 THEN intensity_factor END), 0) AS avg_intensity_factor
+"""
+
+EMPTY_TOTALS = {
+    'rides': 0,
+    'total_time_seconds': 0,
+    'total_distance_m': 0,
+    'total_tss': 0,
+    'total_elevation_m': 0,
+    'avg_intensity_factor': 0,
+}
+
+
+def _resolve(path):
+    return str(Path(path).resolve())
+
+
+class ActivityCatalog:
+    """
+    SQLite catalog of ride summaries for one athlete's folder (or several, sharing a file).
+
+    Files are tracked by mtime/size and the thresholds their metrics were
+    computed with, so stale_files() can tell which ones to extract again with a
+    stat of the folder. Queries cover one athlete's rides over a date range,
+    optionally for a single sport.
+    """
+
+    def __init__(self, path, thresholds, athlete='', shared=False):
+        self.path = str(path)
+        self.thresholds = thresholds_key(thresholds)
+        self.athlete = athlete or ''
+        self.conn = sqlite3.connect(self.path, timeout=30 if shared else 5)
+        self.conn.row_factory = sqlite3.Row
+        if shared:
+            # Write-ahead logging lets reports read while a watcher keeps writing
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self.stats = {'updated': 0, 'removed': 0}
+
+    @classmethod
+    def for_folder(cls, folder_path, thresholds, athlete='', shared=False):
+        return cls(Path(folder_path) / CATALOG_FILENAME, thresholds, athlete, shared)
+
+    def is_current(self, filepath):
+        """Whether a file is catalogued for its current mtime/size and thresholds."""
+        stat = os.stat(filepath)
+        row = self.conn.execute(
+            "SELECT 1 FROM files WHERE path = ? AND mtime_ns = ? AND size = ? AND thresholds = ?",
+            (_resolve(filepath), stat.st_mtime_ns, stat.st_size, self.thresholds),
+        ).fetchone()
+        return row is not None
+
+    def stale_files(self, folder_path):
+        """
+        The .fit files in a folder that are new, changed or catalogued with other
+        thresholds. Entries for files no longer in the folder are dropped.
+        """
+        folder = _resolve(folder_path)
+        known = {
+            row['path']: (row['mtime_ns'], row['size'], row['thresholds'])
+            for row in self.conn.execute(
+                "SELECT path, mtime_ns, size, thresholds FROM files WHERE folder = ?", (folder,)
+            )
+        }
+        current = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.endswith('.fit') and entry.is_file():
+                    stat = entry.stat()
+                    current[os.path.join(folder, entry.name)] = (stat.st_mtime_ns, stat.st_size, self.thresholds)
+
+        removed = known.keys() - current.keys()
+        if removed:
+            self.conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+            self.stats['removed'] += len(removed)
+        return sorted(path for path, key in current.items() if known.get(path) != key)
+
+    def add(self, filepath, ride_data, ride_id=None):
+        """Catalog a file's ride summary; files without ride data are tracked so they aren't extracted again."""
+        path = _resolve(filepath)
+        stat = os.stat(path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, folder, mtime_ns, size, thresholds) VALUES (?, ?, ?, ?, ?)",
+            (path, os.path.dirname(path), stat.st_mtime_ns, stat.st_size, self.thresholds),
+        )
+        if ride_data:
+            columns = ('path', 'athlete', 'sport', 'ride_id', 'name', 'date', 'start_time', *SUMMARY_FIELDS)
+            values = (
+                path, self.athlete, ride_data.get('sport') or 'cycling',
+                ride_id or f"{ride_data['start_time']} {ride_data['name']}", ride_data.get('name'),
+                str(ride_data['date']), ride_data['start_time'],
+                *(float(ride_data.get(field) or 0) for field in SUMMARY_FIELDS),
+            )
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO rides ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                values,
+            )
+        else:
+            self.conn.execute("DELETE FROM rides WHERE path = ?", (path,))
+        self.stats['updated'] += 1
+
+    def _where(self, start_date, end_date, sport=None):
+        """WHERE clause and parameters for the athlete's rides from start_date to end_date inclusive."""
+        clause = "athlete = ? AND start_time >= ? AND start_time < ?"
+        params = [self.athlete, start_date.isoformat(), (end_date + timedelta(days=1)).isoformat()]
+        if sport:
+            clause += " AND sport = ?"
+            params.append(sport)
+        return clause, params
+
+    def totals(self, start_date, end_date, sport=None):
+        """Ride count and total time, distance, TSS and elevation, plus average IF, over a date range."""
+        where, params = self._where(start_date, end_date, sport)
+        return dict(self.conn.execute(f"SELECT {_TOTALS_SQL} FROM rides WHERE {where}", params).fetchone())
+
+    def totals_by(self, bucket, start_date, end_date, sport=None):
+        """
+        Totals per 'week' (keyed by its Monday, YYYY-MM-DD) or 'month' (YYYY-MM)
+        for every week or month overlapping a date range, in order; those without
+        rides have zero totals.
+        """
+        if bucket == 'week':
+            key, buckets = _WEEK_SQL, [day.isoformat() for day in week_starts(start_date, end_date)]
+        elif bucket == 'month':
+            key, buckets = _MONTH_SQL, [f"{day:%Y-%m}" for day in month_starts(start_date, end_date)]
+        else:
+            raise ValueError(f"Unknown bucket: {bucket}")
+        where, params = self._where(start_date, end_date, sport)
+        rows = {
+            row[bucket]: dict(row)
+            for row in self.conn.execute(f"SELECT {key} AS {bucket}, {_TOTALS_SQL} FROM rides WHERE {where} GROUP BY 1", params)
+        }
+        return [rows.get(name) or {bucket: name, **EMPTY_TOTALS} for name in buckets]
+
+    def top_rides(self, start_date, end_date, limit=5, sport=None, by='tss'):
+        """The rides with the highest `by` metric (TSS by default) over a date range."""
+        if by not in SUMMARY_FIELDS:
+            raise ValueError(f"Unknown ride metric: {by}")
+        where, params = self._where(start_date, end_date, sport)
+        rows = self.conn.execute(
+            f"SELECT ride_id, date, start_time, name, sport, {', '.join(SUMMARY_FIELDS)} "
+            f"FROM rides WHERE {where} ORDER BY {by} DESC, start_time LIMIT ?",
+            [*params, limit],
+        )
+        return [dict(row) for row in rows]
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM rides WHERE athlete = ?", (self.athlete,)).fetchone()[0]
+
+    def format_stats(self):
+        return (f"Catalog: {self.count()} rides, {self.stats['updated']} files added or updated, "
+                f"{self.stats['removed']} removed ({self.path})")
+
+    def commit(self):
+        """Make added entries visible to other connections."""
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def week_starts(start_date, end_date):
+    """The Monday of every week overlapping a date range."""
+    monday = start_date - timedelta(days=start_date.weekday())
+    while monday <= end_date:
+        yield monday
+        monday += timedelta(days=7)
+
+
+def month_starts(start_date, end_date):
+    """The first day of every month overlapping a date range."""
+    month = date(start_date.year, start_date.month, 1)
+    while month <= end_date:
+        yield month
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Athlete Profiles
+Thresholds and zone definitions for one athlete, passed explicitly into the
+metric functions so a single process can analyze any number of riders.
+config.py only supplies the defaults.
+"""
+
+from datetime import date, datetime
+
+from config import FTP, HRMAX, PAUSES
+from zones import HR_ZONES, POWER_ZONES
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class AthleteProfile:
+    """
+    FTP, HRMAX, zones and pause handling for one athlete.
+
+    pauses is how recording pauses enter the 1 Hz grid the metrics run on
+    (Activity.resample's policy: 'skip', 'nan' or 'zero').
+    ftp_history is a list of (effective_from, ftp) pairs; a ride uses the latest
+    FTP that took effect on or before its date, and `ftp` before the first one.
+    Zones are {label: (low, high)} fractions of HRMAX / FTP as in zones.py.
+    """
+
+    __slots__ = ('name', 'ftp', 'hrmax', 'hr_zones', 'power_zones', 'ftp_history', 'pauses')
+
+    def __init__(self, ftp=FTP, hrmax=HRMAX, hr_zones=None, power_zones=None,
+                 ftp_history=None, name=None, pauses=PAUSES):
+        self.name = name
+        self.pauses = pauses
+        self.ftp = ftp
+        self.hrmax = hrmax
+        self.hr_zones = dict(hr_zones or HR_ZONES)
+        self.power_zones = dict(power_zones or POWER_ZONES)
+        self.ftp_history = sorted((_to_date(day), value) for day, value in (ftp_history or []))
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        Profile from a manifest entry: {"ftp", "hrmax", "hr_zones", "power_zones",
+        "ftp_history": [["2025-01-01", 250], ...], "pauses"}; anything missing comes from config.py.
+        """
+        def zones(key):
+            spec = values.get(key)
+            return {label: tuple(bounds) for label, bounds in spec.items()} if spec else None
+
+        return cls(
+            ftp=values.get('ftp', FTP),
+            hrmax=values.get('hrmax', HRMAX),
+            hr_zones=zones('hr_zones'),
+            power_zones=zones('power_zones'),
+            ftp_history=values.get('ftp_history'),
+            name=values.get('name'),
+            pauses=values.get('pauses', PAUSES),
+        )
+
+    def ftp_on(self, day=None):
+        """FTP in effect on a date (or datetime); the base FTP when day is None."""
+        ftp = self.ftp
+        if day is None:
+            return ftp
+        day = _to_date(day)
+        for effective_from, value in self.ftp_history:
+            if effective_from > day:
+                break
+            ftp = value
+        return ftp
+
+    def thresholds(self):
+        """Everything results depend on, for keying cached metrics."""
+        return {
+            'FTP': self.ftp,
+            'HRMAX': self.hrmax,
+            'FTP_HISTORY': [(day.isoformat(), value) for day, value in self.ftp_history],
+            'HR_ZONES': self.hr_zones,
+            'POWER_ZONES': self.power_zones,
+            'PAUSES': self.pauses,
+        }
+
+    def __repr__(self):
+        name = f"{self.name!r}, " if self.name else ""
+        return f"AthleteProfile({name}ftp={self.ftp}, hrmax={self.hrmax})"
+
+
+# The athlete configured in config.py
+DEFAULT_PROFILE = AthleteProfile()
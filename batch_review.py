@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Team Weekly Review
+Non-interactive weekly reviews for every athlete in a manifest. Files still to
+be decoded are queued on one shared process pool for the whole team, and each
+athlete's report is written as soon as their rides are in.
+"""
+
+from resident_worker import forward_to_worker
+forward_to_worker(__name__, __file__)
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+from athlete import AthleteProfile
+from weekly_review import (
+    get_week_dates, find_fit_activities, open_cache, jobs_count,
+    submit_activities, gather_activities, collect_rides, summarize_week,
+    load_interview, format_output,
+)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Generate weekly reviews for a team of athletes without prompting'
+    )
+    parser.add_argument(
+        'manifest',
+        type=str,
+        help='JSON manifest listing each athlete\'s name, folder, thresholds and optional interview file'
+    )
+    parser.add_argument(
+        '--start',
+        type=str,
+        help='Start date (YYYY-MM-DD). Default: last Monday',
+        default=None
+    )
+    parser.add_argument(
+        '--end',
+        type=str,
+        help='End date (YYYY-MM-DD). Default: last Sunday',
+        default=None
+    )
+    parser.add_argument(
+        '--output-dir',
+        type=str,
+        help='Folder the reports are written to. Default: reports',
+        default='reports'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Decode every .fit file instead of using the cache in each folder'
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        help='Worker processes shared by all athletes (0 = one per CPU). Default: 0',
+        default=0
+    )
+    return parser.parse_args()
+
+
+def load_manifest(path):
+    """
+    Athletes from a manifest: {"athletes": [{"name", "folder", "interview", ...}]}
+    (or just the list). The other keys of an entry make its AthleteProfile
+    (ftp, hrmax, zones, ftp_history); relative paths are resolved against the
+    manifest's folder.
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    entries = manifest['athletes'] if isinstance(manifest, dict) else manifest
+    base = Path(path).resolve().parent
+
+    athletes = []
+    for i, entry in enumerate(entries, 1):
+        if 'folder' not in entry:
+            raise ValueError(f"Athlete {i} in {path} has no folder")
+        folder = base / entry['folder']
+        interview = entry.get('interview')
+        athletes.append({
+            'name': entry.get('name') or folder.name,
+            'folder': str(folder),
+            'profile': AthleteProfile.from_dict(entry),
+            'interview': str(base / interview) if interview else None,
+        })
+    return athletes
+
+
+def report_filename(name, start_date, end_date):
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', name).strip('_') or 'athlete'
+    return f"{slug}_{start_date:%Y-%m-%d}_{end_date:%Y-%m-%d}.md"
+
+
+def start_athlete(athlete, start_date, end_date, pool, use_cache=True):
+    """Find an athlete's files for the week and queue the ones to decode on the shared pool."""
+    started = time.perf_counter()
+    activities = find_fit_activities(athlete['folder'], start_date, end_date)
+    cache = open_cache(athlete['folder'], athlete['profile']) if use_cache else None
+    submitted = submit_activities(activities, cache, pool, athlete['profile'])
+    return {
+        'athlete': athlete,
+        'cache': cache,
+        'submitted': submitted,
+        'timing': {'files': len(activities), 'scan_s': time.perf_counter() - started},
+    }
+
+
+def finish_athlete(job, start_date, end_date, output_dir, batch_started):
+    """Wait for an athlete's rides, then build and write their report; returns its path or None."""
+    athlete, cache, timing = job['athlete'], job['cache'], job['timing']
+
+    waited = time.perf_counter()
+    rides, laps_by_ride = collect_rides(gather_activities(job['submitted'], cache))
+    timing['extract_wait_s'] = time.perf_counter() - waited
+    if cache is not None:
+        timing['cache_hits'] = cache.stats['hits']
+        cache.close()
+
+    built = time.perf_counter()
+    path = None
+    if rides:
+        aggregates, power_bests, training_load = summarize_week(
+            athlete['folder'], rides, start_date, end_date
+        )
+        interview = load_interview(athlete['interview'])
+        output = format_output(rides, laps_by_ride, aggregates, interview, power_bests, training_load)
+        path = Path(output_dir) / report_filename(athlete['name'], start_date, end_date)
+        path.write_text(output + "\n")
+    timing['rides'] = len(rides)
+    timing['report_s'] = time.perf_counter() - built
+    timing['done_at_s'] = time.perf_counter() - batch_started
+    return path
+
+
+def format_timing(name, timing):
+    return (f"{name}: {timing['files']} files, {timing['rides']} rides, "
+            f"{timing.get('cache_hits', 0)} cached | scan {timing['scan_s']:.2f}s, "
+            f"extract wait {timing['extract_wait_s']:.2f}s, report {timing['report_s']:.2f}s, "
+            f"done at {timing['done_at_s']:.2f}s")
+
+
+def main():
+    from concurrent.futures import ProcessPoolExecutor
+    args = parse_arguments()
+    athletes = load_manifest(args.manifest)
+    start_date, end_date = get_week_dates(args.start, args.end)
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"Analyzing {len(athletes)} athletes from {start_date.date()} to {end_date.date()}")
+
+    batch_started = time.perf_counter()
+    jobs, failed = [], []
+    with ProcessPoolExecutor(max_workers=jobs_count(args.jobs)) as pool:
+        # Queue every athlete's files before waiting on any, so the pool stays busy
+        for athlete in athletes:
+            if not Path(athlete['folder']).is_dir():
+                print(f"Error: Folder {athlete['folder']} for {athlete['name']} does not exist")
+                failed.append(athlete['name'])
+                continue
+            jobs.append(start_athlete(athlete, start_date, end_date, pool, not args.no_cache))
+
+        for job in jobs:
+            name = job['athlete']['name']
+            try:
+                path = finish_athlete(job, start_date, end_date, args.output_dir, batch_started)
+            except Exception as e:
+                print(f"Error: Could not build the review for {name}: {e}")
+                failed.append(name)
+                continue
+            print(f"{name}: {path}" if path else f"{name}: no valid ride data found")
+
+    print("\n--- Timing ---")
+    for job in jobs:
+        if 'done_at_s' in job['timing']:
+            print(format_timing(job['athlete']['name'], job['timing']))
+    print(f"Total: {time.perf_counter() - batch_started:.2f}s")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Benchmarks for the FIT and Strava entry points (run with python -m benchmarks.run)."""
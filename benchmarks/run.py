@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Benchmark Runner
+Times the FIT and Strava entry points on synthetic rides and stores the results
+as JSON, so runs from different commits can be compared.
+
+    python -m benchmarks.run --duration 7200 --laps 12
+    python -m benchmarks.run --compare benchmarks/results/<commit>.json
+"""
+
+import argparse
+import importlib.machinery
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = REPO_ROOT / 'benchmarks' / 'results'
+
+from benchmarks.synthetic import SyntheticRide, SYNTHETIC_CHANNELS, write_fit, write_fit_folder, strava_payloads
+from benchmarks.strava_stub import StravaStub
+
+
+def load_script(name):
+    """Import one of the extension-less scripts (parse, intervals) as a module."""
+    loader = importlib.machinery.SourceFileLoader(name, str(REPO_ROOT / name))
+    spec = importlib.util.spec_from_loader(name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Benchmark FIT decoding, ride/lap metrics and the Strava parser on synthetic rides'
+    )
+    parser.add_argument('--duration', type=int, default=3600, help='Ride length in seconds. Default: 3600')
+    parser.add_argument('--sample-rate', type=float, default=1.0, help='Samples per second. Default: 1')
+    parser.add_argument('--laps', type=int, default=8, help='Laps per ride. Default: 8')
+    parser.add_argument('--channels', type=str, default=','.join(SYNTHETIC_CHANNELS),
+                        help='Comma-separated channels to record. Default: all')
+    parser.add_argument('--files', type=int, default=20,
+                        help='Files in the folder scanned by find_fit_files. Default: 20')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed runs per benchmark. Default: 3')
+    parser.add_argument('--only', type=str, default=None,
+                        help='Comma-separated benchmark names to run. Default: all')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Results file. Default: benchmarks/results/<commit>.json')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='Earlier results file to compare against')
+    return parser.parse_args()
+
+
+# --- Benchmarks -----------------------------------------------------------
+#
+# Each takes the fixture paths and returns (setup, run, records): setup() runs
+# untimed before every repeat and its result is passed to run().
+
+def bench_find_fit_files(fixtures):
+    import weekly_review
+    start = datetime(2025, 8, 4)
+    end = start + timedelta(days=fixtures['files'])
+    # Throughput here counts files scanned rather than records
+    return None, lambda _: weekly_review.find_fit_files(fixtures['folder'], start, end), fixtures['files']
+
+
+def bench_decode(fixtures):
+    from fit_loader import load_fit_activity
+    return None, lambda _: load_fit_activity(fixtures['fit']), fixtures['records']
+
+
+def bench_decode_fitparse(fixtures):
+    import fit_loader
+    # The fallback path, for comparison with the vectorized decoder
+    fit_loader.FAST_DECODE = False
+    return None, lambda _: fit_loader.load_fit_activity(fixtures['fit']), fixtures['records']
+
+
+def bench_extract_ride_data(fixtures):
+    import weekly_review
+    # From the path: decode plus ride metrics, as the weekly review pays for them
+    return None, lambda _: weekly_review.extract_ride_data(fixtures['fit']), fixtures['records']
+
+
+def bench_extract_lap_data(fixtures):
+    import weekly_review
+    from fit_loader import load_fit_activity
+    # Metrics only: the file is decoded untimed
+    setup = lambda: load_fit_activity(fixtures['fit'])
+    return setup, weekly_review.extract_lap_data, fixtures['records']
+
+
+def bench_lap_intervals(fixtures):
+    intervals = load_script('intervals')
+    from fit_loader import load_fit_activity
+
+    def setup():
+        activity = load_fit_activity(fixtures['fit'])
+        return activity.records, intervals.load_lap_data(activity)
+
+    def run(loaded):
+        records, laps = loaded
+        return [intervals.summarize_interval(i) for i in intervals.get_lap_intervals(records, laps)]
+
+    return setup, run, fixtures['records']
+
+
+def bench_summarize_laps(fixtures):
+    intervals = load_script('intervals')
+    from fit_loader import load_fit_activity
+
+    def setup():
+        activity = load_fit_activity(fixtures['fit'])
+        return activity.records, intervals.load_lap_data(activity)
+
+    return setup, lambda loaded: intervals.summarize_laps(*loaded), fixtures['records']
+
+
+def bench_strava_process_activity_data(fixtures):
+    from strava_parse import StravaParser
+    stub = StravaStub({1: fixtures['strava']}).__enter__()
+    parser = StravaParser('benchmark', base_url=stub.url)
+    # Fetch and decode details and streams from the stub, then compute metrics
+    return None, lambda _: parser.process_activity_data(1), fixtures['records']
+
+
+def bench_cli_startup(fixtures):
+    # A fresh interpreter printing --help, run in-process rather than by a resident worker;
+    # throughput here counts invocations
+    command = [sys.executable, str(REPO_ROOT / 'weekly_review.py'), '--help']
+    env = {**os.environ, 'FIT_WORKER': 'off'}
+    return None, lambda _: subprocess.run(command, env=env, check=True, capture_output=True), 1
+
+
+BENCHMARKS = {
+    'find_fit_files': bench_find_fit_files,
+    'decode': bench_decode,
+    'decode_fitparse': bench_decode_fitparse,
+    'extract_ride_data': bench_extract_ride_data,
+    'extract_lap_data': bench_extract_lap_data,
+    'lap_intervals': bench_lap_intervals,
+    'summarize_laps': bench_summarize_laps,
+    'strava_process_activity_data': bench_strava_process_activity_data,
+    'cli_startup': bench_cli_startup,
+}
+
+
+def _run_case(name, fixtures, repeats, conn):
+    """Child process: time one benchmark and send back its numbers."""
+    sys.path.insert(0, str(REPO_ROOT))
+    from fit_loader import peak_memory_mb
+    try:
+        setup, run, records = BENCHMARKS[name](fixtures)
+        times = []
+        for _ in range(repeats):
+            state = setup() if setup else None
+            started = time.perf_counter()
+            run(state)
+            times.append(time.perf_counter() - started)
+        best = min(times)
+        conn.send({
+            'name': name,
+            'records': records,
+            'repeats': repeats,
+            'wall_s_best': best,
+            'wall_s_mean': sum(times) / len(times),
+            'records_per_s': records / best if best > 0 else None,
+            'peak_rss_mb': peak_memory_mb(),
+        })
+    except Exception as e:
+        conn.send({'name': name, 'error': f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_case(name, fixtures, repeats):
+    """Run one benchmark in a fresh process, so peak RSS is its own."""
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=_run_case, args=(name, fixtures, repeats, child))
+    process.start()
+    child.close()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+def make_fixtures(folder, args):
+    channels = [c for c in args.channels.split(',') if c]
+    options = {'duration': args.duration, 'sample_rate': args.sample_rate,
+               'laps': args.laps, 'channels': channels}
+    ride = SyntheticRide(**options)
+    fit = write_fit(os.path.join(folder, 'ride.fit'), ride)
+    scan_folder = os.path.join(folder, 'scan')
+    os.makedirs(scan_folder)
+    write_fit_folder(scan_folder, args.files, **options)
+    return {
+        'fit': fit,
+        'folder': scan_folder,
+        'files': args.files,
+        'records': len(ride),
+        'strava': strava_payloads(ride),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def format_result(result, baseline=None):
+    if 'error' in result:
+        return f"{result['name']:<30} ERROR {result['error']}"
+    line = (f"{result['name']:<30} {result['wall_s_best'] * 1000:>10.2f} ms "
+            f"{result['records_per_s'] or 0:>14,.0f} rec/s {result['peak_rss_mb'] or 0:>8.1f} MB")
+    if baseline and baseline.get('wall_s_best'):
+        line += f"  {baseline['wall_s_best'] / result['wall_s_best']:>6.2f}x vs baseline"
+    return line
+
+
+def main():
+    args = parse_arguments()
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmarks: {', '.join(unknown)} (choose from {', '.join(BENCHMARKS)})")
+        sys.exit(1)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {r['name']: r for r in json.load(f)['results']}
+
+    commit = git_commit()
+    with tempfile.TemporaryDirectory() as folder:
+        fixtures = make_fixtures(folder, args)
+        print(f"{fixtures['records']} records per ride, {args.laps} laps, commit {commit}")
+        results = []
+        for name in names:
+            result = run_case(name, fixtures, args.repeats)
+            print(format_result(result, baseline.get(name)))
+            results.append(result)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'commit': commit,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': {
+                'duration': args.duration, 'sample_rate': args.sample_rate, 'laps': args.laps,
+                'channels': args.channels, 'files': args.files, 'repeats': args.repeats,
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
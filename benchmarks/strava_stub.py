@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Strava Stub Server
+Local HTTP server answering the activity details, streams and laps endpoints
+from canned payloads, for running StravaParser without the real API.
+"""
+
+import hashlib
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+_PATH_RE = re.compile(r'^/activities/(?P<id>[^/?]+)(?:/(?P<kind>streams|laps))?(?:\?.*)?$')
+
+
+def etag(body):
+    """Strong validator the stub sends with every payload."""
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+class StravaStub:
+    """
+    Serves {activity_id: {'details', 'streams', 'laps'}} payloads (JSON bytes)
+    on a free localhost port; use `url` as the client's base_url.
+
+    failures maps a request path (e.g. '/activities/1/streams') to statuses
+    answered one per request before its payload is served. rate_limit is a
+    ((short, daily) limits, (short, daily) usage) pair sent as X-RateLimit-*
+    headers, usage counting up with each request. Payloads carry an ETag and a
+    matching If-None-Match gets 304. Every request's path and headers are kept
+    in `log`.
+    """
+
+    def __init__(self, payloads, failures=None, rate_limit=None):
+        self.payloads = {str(k): v for k, v in payloads.items()}
+        self.failures = {path: list(statuses) for path, statuses in (failures or {}).items()}
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.log = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body=b'', headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                for name, value in stub._rate_limit_headers():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    stub.log.append((self.path, dict(self.headers)))
+                    pending = stub.failures.get(self.path.split('?')[0])
+                    status = pending.pop(0) if pending else None
+                if status is not None:
+                    self._reply(status, headers=[('Retry-After', '0')] if status == 429 else ())
+                    return
+
+                match = _PATH_RE.match(self.path)
+                activity = stub.payloads.get(match.group('id')) if match else None
+                if activity is None:
+                    self._reply(404)
+                    return
+                body = activity[match.group('kind') or 'details']
+                if self.headers.get('If-None-Match') == etag(body):
+                    self._reply(304, headers=[('ETag', etag(body))])
+                    return
+                self._reply(200, body, [('Content-Type', 'application/json'), ('ETag', etag(body))])
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _rate_limit_headers(self):
+        if self.rate_limit is None:
+            return []
+        limits, usage = self.rate_limit
+        with self._lock:
+            used = (usage[0] + self.requests, usage[1] + self.requests)
+        return [
+            ('X-RateLimit-Limit', f"{limits[0]},{limits[1]}"),
+            ('X-RateLimit-Usage', f"{used[0]},{used[1]}"),
+        ]
+
+    def requested(self, path):
+        """How many requests were made for a path, ignoring the query string."""
+        with self._lock:
+            return sum(1 for logged, _ in self.log if logged.split('?')[0] == path)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
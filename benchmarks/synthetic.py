@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Synthetic Rides
+Deterministic ride data written out as .fit files or Strava API payloads, so
+benchmarks can run at any duration, sample rate, lap count and channel set
+without real activity files.
+"""
+
+import json
+import struct
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+# Channels a synthetic ride can carry (Activity channel names)
+SYNTHETIC_CHANNELS = ('power', 'heart_rate', 'cadence', 'speed', 'altitude', 'temperature')
+
+FIT_EPOCH = datetime(1989, 12, 31)
+
+FIT_PROFILE_VERSION = 2132
+
+# FIT base types
+ENUM, SINT8, UINT8, UINT16, UINT32, UINT32Z = 0x00, 0x01, 0x02, 0x84, 0x86, 0x8C
+
+# (field number, numpy dtype, FIT base type, scale, offset) of each record channel
+RECORD_FIELDS = {
+    'power': (7, '<u2', UINT16, 1, 0),
+    'heart_rate': (3, 'u1', UINT8, 1, 0),
+    'cadence': (4, 'u1', UINT8, 1, 0),
+    'speed': (6, '<u2', UINT16, 1000, 0),
+    'altitude': (2, '<u2', UINT16, 5, 500),
+    'temperature': (13, 'i1', SINT8, 1, 0),
+}
+
+# Global message numbers and the local types used for them
+FILE_ID, SESSION, LAP, RECORD = 0, 18, 19, 20
+LOCAL_FILE_ID, LOCAL_RECORD, LOCAL_LAP, LOCAL_SESSION = 0, 1, 2, 3
+
+# file_id / lap / session fields as (field number, struct format, base type)
+FILE_ID_FIELDS = [(0, 'B', ENUM), (1, 'H', UINT16), (2, 'H', UINT16), (3, 'I', UINT32Z), (4, 'I', UINT32)]
+LAP_FIELDS = [
+    (253, 'I', UINT32), (2, 'I', UINT32), (7, 'I', UINT32), (8, 'I', UINT32), (9, 'I', UINT32),
+    (19, 'H', UINT16), (20, 'H', UINT16), (15, 'B', UINT8), (16, 'B', UINT8), (17, 'B', UINT8),
+    (21, 'H', UINT16), (23, 'B', ENUM), (24, 'B', ENUM),
+]
+SESSION_FIELDS = [
+    (253, 'I', UINT32), (2, 'I', UINT32), (5, 'B', ENUM), (7, 'I', UINT32), (8, 'I', UINT32),
+    (9, 'I', UINT32), (11, 'H', UINT16), (22, 'H', UINT16),
+]
+
+CRC_TABLE = (
+    0x0000, 0xCC01, 0xD801, 0x1400, 0xF001, 0x3C00, 0x2800, 0xE401,
+    0xA001, 0x6C00, 0x7800, 0xB401, 0x5000, 0x9C01, 0x8801, 0x4400,
+)
+
+
+class SyntheticRide:
+    """
+    One ride's samples as arrays, with laps as row ranges.
+
+    Laps alternate between endurance and harder efforts; heart rate follows
+    power with a lag, and the whole ride is reproducible from its seed.
+    """
+
+    def __init__(self, duration=3600, sample_rate=1.0, laps=8, channels=SYNTHETIC_CHANNELS,
+                 start_time=datetime(2025, 8, 4, 7, 0), ftp=250, seed=0):
+        unknown = set(channels) - set(SYNTHETIC_CHANNELS)
+        if unknown:
+            raise ValueError(f"Unknown channels: {', '.join(sorted(unknown))}")
+        rng = np.random.default_rng(seed)
+        n = max(1, int(duration * sample_rate))
+        self.start_time = start_time
+        self.channels = tuple(channels)
+        # FIT timestamps are whole seconds, so rates above 1 Hz repeat timestamps
+        self.offsets = np.floor(np.arange(n) / sample_rate).astype(np.int64)
+
+        # Lap boundaries as row indices; odd laps are the efforts
+        laps = max(1, min(laps, n))
+        self.lap_bounds = np.linspace(0, n, laps + 1).astype(np.int64)
+        target = np.empty(n)
+        for i, (lo, hi) in enumerate(zip(self.lap_bounds[:-1], self.lap_bounds[1:])):
+            target[lo:hi] = ftp * (1.05 if i % 2 else 0.65)
+
+        power = np.clip(target + rng.normal(0, 25, n), 0, 1500)
+        lagged = np.convolve(power, np.ones(30) / 30)[:n]
+        heart_rate = np.clip(95 + lagged * 0.3 + rng.normal(0, 2, n), 60, 200)
+        cadence = np.clip(80 + (power - ftp * 0.65) * 0.05 + rng.normal(0, 4, n), 0, 130)
+        speed = np.clip(6 + power / 40 + rng.normal(0, 0.3, n), 0, 25)
+        altitude = 200 + 50 * np.sin(np.arange(n) / max(n / 6.0, 1.0))
+        temperature = np.full(n, 21.0) + rng.normal(0, 0.5, n)
+
+        every = {
+            'power': np.round(power), 'heart_rate': np.round(heart_rate),
+            'cadence': np.round(cadence), 'speed': speed, 'altitude': altitude,
+            'temperature': np.round(temperature),
+        }
+        self.values = {name: every[name] for name in self.channels}
+        self.distance = np.cumsum(speed / sample_rate)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def lap_summaries(self):
+        """Per-lap (start offset, elapsed seconds, distance m, stats) for lap messages and Strava laps."""
+        laps = []
+        for lo, hi in zip(self.lap_bounds[:-1], self.lap_bounds[1:]):
+            if hi <= lo:
+                continue
+            start = int(self.offsets[lo])
+            end = int(self.offsets[hi]) if hi < len(self) else int(self.offsets[-1]) + 1
+            elapsed = end - start
+            stats = {name: (float(v[lo:hi].mean()), float(v[lo:hi].max())) for name, v in self.values.items()}
+            distance = float(self.distance[hi - 1] - (self.distance[lo - 1] if lo else 0.0))
+            laps.append((start, elapsed, distance, stats))
+        return laps
+
+
+def fit_crc(data, crc=0):
+    """CRC-16 as used by the FIT protocol."""
+    for byte in data:
+        tmp = CRC_TABLE[crc & 0xF]
+        crc = (crc >> 4) & 0x0FFF
+        crc = crc ^ tmp ^ CRC_TABLE[byte & 0xF]
+        tmp = CRC_TABLE[crc & 0xF]
+        crc = (crc >> 4) & 0x0FFF
+        crc = crc ^ tmp ^ CRC_TABLE[(byte >> 4) & 0xF]
+    return crc
+
+
+def _definition(local_type, global_num, fields):
+    """Definition message for little-endian fields given as (number, size, base type)."""
+    out = struct.pack('<BBBHB', 0x40 | local_type, 0, 0, global_num, len(fields))
+    for number, size, base_type in fields:
+        out += struct.pack('<BBB', number, size, base_type)
+    return out
+
+
+def _struct_definition(local_type, global_num, fields):
+    return _definition(local_type, global_num,
+                       [(n, struct.calcsize('<' + fmt), t) for n, fmt, t in fields])
+
+
+def _data(local_type, fields, values):
+    return struct.pack('<B' + ''.join(fmt for _, fmt, _ in fields), local_type, *values)
+
+
+def _fit_time(moment):
+    return int((moment - FIT_EPOCH).total_seconds())
+
+
+def _lap_values(start, elapsed, distance, stats, timestamp):
+    def stat(name, which, invalid):
+        return int(round(stats[name][which])) if name in stats else invalid
+    return (
+        timestamp, start, elapsed * 1000, elapsed * 1000, int(distance * 100),
+        stat('power', 0, 0xFFFF), stat('power', 1, 0xFFFF),
+        stat('heart_rate', 0, 0xFF), stat('heart_rate', 1, 0xFF), stat('cadence', 0, 0xFF),
+        0, 0, 0,
+    )
+
+
+def record_bytes(ride, lo, hi):
+    """Record data messages for rows lo:hi, packed in one go through a structured array."""
+    fields = [('header', 'u1'), ('timestamp', '<u4')] + [
+        (name, RECORD_FIELDS[name][1]) for name in ride.channels
+    ]
+    rows = np.zeros(hi - lo, dtype=fields)
+    rows['header'] = LOCAL_RECORD
+    rows['timestamp'] = _fit_time(ride.start_time) + ride.offsets[lo:hi]
+    for name in ride.channels:
+        _, dtype, _, scale, offset = RECORD_FIELDS[name]
+        rows[name] = np.round((ride.values[name][lo:hi] + offset) * scale).astype(dtype)
+    return rows.tobytes()
+
+
+def fit_bytes(ride, serial=1):
+    """A complete .fit file for a synthetic ride."""
+    start = _fit_time(ride.start_time)
+    body = bytearray()
+    body += _struct_definition(LOCAL_FILE_ID, FILE_ID, FILE_ID_FIELDS)
+    body += _data(LOCAL_FILE_ID, FILE_ID_FIELDS, (4, 255, 0, serial, start))
+    body += _definition(LOCAL_RECORD, RECORD, [(253, 4, UINT32)] + [
+        (RECORD_FIELDS[name][0], np.dtype(RECORD_FIELDS[name][1]).itemsize, RECORD_FIELDS[name][2])
+        for name in ride.channels
+    ])
+    body += _struct_definition(LOCAL_LAP, LAP, LAP_FIELDS)
+
+    # Records lap by lap, each lap message following its records like a device writes them
+    for (lo, hi), (lap_start, elapsed, distance, stats) in zip(
+        zip(ride.lap_bounds[:-1], ride.lap_bounds[1:]), ride.lap_summaries()
+    ):
+        body += record_bytes(ride, lo, hi)
+        lap_values = _lap_values(start + lap_start, elapsed, distance, stats,
+                                 start + lap_start + elapsed)
+        body += _data(LOCAL_LAP, LAP_FIELDS, lap_values)
+
+    elapsed = int(ride.offsets[-1]) + 1
+    body += _struct_definition(LOCAL_SESSION, SESSION, SESSION_FIELDS)
+    body += _data(LOCAL_SESSION, SESSION_FIELDS, (
+        start + elapsed, start, 2, elapsed * 1000, elapsed * 1000,
+        int(ride.distance[-1] * 100), int(elapsed * 0.8), 0,
+    ))
+    return fit_container(body)
+
+
+def fit_container(body):
+    """FIT header and CRCs around the given definition and data messages."""
+    header = struct.pack('<BBHI4s', 14, 0x10, FIT_PROFILE_VERSION, len(body), b'.FIT')
+    header += struct.pack('<H', fit_crc(header))
+    data = header + bytes(body)
+    return data + struct.pack('<H', fit_crc(data))
+
+
+def write_fit(path, ride, serial=1):
+    with open(path, 'wb') as f:
+        f.write(fit_bytes(ride, serial))
+    return path
+
+
+def write_fit_folder(folder, count, start_date=datetime(2025, 8, 4, 7, 0), **ride_options):
+    """count synthetic .fit files in folder, one ride per day from start_date."""
+    paths = []
+    for i in range(count):
+        ride = SyntheticRide(start_time=start_date + timedelta(days=i), seed=i, **ride_options)
+        paths.append(write_fit(f"{folder}/synthetic_{i:03d}.fit", ride, serial=i + 1))
+    return paths
+
+
+# Strava stream types for each synthetic channel
+STRAVA_STREAMS = {
+    'power': 'watts',
+    'heart_rate': 'heartrate',
+    'cadence': 'cadence',
+    'speed': 'velocity_smooth',
+    'temperature': 'temp',
+}
+
+
+def strava_payloads(ride, activity_id=1):
+    """{'details', 'streams', 'laps'} JSON bodies (bytes) like the Strava API returns for a ride."""
+    n = len(ride)
+    streams = {'time': {'data': ride.offsets.tolist(), 'series_type': 'distance',
+                        'original_size': n, 'resolution': 'high'}}
+    for channel, key in STRAVA_STREAMS.items():
+        if channel in ride.values:
+            values = ride.values[channel]
+            data = values.astype(int).tolist() if key != 'velocity_smooth' else np.round(values, 2).tolist()
+            streams[key] = {'data': data, 'series_type': 'distance', 'original_size': n, 'resolution': 'high'}
+
+    power = ride.values.get('power')
+    details = {
+        'id': activity_id,
+        'name': f"Synthetic ride {activity_id}",
+        'type': 'Ride',
+        'start_date': ride.start_time.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'elapsed_time': int(ride.offsets[-1]) + 1,
+        'distance': float(ride.distance[-1]),
+        'total_elevation_gain': 0,
+    }
+    if power is not None:
+        details['average_watts'] = float(power.mean())
+        details['max_watts'] = float(power.max())
+
+    laps = [
+        {
+            'elapsed_time': elapsed,
+            'distance': distance,
+            **({'average_watts': stats['power'][0], 'max_watts': stats['power'][1]} if 'power' in stats else {}),
+            **({'average_heartrate': stats['heart_rate'][0], 'max_heartrate': stats['heart_rate'][1]}
+               if 'heart_rate' in stats else {}),
+            **({'average_cadence': stats['cadence'][0]} if 'cadence' in stats else {}),
+            **({'average_speed': stats['speed'][0]} if 'speed' in stats else {}),
+        }
+        for _, elapsed, distance, stats in ride.lap_summaries()
+    ]
+    return {key: json.dumps(value).encode() for key, value in
+            (('details', details), ('streams', streams), ('laps', laps))}
@@ -1,2 +1,5 @@
 FTP = 248
-HRMAX = 180
\ No newline at end of file
+HRMAX = 180
+# How pauses (recording gaps over 10 s) enter the 1 Hz metrics grid: 'skip'
+# leaves them out, 'nan' counts them as missing, 'zero' as zero power/cadence/speed
+PAUSES = 'skip'
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Vectorized FIT Record Decoder
+Fast path for FitActivity.decode(): walks the message headers of a
+memory-mapped .fit file, then gathers each record definition's messages into
+a structured NumPy array in one step and converts only the fields we keep.
+The handful of file_id, session and lap messages are copied into a small FIT
+file of their own and decoded by fitparse, so their values are exactly what a
+full fitparse decode gives.
+
+Files this can't handle (compressed timestamp headers, chained files,
+array-valued or compressed speed fields, developer fields named like a
+channel) return None, and the caller decodes them with fitparse instead.
+"""
+
+import io
+import mmap
+import struct
+
+from lazy_import import lazy_import
+
+np = lazy_import('numpy')
+fitparse = lazy_import('fitparse')
+
+
+# Unix seconds at the FIT epoch, 1989-12-31 00:00:00 UTC
+FIT_EPOCH_SECONDS = 631065600
+
+# Values below this are relative times (seconds since device power-on), not dates
+FIT_MIN_DATE_VALUE = 0x10000000
+
+# int64 minimum, NumPy's NaT
+NAT = -2 ** 63
+
+RECORD_MESG_NUM = 20
+FIELD_DESCRIPTION_MESG_NUM = 206
+
+# Messages FitActivity reads besides records (file_id, session, lap), plus the
+# developer data definitions their fields may refer to
+KEPT_MESG_NUMS = {0, 18, 19, 206, 207}
+
+TIMESTAMP_FIELD = 253
+
+# Record field number -> (channel, scale, offset), as in fitparse's profile
+RECORD_FIELDS = {
+    2: ('altitude', 5, 500),
+    3: ('heart_rate', 1, 0),
+    4: ('cadence', 1, 0),
+    6: ('speed', 1000, 0),
+    7: ('power', 1, 0),
+    13: ('temperature', 1, 0),
+}
+
+# compressed_speed_distance expands into a speed component; valid values go to fitparse
+COMPRESSED_SPEED_DISTANCE_FIELD = 8
+COMPRESSED_SPEED_CHANNEL = 'speed'
+
+# FIT base type number -> (NumPy type code, invalid value)
+BASE_TYPES = {
+    0: ('u1', 0xFF),
+    1: ('i1', 0x7F),
+    2: ('u1', 0xFF),
+    3: ('i2', 0x7FFF),
+    4: ('u2', 0xFFFF),
+    5: ('i4', 0x7FFFFFFF),
+    6: ('u4', 0xFFFFFFFF),
+    10: ('u1', 0),
+    11: ('u2', 0),
+    12: ('u4', 0),
+    14: ('i8', 0x7FFFFFFFFFFFFFFF),
+    15: ('u8', 0xFFFFFFFFFFFFFFFF),
+    16: ('u8', 0),
+}
+
+
+class Unsupported(Exception):
+    """The file needs the fitparse decoder."""
+
+
+class Definition:
+    """A definition message, plus the offsets of the record messages that use it."""
+
+    __slots__ = ('global_num', 'big_endian', 'fields', 'size', 'has_dev_fields', 'offsets')
+
+    def __init__(self, global_num, big_endian, fields, size, has_dev_fields):
+        self.global_num = global_num
+        self.big_endian = big_endian
+        self.fields = fields
+        self.size = size
+        self.has_dev_fields = has_dev_fields
+        self.offsets = []
+
+
+def decode_fit(filepath, channels):
+    """
+    Decode a .fit file's records into NumPy columns.
+
+    Returns {'timestamps': int64 Unix seconds, 'channels': {name: float32},
+    'messages': fitparse messages for file_id, session and lap}, or None if the
+    file should be decoded with fitparse. Channels the records don't carry are
+    all NaN.
+    """
+    try:
+        with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return _decode(data, channels)
+    except (OSError, ValueError, IndexError, struct.error, Unsupported):
+        # ValueError covers empty files, which can't be mapped
+        return None
+
+
+def _decode(data, channels):
+    definitions, kept = _scan(data)
+    records = [d for d in definitions if d.global_num == RECORD_MESG_NUM and d.offsets]
+
+    messages = list(fitparse.FitFile(io.BytesIO(_fit_file(data, kept)), check_crc=False).get_messages())
+    if any(d.has_dev_fields for d in records):
+        _check_developer_fields(messages, channels)
+
+    columns = [_decode_records(data, d, channels) for d in records]
+    if not columns:
+        timestamps = np.empty(0, dtype=np.int64)
+        values = {name: np.empty(0, dtype=np.float32) for name in channels}
+    else:
+        # Messages of several definitions may interleave; put them back in file order
+        order = np.argsort(np.concatenate([np.asarray(d.offsets) for d in records]), kind='stable')
+        timestamps = np.concatenate([t for t, _ in columns])[order]
+        values = {name: np.concatenate([v[name] for _, v in columns])[order] for name in channels}
+
+    return {
+        'timestamps': timestamps,
+        'channels': values,
+        'messages': [m for m in messages if m.name in ('file_id', 'session', 'lap')],
+    }
+
+
+def _scan(data):
+    """
+    Walk the message headers once.
+
+    Returns every definition (record ones collecting their message offsets)
+    and the byte ranges of the definitions and kept data messages.
+    """
+    if len(data) < 12 or data[8:12] != b'.FIT':
+        raise Unsupported('not a FIT file')
+    header_size = data[0]
+    end = header_size + struct.unpack_from('<I', data, 4)[0]
+    if end + 2 != len(data):
+        # Truncated, or several FIT files chained together
+        raise Unsupported('unexpected file size')
+
+    definitions = []
+    local = {}
+    kept = []
+    pos = header_size
+    while pos < end:
+        header = data[pos]
+        if header & 0x80:
+            raise Unsupported('compressed timestamp header')
+
+        if header & 0x40:
+            start = pos
+            big_endian = data[pos + 2] == 1
+            global_num = struct.unpack_from('>H' if big_endian else '<H', data, pos + 3)[0]
+            num_fields = data[pos + 5]
+            pos += 6
+            fields = [tuple(data[pos + 3 * i:pos + 3 * i + 3]) for i in range(num_fields)]
+            pos += 3 * num_fields
+            size = sum(field_size for _, field_size, _ in fields)
+            has_dev_fields = bool(header & 0x20)
+            if has_dev_fields:
+                num_dev_fields = data[pos]
+                size += sum(data[pos + 2 + 3 * i] for i in range(num_dev_fields))
+                pos += 1 + 3 * num_dev_fields
+            definition = Definition(global_num, big_endian, fields, size, has_dev_fields)
+            definitions.append(definition)
+            local[header & 0x0F] = definition
+            kept.append((start, pos))
+            continue
+
+        definition = local.get(header & 0x0F)
+        if definition is None:
+            raise Unsupported('data message without a definition')
+        if definition.global_num == RECORD_MESG_NUM:
+            definition.offsets.append(pos + 1)
+        elif definition.global_num in KEPT_MESG_NUMS:
+            kept.append((pos, pos + 1 + definition.size))
+        pos += 1 + definition.size
+
+    if pos != end:
+        raise Unsupported('message overruns the data')
+    return definitions, kept
+
+
+def _fit_file(data, ranges):
+    """A FIT file made of the given byte ranges, with the original's protocol and profile versions."""
+    body = b''.join(data[start:stop] for start, stop in ranges)
+    header = struct.pack('<BBHI4s', 12, data[1], struct.unpack_from('<H', data, 2)[0], len(body), b'.FIT')
+    return header + body + b'\x00\x00'
+
+
+def _check_developer_fields(messages, channels):
+    """Developer fields named like a channel replace it in fitparse's values, so leave those files to it."""
+    names = {'timestamp', *channels}
+    for message in messages:
+        if message.mesg_num == FIELD_DESCRIPTION_MESG_NUM and message.get_value('field_name') in names:
+            raise Unsupported('developer field named like a channel')
+
+
+def _decode_records(data, definition, channels):
+    """(timestamps, {channel: float32}) for the record messages of one definition."""
+    offsets = np.asarray(definition.offsets, dtype=np.int64)
+    byte_order = '>' if definition.big_endian else '<'
+
+    # Offset, size and base type of each field we read; later duplicates win, as in fitparse
+    wanted = {}
+    position = 0
+    compressed_speed_last = False
+    for field_num, field_size, base_type in definition.fields:
+        if field_num == TIMESTAMP_FIELD or field_num == COMPRESSED_SPEED_DISTANCE_FIELD or (
+                field_num in RECORD_FIELDS and RECORD_FIELDS[field_num][0] in channels):
+            wanted[field_num] = (position, field_size, base_type & 0x1F)
+        if field_num == COMPRESSED_SPEED_DISTANCE_FIELD:
+            compressed_speed_last = True
+        elif field_num in RECORD_FIELDS and RECORD_FIELDS[field_num][0] == COMPRESSED_SPEED_CHANNEL:
+            compressed_speed_last = False
+        position += field_size
+
+    names, formats, field_offsets = [], [], []
+    for field_num, (position, field_size, base_num) in wanted.items():
+        if field_num == COMPRESSED_SPEED_DISTANCE_FIELD:
+            names.append(str(field_num))
+            formats.append(('u1', field_size))
+        else:
+            if base_num not in BASE_TYPES or np.dtype(BASE_TYPES[base_num][0]).itemsize != field_size:
+                # Arrays and non-integer types come out of fitparse as tuples or other values
+                raise Unsupported('unexpected record field type')
+            names.append(str(field_num))
+            formats.append(byte_order + BASE_TYPES[base_num][0])
+        field_offsets.append(position)
+
+    # One gather of every message's bytes, viewed as a structured array
+    dtype = np.dtype({'names': names, 'formats': formats, 'offsets': field_offsets,
+                      'itemsize': definition.size})
+    raw = np.frombuffer(data, dtype=np.uint8)
+    rows = raw[offsets[:, None] + np.arange(definition.size)]
+    del raw
+    messages = rows.view(dtype).reshape(len(offsets))
+
+    if COMPRESSED_SPEED_DISTANCE_FIELD in wanted:
+        if (messages[str(COMPRESSED_SPEED_DISTANCE_FIELD)] != 0xFF).any():
+            raise Unsupported('compressed speed/distance values')
+
+    if TIMESTAMP_FIELD in wanted:
+        stamps = messages[str(TIMESTAMP_FIELD)].astype(np.int64)
+        invalid = BASE_TYPES[wanted[TIMESTAMP_FIELD][2]][1]
+        timestamps = np.where((stamps == invalid) | (stamps < FIT_MIN_DATE_VALUE), NAT,
+                              stamps + FIT_EPOCH_SECONDS)
+    else:
+        timestamps = np.full(len(offsets), NAT, dtype=np.int64)
+
+    values = {name: np.full(len(offsets), np.nan, dtype=np.float32) for name in channels}
+    for field_num, (_, _, base_num) in wanted.items():
+        if field_num not in RECORD_FIELDS:
+            continue
+        name, scale, offset = RECORD_FIELDS[field_num]
+        if name == COMPRESSED_SPEED_CHANNEL and compressed_speed_last:
+            # fitparse lets the (invalid) compressed speed component overwrite the speed field
+            continue
+        column = messages[str(field_num)]
+        scaled = column.astype(np.float64)
+        if scale != 1 or offset:
+            scaled = scaled / scale - offset
+        scaled[column == BASE_TYPES[base_num][1]] = np.nan
+        values[name] = scaled.astype(np.float32)
+    return timestamps, values
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+FIT Activity Loader
+Decodes a .fit file in a single pass into session, lap and columnar record data
+so date filtering, ride metrics and lap metrics can all share one decode.
+Records are decoded by the vectorized fast path in fit_decoder when the file
+allows it; otherwise fitparse's messages are streamed into fixed-size typed
+chunks rather than kept as per-record dicts.
+"""
+
+from lazy_import import lazy_import
+from datetime import datetime, timedelta
+from pathlib import Path
+import os
+import struct
+import sys
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+from activity import Activity, CHANNELS, CHANNEL_DTYPE, to_epoch_seconds_or_nat
+from fit_decoder import decode_fit
+from tracing import span, count
+
+np = lazy_import('numpy')
+fitparse = lazy_import('fitparse')
+
+
+# Per-second record channels kept from each 'record' message
+RECORD_FIELDS = list(CHANNELS)
+
+# Records buffered per typed chunk when decoding with fitparse
+RECORD_CHUNK_SIZE = 4096
+
+# FIT timestamps count seconds from 1989-12-31 00:00:00 UTC
+FIT_EPOCH = datetime(1989, 12, 31)
+
+# Values below this are relative times (seconds since device power-on), not dates
+FIT_MIN_DATE_VALUE = 0x10000000
+
+# How many bytes of the file the header scan is allowed to look at
+HEADER_SCAN_BYTES = 4096
+
+# Try the vectorized decoder before fitparse (FIT_DECODER=fitparse turns it off)
+FAST_DECODE = os.environ.get('FIT_DECODER', 'fast') != 'fitparse'
+
+
+class FitActivity:
+    """A .fit file decoded once into session, laps and record columns."""
+
+    def __init__(self, filepath):
+        self.filepath = str(filepath)
+        self.name = Path(self.filepath).name.replace('.fit', '')
+        self.time_created = None
+        self.session = {}
+        self.laps = []
+        self.records = None
+        self.decoder = None
+        self._fitfile = None
+        self._decoded = False
+
+    def cache_state(self):
+        """The decoded file_id, session and lap values, to be stored with the record columns."""
+        return {
+            'time_created': self.time_created,
+            'session': self.session,
+            'laps': self.laps,
+            'decoder': self.decoder,
+        }
+
+    @classmethod
+    def from_cache_state(cls, filepath, state, records):
+        """A decoded FitActivity rebuilt from cache_state() and its record columns, without reading the file."""
+        activity = cls(filepath)
+        activity.time_created = state['time_created']
+        activity.session = state['session']
+        activity.laps = state['laps']
+        activity.decoder = state['decoder']
+        activity.records = records
+        activity._decoded = True
+        return activity
+
+    def _open(self):
+        if self._fitfile is None:
+            self._fitfile = fitparse.FitFile(self.filepath)
+        return self._fitfile
+
+    def read_time_created(self):
+        """Read file_id.time_created without decoding any record data."""
+        if self.time_created is None and not self._decoded:
+            self.time_created = scan_time_created(self.filepath)
+        if self.time_created is None and not self._decoded:
+            # Fall back to fitparse; it caches parsed messages, so decode() picks up where this stops
+            for message in self._open().get_messages('file_id'):
+                time_created = message.get_value('time_created')
+                if time_created:
+                    self.time_created = time_created
+                    break
+        return self.time_created
+
+    def decode(self):
+        """Decode file_id, session, lap and record messages in one pass."""
+        if self._decoded:
+            return self
+
+        with span('decode', file=self.name) as trace:
+            decoded = decode_fit(self.filepath, RECORD_FIELDS) if FAST_DECODE else None
+            if decoded is not None:
+                self._decode_fast(decoded)
+            else:
+                self._decode_fitparse()
+            if trace is not None:
+                trace['records'] = self.record_count
+                trace['decoder'] = self.decoder
+                count(self.filepath, records=self.record_count, laps=len(self.laps),
+                      bytes=os.path.getsize(self.filepath), decoder=self.decoder)
+        return self
+
+    def _add_message(self, name, vals):
+        """Keep a file_id, session or lap message's values."""
+        if name == 'lap':
+            self.laps.append(vals)
+        elif name == 'session':
+            if not self.session:
+                self.session = vals
+        elif name == 'file_id':
+            if self.time_created is None and vals.get('time_created'):
+                self.time_created = vals.get('time_created')
+
+    def _decode_fast(self, decoded):
+        for message in decoded['messages']:
+            self._add_message(message.name, message.get_values())
+
+        self.records = Activity(decoded['timestamps'], **decoded['channels'])
+        self.decoder = 'fast'
+        self._fitfile = None
+        self._decoded = True
+
+    def _decode_fitparse(self):
+        fitfile = self._open()
+        buffer = RecordBuffer(RECORD_FIELDS)
+
+        for message in fitfile.get_messages(['file_id', 'session', 'lap', 'record']):
+            vals = message.get_values()
+            if message.name == 'record':
+                buffer.append(vals)
+            else:
+                self._add_message(message.name, vals)
+
+        with span('build_columns'):
+            self.records = buffer.columns()
+
+        self.decoder = 'fitparse'
+        self._fitfile = None
+        self._decoded = True
+
+    @property
+    def record_count(self):
+        return len(self.records) if self.records is not None else 0
+
+
+def scan_time_created(filepath):
+    """
+    Read file_id.time_created straight from the FIT header and first messages.
+
+    Only the first few KB of the file are read. Returns None when the file
+    can't be handled this way (compressed timestamp headers, no file_id near
+    the start, relative timestamps) so the caller can fall back to fitparse.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            data = f.read(HEADER_SCAN_BYTES)
+    except OSError:
+        return None
+
+    if len(data) < 12 or data[8:12] != b'.FIT':
+        return None
+
+    header_size = data[0]
+    data_size = struct.unpack_from('<I', data, 4)[0]
+    end = min(len(data), header_size + data_size)
+    pos = header_size
+    definitions = {}
+
+    while pos < end:
+        record_header = data[pos]
+        pos += 1
+
+        if record_header & 0x80:
+            # Compressed timestamp header; leave these to fitparse
+            return None
+
+        local_type = record_header & 0x0F
+
+        if record_header & 0x40:
+            # Definition message
+            if pos + 5 > end:
+                return None
+            big_endian = data[pos + 1] == 1
+            global_num = struct.unpack_from('>H' if big_endian else '<H', data, pos + 2)[0]
+            num_fields = data[pos + 4]
+            pos += 5
+            fields = []
+            for _ in range(num_fields):
+                if pos + 3 > end:
+                    return None
+                fields.append((data[pos], data[pos + 1]))
+                pos += 3
+            size = sum(field_size for _, field_size in fields)
+            if record_header & 0x20:
+                # Developer fields only add to the message size
+                if pos >= end:
+                    return None
+                num_dev_fields = data[pos]
+                pos += 1
+                for _ in range(num_dev_fields):
+                    if pos + 3 > end:
+                        return None
+                    size += data[pos + 1]
+                    pos += 3
+            definitions[local_type] = (global_num, big_endian, fields, size)
+            continue
+
+        # Data message
+        if local_type not in definitions:
+            return None
+        global_num, big_endian, fields, size = definitions[local_type]
+        if pos + size > end:
+            return None
+
+        if global_num == 0:
+            # file_id; time_created is field 4, a uint32
+            offset = pos
+            for field_num, field_size in fields:
+                if field_num == 4 and field_size == 4:
+                    value = struct.unpack_from('>I' if big_endian else '<I', data, offset)[0]
+                    if value == 0xFFFFFFFF or value < FIT_MIN_DATE_VALUE:
+                        return None
+                    return FIT_EPOCH + timedelta(seconds=value)
+                offset += field_size
+            return None
+
+        pos += size
+
+    return None
+
+
+def fit_file_complete(filepath):
+    """
+    Whether a .fit file holds all the data its header announces, so one still
+    being written or copied isn't decoded half-way. Files that don't look like
+    FIT at all count as complete and are left for decoding to reject.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            header = f.read(12)
+            size = os.fstat(f.fileno()).st_size
+    except OSError:
+        return False
+    if len(header) < 12 or header[8:12] != b'.FIT':
+        return len(header) >= 12
+    data_size = struct.unpack_from('<I', header, 4)[0]
+    return size >= header[0] + data_size + 2
+
+
+def _to_float(value):
+    if value is None or isinstance(value, (tuple, list, str)):
+        return np.nan
+    return value
+
+
+class RecordBuffer:
+    """
+    Typed column buffer for record messages.
+
+    Rows are written into a preallocated float32 chunk; full chunks are kept
+    and only concatenated into contiguous columns at the end.
+
+    No ride metrics are accumulated as rows arrive. Metrics count grid seconds
+    from Activity.resample(), which needs the whole ride sorted by time, and the
+    lap metrics, power curve, HR drift and cache all need the columns anyway.
+    """
+
+    def __init__(self, fields, chunk_size=RECORD_CHUNK_SIZE):
+        self.fields = fields
+        self.chunk_size = chunk_size
+        self._chunks = []
+        self._new_chunk()
+
+    def _new_chunk(self):
+        self._timestamps = np.empty(self.chunk_size, dtype=np.int64)
+        self._values = np.empty((self.chunk_size, len(self.fields)), dtype=CHANNEL_DTYPE)
+        self._size = 0
+
+    def append(self, vals):
+        """Append one record's values."""
+        i = self._size
+        self._timestamps[i] = to_epoch_seconds_or_nat(vals.get('timestamp'))
+        self._values[i] = [_to_float(vals.get(field)) for field in self.fields]
+        self._size += 1
+        if self._size == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Move the current partial chunk into the finished chunks."""
+        if self._size:
+            self._chunks.append((self._timestamps[:self._size], self._values[:self._size]))
+            self._new_chunk()
+
+    def columns(self):
+        """All buffered rows as an Activity with contiguous columns."""
+        self.flush()
+        if not self._chunks:
+            return Activity(np.empty(0, dtype=np.int64), **{f: np.empty(0) for f in self.fields})
+        timestamps = np.concatenate([t for t, _ in self._chunks])
+        values = np.concatenate([v for _, v in self._chunks])
+        return Activity(timestamps, **{f: values[:, j] for j, f in enumerate(self.fields)})
+
+
+def peak_memory_mb(children=False):
+    """Peak resident memory of this process (or its finished worker processes) in MB."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is kilobytes on Linux but bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return usage.ru_maxrss / divisor
+
+
+def load_fit_activity(filepath):
+    """Open and fully decode a .fit file."""
+    return FitActivity(filepath).decode()
+
+
+def ensure_activity(activity):
+    """Accept a FitActivity or a path to a .fit file and return a decoded FitActivity."""
+    if isinstance(activity, FitActivity):
+        return activity.decode()
+    return load_fit_activity(activity)
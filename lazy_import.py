@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Lazy Imports
+Deferred loading for the heavy third-party packages (NumPy, fitparse,
+requests, pyarrow), so `--help`, argument errors and calls handed to the
+resident worker don't pay for importing them. A lazily imported module is
+only imported when one of its attributes is first used.
+"""
+
+import importlib
+import importlib.util
+import threading
+
+
+class LazyModule:
+    """
+    Stands in for a module until an attribute is first looked up, then imports it.
+
+    The import happens under a lock, since the first use may come from several
+    threads at once (Strava fetches). Afterwards the module's attributes are
+    copied onto the stand-in, so later lookups cost what a module lookup does.
+    """
+
+    def __init__(self, name):
+        self._lazy_name = name
+        self._lazy_lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        # Only called for attributes not found normally, i.e. before the import
+        # or for attributes the module itself creates on demand
+        with self._lazy_lock:
+            module = importlib.import_module(self._lazy_name)
+            self.__dict__.update(vars(module))
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._lazy_name!r}>"
+
+
+def lazy_import(name):
+    """
+    A stand-in for the top-level module called name, imported on first use, or None if it isn't installed.
+
+    Use it as `np = lazy_import('numpy')`: module-level code must not touch np
+    (constants, default arguments), or the import happens right away.
+    """
+    if importlib.util.find_spec(name) is None:
+        return None
+    return LazyModule(name)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Season and All-Time Power Bests
+Persistent mean-max power curves per season and all-time, updated one ride at
+a time with an elementwise max so old rides never need to be re-read.
+"""
+
+import json
+import os
+from lazy_import import lazy_import
+from pathlib import Path
+
+np = lazy_import('numpy')
+
+
+BESTS_FILENAME = '.power_bests.json'
+
+ALL_TIME = 'all_time'
+
+# Durations (seconds) tracked in the store: every second up to a minute, then
+# progressively coarser steps out to 6 hours
+BESTS_DURATIONS = (
+    *range(1, 61),
+    *range(65, 601, 5),
+    *range(630, 3601, 30),
+    *range(3660, 21601, 60),
+)
+
+
+def season_key(ride_date):
+    """Seasons are calendar years."""
+    return str(ride_date.year)
+
+
+class PowerBestsStore:
+    """
+    Best mean-max power per duration for each season and all-time.
+
+    Every best remembers which ride set it, so the rides of a given week can be
+    checked for new bests however many times the review is re-run.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.durations = np.array(BESTS_DURATIONS)
+        self.rides = []
+        self._ride_indices = {}
+        self.curves = {}
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                stored = json.load(f)
+            if stored.get('durations') == self.durations.tolist():
+                self.rides = stored['rides']
+                self._ride_indices = {ride_id: i for i, ride_id in enumerate(self.rides)}
+                for scope, curve in stored['curves'].items():
+                    watts = np.array([np.nan if w is None else w for w in curve['watts']], dtype=float)
+                    self.curves[scope] = (watts, np.array(curve['sources'], dtype=int))
+
+    @classmethod
+    def for_folder(cls, folder_path):
+        return cls(Path(folder_path) / BESTS_FILENAME)
+
+    def _ride_index(self, ride_id):
+        if ride_id not in self._ride_indices:
+            self._ride_indices[ride_id] = len(self.rides)
+            self.rides.append(ride_id)
+        return self._ride_indices[ride_id]
+
+    def update(self, ride_id, ride_date, watts):
+        """
+        Merge one ride's curve (aligned with BESTS_DURATIONS) into its season and all-time.
+
+        Returns the scopes whose curve improved.
+        """
+        # Stored at 0.1 W, so compare at the same precision
+        watts = np.round(np.asarray(watts, dtype=float), 1)
+        ride_index = self._ride_index(ride_id)
+        improved = []
+
+        for scope in (season_key(ride_date), ALL_TIME):
+            best, sources = self.curves.get(scope, (
+                np.full(len(self.durations), np.nan),
+                np.full(len(self.durations), -1, dtype=int),
+            ))
+            better = watts > np.nan_to_num(best, nan=-np.inf)
+            if better.any():
+                best = np.where(better, watts, best)
+                sources = np.where(better, ride_index, sources)
+                self.curves[scope] = (best, sources)
+                improved.append(scope)
+
+        return improved
+
+    def update_from_curve(self, ride_id, ride_date, curve):
+        """Merge a {'5s': watts, ...} power curve, ignoring durations the store doesn't track."""
+        watts = np.full(len(self.durations), np.nan)
+        for label, value in curve.items():
+            d = int(label.rstrip('s'))
+            i = np.searchsorted(self.durations, d)
+            if i < len(self.durations) and self.durations[i] == d and value is not None:
+                watts[i] = value
+        return self.update(ride_id, ride_date, watts)
+
+    def bests_set_by(self, ride_ids, durations=None):
+        """
+        Current bests that were set by any of ride_ids.
+
+        Returns {scope: [(duration, watts, ride_id), ...]}, optionally limited to durations.
+        """
+        indices = {self._ride_indices[r] for r in ride_ids if r in self._ride_indices}
+        wanted = self.durations if durations is None else np.intersect1d(self.durations, durations)
+        positions = np.searchsorted(self.durations, wanted)
+
+        found = {}
+        for scope in sorted(self.curves, key=lambda s: (s == ALL_TIME, s)):
+            best, sources = self.curves[scope]
+            entries = [
+                (int(self.durations[i]), float(best[i]), self.rides[sources[i]])
+                for i in positions if sources[i] in indices
+            ]
+            if entries:
+                found[scope] = entries
+        return found
+
+    def save(self):
+        stored = {
+            'durations': self.durations.tolist(),
+            'rides': self.rides,
+            'curves': {
+                scope: {
+                    'watts': [None if np.isnan(w) else round(float(w), 1) for w in best],
+                    'sources': sources.tolist(),
+                }
+                for scope, (best, sources) in self.curves.items()
+            },
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(stored, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Mean-Maximal Power Curve
+Best average power over a set of durations, computed from one cumulative sum
+of the power stream instead of a separate rolling mean per duration.
+"""
+
+from lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+
+# Durations (seconds) reported in ride summaries, up to 1 hour
+DEFAULT_DURATIONS = [5, 10, 15, 30, 60, 120, 180, 300, 600, 900, 1200, 1800, 2400, 3600]
+
+
+def mean_max_power(power, durations):
+    """
+    Best average power for each duration, assuming one sample per second.
+
+    power: 1-D array-like of watts; NaN samples invalidate any window containing them,
+           matching pandas' rolling(d).mean().
+    durations: window lengths in samples. Each one costs a pass over the ride, so
+               pass a grid such as power_bests.BESTS_DURATIONS rather than every
+               second of a long ride.
+
+    Returns a float64 array aligned with durations, NaN where the ride is shorter
+    than the duration or no window is free of gaps.
+    """
+    power = np.asarray(power, dtype=float)
+    n = len(power)
+    durations = np.asarray(durations, dtype=int)
+
+    missing = np.isnan(power)
+    # Prefix sums with a leading zero so window sums are cumsum[i + d] - cumsum[i]
+    cumsum = np.concatenate(([0.0], np.cumsum(np.where(missing, 0.0, power))))
+    has_missing = missing.any()
+    if has_missing:
+        missing_cumsum = np.concatenate(([0], np.cumsum(missing)))
+
+    best = np.full(len(durations), np.nan)
+    for i, d in enumerate(durations):
+        if d < 1 or d > n:
+            continue
+        window_sums = cumsum[d:] - cumsum[:-d]
+        if has_missing:
+            window_sums = window_sums[(missing_cumsum[d:] - missing_cumsum[:-d]) == 0]
+            if not len(window_sums):
+                continue
+        best[i] = window_sums.max() / d
+
+    return best
+
+
+def power_curve(power, durations=DEFAULT_DURATIONS):
+    """Power curve as {'5s': watts, ...} for every duration the ride is long enough for."""
+    durations = [d for d in durations if len(power) >= d]
+    best = mean_max_power(power, durations)
+    return {f"{d}s": round(float(watts), 1) for d, watts in zip(durations, best)}
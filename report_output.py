@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Report Output
+Machine-readable output for the entry points, alongside their markdown/text
+reports: one JSON document, JSON Lines written (and flushed) as each ride or
+lap is produced, or one columnar Parquet table per record kind ('rides',
+'laps', ...). Parquet needs pyarrow.
+"""
+
+import abc
+import argparse
+import json
+import math
+import sys
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from datetime import date, datetime, time
+from pathlib import Path
+
+from lazy_import import lazy_import
+
+pa = lazy_import('pyarrow')  # optional, only needed for --output-format parquet
+
+
+OUTPUT_FORMATS = ('markdown', 'json', 'jsonl', 'parquet')
+
+
+def output_format(value):
+    """argparse type for --output-format, rejecting parquet up front when pyarrow is missing."""
+    if value not in OUTPUT_FORMATS:
+        raise argparse.ArgumentTypeError(f"invalid choice: {value!r} (choose from {', '.join(OUTPUT_FORMATS)})")
+    if value == 'parquet' and pa is None:
+        raise argparse.ArgumentTypeError("parquet output needs pyarrow (pip install pyarrow)")
+    return value
+
+
+def add_output_arguments(parser, default_name):
+    parser.add_argument(
+        '--output-format',
+        type=output_format,
+        help='markdown (text for pasting), json, jsonl (one record per line, streamed) '
+             'or parquet (a table per record kind). Default: markdown',
+        default='markdown'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        help=f'File for json/jsonl (default: stdout), or the path prefix of the parquet '
+             f'tables (default: {default_name}, giving {default_name}_rides.parquet, ...)',
+        default=None
+    )
+
+
+def plain(value):
+    """Record values as plain Python: NumPy scalars and arrays unwrapped, NaN as None, dict keys as strings."""
+    if isinstance(value, dict):
+        return {str(k): plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(v) for v in value]
+    if hasattr(value, 'tolist'):
+        # NumPy scalar or array
+        return plain(value.tolist())
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return str(value)
+
+
+def flatten(record, prefix=''):
+    """One level of columns for a record: nested dicts become 'key.subkey', lists JSON text."""
+    columns = {}
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            columns.update(flatten(value, f"{name}."))
+        elif isinstance(value, list):
+            columns[name] = json.dumps(value, default=_json_default)
+        else:
+            columns[name] = value
+    return columns
+
+
+class ReportWriter(abc.ABC):
+    """Takes records one at a time with write(kind, record); close() finishes the output."""
+
+    def __init__(self, output=None):
+        self.output = output
+        self.records = 0
+
+    @property
+    def to_stdout(self):
+        return False
+
+    def write(self, kind, record):
+        self.records += 1
+        self._write(kind, plain(record))
+
+    @abc.abstractmethod
+    def _write(self, kind, record):
+        """Take one record, already converted by plain()."""
+
+    def close(self):
+        pass
+
+
+class StreamWriter(ReportWriter):
+    """A writer producing one text stream: the output file, or stdout without one."""
+
+    def __init__(self, output=None):
+        super().__init__(output)
+        self.stream = open(output, 'w') if output else sys.stdout
+
+    @property
+    def to_stdout(self):
+        return self.stream is sys.stdout
+
+    def close(self):
+        if not self.to_stdout:
+            self.stream.close()
+
+
+class JsonLinesWriter(StreamWriter):
+    """Each record on its own line as {"record": kind, ...}, flushed as it is written."""
+
+    def _write(self, kind, record):
+        self.stream.write(json.dumps({'record': kind, **record}, default=_json_default) + "\n")
+        self.stream.flush()
+
+
+class JsonWriter(StreamWriter):
+    """One JSON document {kind: [records]}, written on close."""
+
+    def __init__(self, output=None):
+        super().__init__(output)
+        self.tables = {}
+
+    def _write(self, kind, record):
+        self.tables.setdefault(kind, []).append(record)
+
+    def close(self):
+        json.dump(self.tables, self.stream, indent=2, default=_json_default)
+        self.stream.write("\n")
+        super().close()
+
+
+class ParquetWriter(ReportWriter):
+    """
+    A Parquet table per record kind, at <prefix>_<kind>.parquet.
+
+    Rows are buffered and written column by column on close, since their
+    columns (zones, power curve durations) are only known once every record
+    is in.
+    """
+
+    def __init__(self, output):
+        super().__init__(output)
+        self.tables = {}
+        self.paths = []
+
+    def _write(self, kind, record):
+        self.tables.setdefault(kind, []).append(flatten(record))
+
+    def close(self):
+        import pyarrow.parquet as pq
+        for kind, rows in self.tables.items():
+            names = list(dict.fromkeys(name for row in rows for name in row))
+            table = pa.table({name: _column([row.get(name) for row in rows]) for name in names})
+            path = Path(f"{self.output}_{kind}.parquet")
+            pq.write_table(table, path)
+            self.paths.append(path)
+        if self.paths:
+            print(f"Parquet tables written: {', '.join(str(p) for p in self.paths)}", file=sys.stderr)
+
+
+def _column(values):
+    """An Arrow array for a column, as text if its values don't share a type."""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in values])
+
+
+def open_writer(fmt, output=None, default_name='report'):
+    """The writer for a machine-readable format, or None for markdown."""
+    if fmt == 'json':
+        return JsonWriter(output)
+    if fmt == 'jsonl':
+        return JsonLinesWriter(output)
+    if fmt == 'parquet':
+        return ParquetWriter(output or default_name)
+    return None
+
+
+@contextmanager
+def report(fmt, output=None, default_name='report'):
+    """
+    Yield the writer for fmt (None for markdown) and close it on exit.
+
+    While records are going to stdout, the script's progress messages are sent
+    to stderr so stdout stays parseable.
+    """
+    writer = open_writer(fmt, output, default_name)
+    if writer is None:
+        yield None
+        return
+    try:
+        with redirect_stdout(sys.stderr) if writer.to_stdout else nullcontext():
+            yield writer
+    finally:
+        writer.close()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Resident Worker
+A long-lived interpreter that has already imported NumPy, fitparse, requests,
+pyarrow and the review scripts, serving calls to weekly_review.py,
+batch_review.py, intervals, parse and strava_parse.py over a Unix socket.
+
+While it runs, those scripts hand each call to it before importing anything
+heavy. The worker forks a child per call, which takes over the caller's
+stdin/stdout/stderr, working directory and environment, so output, prompts,
+exit codes, Ctrl-C and relative paths behave as if the script had run in the
+caller's process. FIT_WORKER=off in the environment runs a script in-process
+instead. Settings read at import time (FIT_DECODER) follow the worker's own
+environment; restart it after changing them. Edits to the scripts or the
+modules they import are noticed: the next call is refused, so it runs
+in-process, and the worker restarts itself on the new code.
+"""
+
+import json
+import os
+import signal
+import socket
+import sys
+
+# Set in the environment to run scripts in-process; set automatically inside the worker
+WORKER_ENV = 'FIT_WORKER'
+SOCKET_ENV = 'FIT_WORKER_SOCKET'
+
+# Scripts the worker runs, next to this file
+SCRIPTS = ('weekly_review.py', 'batch_review.py', 'intervals', 'parse', 'strava_parse.py')
+
+# Imported before serving, though the scripts only import them lazily
+PRELOAD = ('numpy', 'fitparse', 'requests', 'pyarrow.parquet', 'concurrent.futures.process')
+
+MAX_REQUEST_SIZE = 1024 * 1024
+
+
+def socket_path():
+    """FIT_WORKER_SOCKET, else a per-user socket in the runtime or temp directory."""
+    if os.environ.get(SOCKET_ENV):
+        return os.environ[SOCKET_ENV]
+    folder = os.environ.get('XDG_RUNTIME_DIR') or os.environ.get('TMPDIR') or '/tmp'
+    return os.path.join(folder, f"fit-review-worker-{os.getuid()}.sock")
+
+
+def _send(conn, message):
+    conn.sendall(json.dumps(message).encode() + b"\n")
+
+
+def _receive(stream):
+    line = stream.readline(MAX_REQUEST_SIZE)
+    return json.loads(line) if line else None
+
+
+# --- Client side: used by the scripts, so stdlib only ---
+
+def forward_to_worker(name, script):
+    """
+    Run this script call in the resident worker, if one is listening, and exit with its status.
+
+    Call at the top of a script as forward_to_worker(__name__, __file__). Returns
+    (so the script runs normally) when imported as a module, when FIT_WORKER=off,
+    when no worker is running or when the worker doesn't serve this script.
+    """
+    if name != '__main__' or os.environ.get(WORKER_ENV) == 'off':
+        return
+    if not hasattr(socket, 'AF_UNIX') or not hasattr(os, 'fork'):
+        return
+    path = socket_path()
+    if not os.path.exists(path):
+        return
+
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+        request = {
+            'command': 'run',
+            'script': os.path.realpath(script),
+            'argv': sys.argv[1:],
+            'cwd': os.getcwd(),
+            'env': dict(os.environ),
+        }
+        socket.send_fds(conn, [json.dumps(request).encode() + b"\n"], [0, 1, 2])
+        stream = conn.makefile('rb')
+        started = _receive(stream)
+    except (OSError, ValueError):
+        # Stale socket or a worker that went away; run in-process
+        conn.close()
+        return
+    if not started or 'pid' not in started:
+        conn.close()
+        if started and started.get('stale'):
+            print(f"Warning: {started['error']}; running in-process", file=sys.stderr)
+        return
+
+    # Ctrl-C and termination reach this process, not the worker's child; pass them on
+    def forward_signal(signum, frame):
+        try:
+            os.kill(started['pid'], signum)
+        except ProcessLookupError:
+            pass
+
+    signal.signal(signal.SIGINT, forward_signal)
+    signal.signal(signal.SIGTERM, forward_signal)
+    try:
+        finished = _receive(stream)
+    except (OSError, ValueError):
+        finished = None
+    conn.close()
+    sys.exit(finished['exit'] if finished else 1)
+
+
+# --- Worker side ---
+
+def parse_arguments():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Keep the review scripts loaded and serve their calls over a Unix socket'
+    )
+    parser.add_argument(
+        'command',
+        choices=('start', 'stop', 'status'),
+        help='start: serve in the foreground until stopped; stop: stop a running worker; '
+             'status: report whether one is running'
+    )
+    parser.add_argument(
+        '--socket',
+        type=str,
+        help='Socket path. Default: FIT_WORKER_SOCKET, else fit-review-worker-<uid>.sock '
+             'in XDG_RUNTIME_DIR or the temp directory',
+        default=None
+    )
+    return parser.parse_args()
+
+
+def preload(folder):
+    """Import the heavy packages and review modules, and compile the scripts; {path: code}."""
+    import importlib
+    sys.path.insert(0, folder)
+    for name in PRELOAD:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+    scripts = {}
+    for script in SCRIPTS:
+        path = os.path.realpath(os.path.join(folder, script))
+        with open(path) as f:
+            scripts[path] = compile(f.read(), path, 'exec')
+        if script.endswith('.py'):
+            importlib.import_module(script[:-3])
+    return scripts
+
+
+def source_mtimes(folder, scripts):
+    """mtime of each script and of every module imported from folder; {path: mtime_ns}."""
+    paths = set(scripts)
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None)
+        if path and os.path.realpath(path).startswith(folder + os.sep):
+            paths.add(os.path.realpath(path))
+    return {path: os.stat(path).st_mtime_ns for path in paths}
+
+
+class Worker:
+    """
+    Accepts calls on a Unix socket and runs each in a forked child.
+
+    Calls are refused once any file in sources has changed since it was loaded,
+    and the worker then stops with restart set, rather than run stale code.
+    """
+
+    def __init__(self, path, scripts, sources):
+        self.path = path
+        self.scripts = scripts
+        self.sources = sources
+        self.stopping = False
+        self.restart = False
+        self.stats = {'calls': 0, 'rejected': 0}
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Only this user may connect
+        old_umask = os.umask(0o177)
+        try:
+            self.listener.bind(path)
+        finally:
+            os.umask(old_umask)
+        self.listener.listen(16)
+        self.listener.settimeout(1.0)
+
+    def serve(self):
+        while not self.stopping:
+            self._reap()
+            try:
+                conn, _ = self.listener.accept()
+            except socket.timeout:
+                continue
+            except InterruptedError:
+                continue
+            with conn:
+                conn.settimeout(5.0)
+                try:
+                    self._handle(conn)
+                except (OSError, ValueError) as e:
+                    print(f"Warning: Dropped a call: {e}", file=sys.stderr)
+
+    def _handle(self, conn):
+        if hasattr(socket, 'SO_PEERCRED'):
+            # pid, uid, gid of the caller; the socket's permissions already keep other users out
+            creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, 12)
+            if int.from_bytes(creds[4:8], sys.byteorder) != os.getuid():
+                self.stats['rejected'] += 1
+                return
+
+        data, fds, _, _ = socket.recv_fds(conn, MAX_REQUEST_SIZE, 3)
+        try:
+            while not data.endswith(b"\n"):
+                chunk = conn.recv(MAX_REQUEST_SIZE)
+                if not chunk or len(data) > MAX_REQUEST_SIZE:
+                    return
+                data += chunk
+            request = json.loads(data)
+            changed = self.changed_sources() if request.get('command') == 'run' else []
+
+            if request.get('command') == 'stop':
+                self.stopping = True
+                _send(conn, {'stopped': os.getpid()})
+            elif request.get('command') == 'status':
+                _send(conn, {'pid': os.getpid(), **self.stats})
+            elif changed:
+                names = ', '.join(os.path.basename(path) for path in changed)
+                self.stats['rejected'] += 1
+                self.stopping = self.restart = True
+                print(f"{names} changed since the worker started; restarting", file=sys.stderr)
+                _send(conn, {'error': f"{names} changed since the resident worker started; "
+                                      f"it is restarting", 'stale': True})
+            elif request.get('command') == 'run' and request.get('script') in self.scripts and len(fds) == 3:
+                self.stats['calls'] += 1
+                if os.fork() == 0:
+                    self._run_child(conn, request, fds)
+            else:
+                self.stats['rejected'] += 1
+                _send(conn, {'error': 'not served by this worker'})
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def changed_sources(self):
+        """Loaded files that were edited, replaced or removed since the worker started."""
+        changed = []
+        for path, mtime_ns in self.sources.items():
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime_ns:
+                changed.append(path)
+        return changed
+
+    def _run_child(self, conn, request, fds):
+        """Run one script call in the forked child; never returns."""
+        code = 1
+        try:
+            self.listener.close()
+            # A session of its own, so reading the caller's terminal isn't treated as background job I/O
+            os.setsid()
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            for target, fd in enumerate(fds):
+                os.dup2(fd, target)
+            sys.stdin = open(0, 'r', closefd=False)
+            sys.stdout = open(1, 'w', buffering=1 if os.isatty(1) else -1, closefd=False)
+            sys.stderr = open(2, 'w', buffering=1, errors='backslashreplace', closefd=False)
+
+            os.chdir(request['cwd'])
+            os.environ.clear()
+            os.environ.update(request['env'])
+            os.environ[WORKER_ENV] = 'off'
+
+            conn.settimeout(None)
+            _send(conn, {'pid': os.getpid()})
+            code = self._run_script(request['script'], request['argv'])
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                _send(conn, {'exit': code})
+            except OSError:
+                pass
+            os._exit(code)
+
+    def _run_script(self, path, argv):
+        """Run a compiled script as __main__; its exit status."""
+        import traceback
+        import types
+        module = types.ModuleType('__main__')
+        module.__file__ = path
+        sys.modules['__main__'] = module
+        sys.argv = [path, *argv]
+        try:
+            exec(self.scripts[path], module.__dict__)
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                return e.code or 0
+            print(e.code, file=sys.stderr)
+            return 1
+        except KeyboardInterrupt:
+            return 130
+        except BaseException as e:
+            # Leave this frame out, as if the script had been run directly
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+            return 1
+        return 0
+
+    def _reap(self):
+        """Collect finished children."""
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+    def close(self):
+        self.listener.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def request(path, command):
+    """Send a control command to a running worker; its reply, or None if none is listening."""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+        socket.send_fds(conn, [json.dumps({'command': command}).encode() + b"\n"], [])
+        return _receive(conn.makefile('rb'))
+    except OSError:
+        return None
+    finally:
+        conn.close()
+
+
+def main():
+    args = parse_arguments()
+    path = args.socket or socket_path()
+
+    if args.command == 'stop':
+        reply = request(path, 'stop')
+        print(f"Stopped worker {reply['stopped']}" if reply else f"No worker listening on {path}")
+        return
+    if args.command == 'status':
+        reply = request(path, 'status')
+        if reply is None:
+            print(f"No worker listening on {path}")
+            sys.exit(1)
+        print(f"Worker {reply['pid']} on {path}: {reply['calls']} calls served, {reply['rejected']} rejected")
+        return
+
+    if request(path, 'status') is not None:
+        print(f"Error: A worker is already listening on {path}")
+        sys.exit(1)
+    if os.path.exists(path):
+        # Left behind by a worker that didn't shut down cleanly
+        os.unlink(path)
+
+    folder = os.path.dirname(os.path.realpath(__file__))
+    scripts = preload(folder)
+    worker = Worker(path, scripts, source_mtimes(folder, scripts))
+
+    def request_stop(signum, frame):
+        worker.stopping = True
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    print(f"Worker {os.getpid()} serving {', '.join(SCRIPTS)} on {path}", flush=True)
+    try:
+        worker.serve()
+    finally:
+        worker.close()
+    print(f"Worker stopped after {worker.stats['calls']} calls", flush=True)
+    if worker.restart:
+        # Start over in this process so the new code is compiled and imported
+        os.execv(sys.executable, [sys.executable, os.path.realpath(__file__), *sys.argv[1:]])
+
+
+if __name__ == "__main__":
+    main()
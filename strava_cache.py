@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Strava Response Cache
+Stores Strava API responses in a local SQLite file so repeat analyses of the
+same activities don't go back to the network. Streams and laps never change
+once a ride is uploaded and are kept until evicted; activity details expire
+after a TTL and are then revalidated with ETag/If-Modified-Since. Responses are
+only served back to the access token that fetched them.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+
+CACHE_FILENAME = '.strava_cache.sqlite'
+
+# Bump when the layout of cached responses changes
+CACHE_VERSION = 3
+
+# Seconds before cached activity details are revalidated with the API
+DETAILS_TTL = 24 * 60 * 60
+
+# Least recently used responses are evicted past this many entries
+MAX_ENTRIES = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    immutable INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+def default_cache_path():
+    """STRAVA_CACHE in the environment, else .strava_cache.sqlite in the working directory."""
+    return os.environ.get('STRAVA_CACHE', CACHE_FILENAME)
+
+
+def credential_scope(access_token):
+    """Hash of an access token, so one athlete's cached responses are never served to another."""
+    return hashlib.blake2b(access_token.encode(), digest_size=20, person=b'strava-token').hexdigest()
+
+
+def request_key(path, params=None, scope=''):
+    """Content address of a request: hash of the credential scope, the path and its sorted query parameters."""
+    canonical = scope + ' ' + path + '?' + '&'.join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+    return hashlib.blake2b(canonical.encode(), digest_size=20).hexdigest()
+
+
+def is_immutable(path):
+    """Streams and laps of an uploaded activity never change; details can be edited."""
+    return path.endswith('/streams') or path.endswith('/laps')
+
+
+class StravaCache:
+    """
+    Thread-safe SQLite cache of raw Strava API responses.
+
+    Bodies are stored zlib-compressed, keyed by request_key() under the
+    caller's credential_scope(), and decoded by the caller. lookup() returns
+    the cached content with a 'fresh' flag; stale entries carry the validators
+    the client needs for a conditional request. Entries past max_entries are
+    evicted least recently used first.
+    """
+
+    def __init__(self, path=None, ttl=DETAILS_TTL, max_entries=MAX_ENTRIES, clock=time.time):
+        self.path = str(path or default_cache_path())
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        # Shared by the client's worker threads, so access is serialized here
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+
+    def lookup(self, path, params=None, scope=''):
+        """
+        Find a cached response.
+
+        Returns None on a miss, otherwise a dict with the raw 'content', its
+        'etag'/'last_modified' validators and whether it is 'fresh' enough to
+        use without asking the API.
+        """
+        key = request_key(path, params, scope)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT version, body, etag, last_modified, immutable, fetched_at "
+                "FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if not row or row[0] != CACHE_VERSION:
+                self.stats['misses'] += 1
+                return None
+
+            now = self.clock()
+            fresh = bool(row[4]) or now - row[5] < self.ttl
+            if fresh:
+                self.stats['hits'] += 1
+                self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return {
+            'content': zlib.decompress(row[1]),
+            'etag': row[2],
+            'last_modified': row[3],
+            'fresh': fresh,
+        }
+
+    def conditional_headers(self, entry):
+        """If-None-Match/If-Modified-Since headers for revalidating a stale entry."""
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def revalidated(self, path, params=None, scope=''):
+        """The API answered 304 Not Modified: restart the entry's TTL."""
+        now = self.clock()
+        with self._lock:
+            self.conn.execute(
+                "UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, request_key(path, params, scope)),
+            )
+            self.stats['revalidated'] += 1
+
+    def store(self, path, params, content, headers=None, scope=''):
+        """Cache a raw response body along with its validators."""
+        headers = headers or {}
+        now = self.clock()
+        blob = zlib.compress(content, 6)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, path, version, body, etag, last_modified, immutable, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    request_key(path, params, scope),
+                    path,
+                    CACHE_VERSION,
+                    blob,
+                    headers.get('ETag'),
+                    headers.get('Last-Modified'),
+                    int(is_immutable(path)),
+                    now,
+                    now,
+                ),
+            )
+            self.stats['stored'] += 1
+
+    def evict(self):
+        """Drop least recently used entries beyond max_entries."""
+        with self._lock:
+            count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                self.conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                )
+                self.stats['evicted'] += excess
+
+    def format_stats(self):
+        return (f"Strava cache: {self.stats['hits']} hits, {self.stats['revalidated']} revalidated, "
+                f"{self.stats['misses']} misses, {self.stats['stored']} stored, "
+                f"{self.stats['evicted']} evicted ({self.path})")
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Strava API Client
+Connection-pooled HTTP client for the Strava API. The details, streams and laps
+of an activity are fetched concurrently, and batches of activities are synced
+with a bounded number of requests in flight, paced to stay inside Strava's
+15-minute and daily rate limits.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from lazy_import import lazy_import
+from strava_cache import credential_scope
+from strava_streams import decode_streams, loads
+from tracing import span
+
+requests = lazy_import('requests')
+
+
+STRAVA_API_URL = "https://www.strava.com/api/v3"
+
+# Streams requested for every activity
+STREAM_KEYS = ('time', 'heartrate', 'cadence', 'watts', 'temp', 'velocity_smooth')
+
+# Requests in flight at once when syncing a batch of activities
+DEFAULT_CONCURRENCY = 8
+
+
+# Seconds per rate-limit window: Strava's short window resets on the quarter
+# hour and the daily one at midnight UTC
+SHORT_WINDOW = 15 * 60
+DAILY_WINDOW = 24 * 60 * 60
+
+# Below this share of the short-window budget, calls are spread evenly over
+# what's left of the window instead of sent as fast as possible
+PACE_FRACTION = 0.1
+
+# Longest the scheduler will wait for budget before giving up (seconds)
+MAX_WAIT = SHORT_WINDOW + 60
+
+# Retries for 429/5xx and connection errors, with jittered exponential backoff
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+
+class StravaAPIError(Exception):
+    """A Strava request failed with an error status or couldn't be made."""
+
+    def __init__(self, message, status_code=None, url=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.url = url
+
+    @property
+    def fatal(self):
+        """Whether every further request would fail too: rejected credentials or an exhausted rate limit."""
+        return self.status_code in (401, 429)
+
+
+class StravaRateLimitError(StravaAPIError):
+    """The rate limit budget won't free up within the scheduler's max_wait."""
+
+    fatal = True
+
+
+def parse_rate_limit(headers):
+    """
+    (limits, usage) as (short, daily) pairs from response headers, or None if absent.
+
+    Strava reports overall limits in X-RateLimit-* and, for read endpoints, a
+    tighter X-ReadRateLimit-* pair; the tighter remaining budget wins.
+    """
+    found = []
+    for prefix in ('X-RateLimit', 'X-ReadRateLimit'):
+        limit = headers.get(f'{prefix}-Limit')
+        usage = headers.get(f'{prefix}-Usage')
+        if not limit or not usage:
+            continue
+        try:
+            limits = tuple(int(v) for v in limit.split(',')[:2])
+            used = tuple(int(v) for v in usage.split(',')[:2])
+        except ValueError:
+            continue
+        if len(limits) == 2 and len(used) == 2:
+            found.append((limits, used))
+    if not found:
+        return None
+    return min(found, key=lambda f: min(f[0][0] - f[1][0], f[0][1] - f[1][1]))
+
+
+def retry_after(headers):
+    """Seconds from a Retry-After header, if it holds a number."""
+    try:
+        return max(0.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitScheduler:
+    """
+    Paces requests from any number of threads to stay inside Strava's limits.
+
+    The remaining budget comes from the rate-limit headers of each response,
+    less requests still in flight. Callers block in acquire() while the budget
+    is spent (until the window resets) and are spaced out once it runs low.
+    Queue depth and wait times are kept in `stats`.
+    """
+
+    def __init__(self, max_wait=MAX_WAIT, clock=time.time):
+        self.max_wait = max_wait
+        self.clock = clock
+        self._cond = threading.Condition()
+        self.limits = None
+        self.usage = None
+        self._observed_at = None
+        self._in_flight = 0
+        self._last_start = 0.0
+        self.queue_depth = 0
+        self.stats = {
+            'requests': 0, 'throttled': 0, 'retries': 0,
+            'wait_seconds': 0.0, 'max_wait_seconds': 0.0, 'max_queue_depth': 0,
+        }
+
+    def _usage_now(self, now):
+        """Usage as of now; a window that has reset since the headers were seen counts as unused."""
+        short, daily = self.usage
+        if now // SHORT_WINDOW != self._observed_at // SHORT_WINDOW:
+            short = 0
+        if now // DAILY_WINDOW != self._observed_at // DAILY_WINDOW:
+            daily = 0
+        return short, daily
+
+    def _delay(self, now):
+        """Seconds to wait before the next request may start."""
+        if self.limits is None:
+            return 0.0
+        short_used, daily_used = self._usage_now(now)
+        short_left = self.limits[0] - short_used - self._in_flight
+        daily_left = self.limits[1] - daily_used - self._in_flight
+        short_reset = SHORT_WINDOW - now % SHORT_WINDOW
+
+        delay = 0.0
+        if daily_left <= 0:
+            delay = DAILY_WINDOW - now % DAILY_WINDOW
+        elif short_left <= 0:
+            delay = short_reset
+        elif short_left < self.limits[0] * PACE_FRACTION:
+            # Spread what's left evenly over the rest of the window
+            delay = self._last_start + short_reset / short_left - now
+        return max(0.0, delay)
+
+    def acquire(self):
+        """Block until a request may be sent; raises StravaRateLimitError if that's beyond max_wait."""
+        start = self.clock()
+        with self._cond:
+            self.queue_depth += 1
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.queue_depth)
+            try:
+                while True:
+                    now = self.clock()
+                    delay = self._delay(now)
+                    if delay <= 0:
+                        break
+                    if now - start + delay > self.max_wait:
+                        raise StravaRateLimitError(
+                            f"Strava rate limit budget exhausted for another {delay:.0f}s "
+                            f"(usage {self.usage}, limits {self.limits})"
+                        )
+                    self._cond.wait(delay)
+                self._in_flight += 1
+                self._last_start = self.clock()
+            finally:
+                self.queue_depth -= 1
+
+            waited = self._last_start - start
+            self.stats['requests'] += 1
+            if waited > 0.001:
+                self.stats['throttled'] += 1
+                self.stats['wait_seconds'] += waited
+                self.stats['max_wait_seconds'] = max(self.stats['max_wait_seconds'], waited)
+
+    def release(self, headers=None):
+        """Mark a request finished and take the latest budget from its response headers."""
+        with self._cond:
+            self._in_flight -= 1
+            parsed = parse_rate_limit(headers) if headers is not None else None
+            if parsed:
+                now = self.clock()
+                limits, usage = parsed
+                if self.usage is not None:
+                    # Responses can arrive out of order; usage only grows within a window
+                    current = self._usage_now(now)
+                    usage = (max(usage[0], current[0]), max(usage[1], current[1]))
+                self.limits, self.usage, self._observed_at = limits, usage, now
+            self._cond.notify_all()
+
+    def backoff(self, attempt, wait=None):
+        """Sleep before retry `attempt` (0-based): Retry-After if given, else full-jitter exponential."""
+        if wait is None:
+            wait = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+        with self._cond:
+            self.stats['retries'] += 1
+            self.stats['wait_seconds'] += wait
+        time.sleep(wait)
+
+    def format_stats(self):
+        return (f"Strava API: {self.stats['requests']} requests, {self.stats['retries']} retries, "
+                f"{self.stats['throttled']} throttled, waited {self.stats['wait_seconds']:.1f}s "
+                f"(max {self.stats['max_wait_seconds']:.1f}s, queue depth up to {self.stats['max_queue_depth']})"
+                + (f", usage {self.usage[0]}/{self.limits[0]} (15 min) {self.usage[1]}/{self.limits[1]} (day)"
+                   if self.limits else ""))
+
+
+def api_url():
+    """Base URL of the API; STRAVA_API_URL in the environment points it elsewhere (e.g. a stub server)."""
+    return os.environ.get('STRAVA_API_URL', STRAVA_API_URL)
+
+
+class StravaClient:
+    """
+    Thread-safe Strava API client sharing one pooled session.
+
+    Keep-alive connections are reused across calls, so only the first request
+    to the API pays for the TCP+TLS handshake. Every request goes through a
+    RateLimitScheduler, and 429/5xx responses are retried with backoff. With a
+    StravaCache, fresh cached responses are served without a request at all.
+    """
+
+    def __init__(self, access_token, base_url=None, concurrency=DEFAULT_CONCURRENCY,
+                 scheduler=None, max_retries=MAX_RETRIES, cache=None):
+        self.base_url = (base_url or api_url()).rstrip('/')
+        self.concurrency = max(1, concurrency)
+        self.scheduler = scheduler or RateLimitScheduler()
+        self.max_retries = max_retries
+        self.cache = cache
+        # Cached responses are keyed by token, since the cache file may be shared
+        self.cache_scope = credential_scope(access_token)
+
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {access_token}'
+        # One pooled connection per worker thread
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+
+    def get(self, path, params=None, decode=loads):
+        """GET an API path and decode the body with `decode`; raises StravaAPIError on failure."""
+        with span('http_get', path=path) as trace:
+            content, outcome = self._fetch(path, params)
+            if trace is not None:
+                trace['outcome'] = outcome
+                trace['bytes'] = len(content)
+        with span('decode_response', path=path):
+            return decode(content)
+
+    def _fetch(self, path, params=None):
+        """Raw body of an API path and where it came from ('cached', 'revalidated' or 'fetched')."""
+        cached = self.cache.lookup(path, params, self.cache_scope) if self.cache else None
+        if cached and cached['fresh']:
+            return cached['content'], 'cached'
+        conditional = self.cache.conditional_headers(cached) if cached else {}
+
+        url = f"{self.base_url}/{path}"
+        for attempt in range(self.max_retries + 1):
+            self.scheduler.acquire()
+            try:
+                response = self.session.get(url, params=params, headers=conditional)
+            except requests.RequestException as e:
+                self.scheduler.release()
+                if attempt == self.max_retries:
+                    raise StravaAPIError(f"GET {url} failed: {e}", url=url) from e
+                self.scheduler.backoff(attempt)
+                continue
+            self.scheduler.release(response.headers)
+
+            status = response.status_code
+            if status == 304 and cached:
+                self.cache.revalidated(path, params, self.cache_scope)
+                return cached['content'], 'revalidated'
+            if (status == 429 or status >= 500) and attempt < self.max_retries:
+                # A 429 also updates the budget, so acquire() waits out the window
+                self.scheduler.backoff(attempt, retry_after(response.headers))
+                continue
+            if status >= 400:
+                raise StravaAPIError(f"GET {url} returned {status}: {response.text[:200]}",
+                                     status_code=status, url=url)
+            if self.cache:
+                self.cache.store(path, params, response.content, response.headers, self.cache_scope)
+            return response.content, 'fetched'
+
+    def activity_details(self, activity_id):
+        return self.get(f"activities/{activity_id}")
+
+    def activity_streams(self, activity_id, keys=STREAM_KEYS, resolution=None):
+        """Streams as {type: {'data': float64 array}}; resolution 'low'/'medium'/'high' downsamples."""
+        params = {'keys': ','.join(keys), 'key_by_type': True}
+        if resolution:
+            params['resolution'] = resolution
+            params['series_type'] = 'time'
+        return self.get(f"activities/{activity_id}/streams", params=params, decode=decode_streams)
+
+    def activity_laps(self, activity_id):
+        return self.get(f"activities/{activity_id}/laps")
+
+    def _submit_activity(self, activity_id, resolution=None):
+        return {
+            'details': self._executor.submit(self.activity_details, activity_id),
+            'streams': self._executor.submit(self.activity_streams, activity_id, resolution=resolution),
+            'laps': self._executor.submit(self.activity_laps, activity_id),
+        }
+
+    @staticmethod
+    def _result(futures):
+        return {key: future.result() for key, future in futures.items()}
+
+    def fetch_activity(self, activity_id, resolution=None):
+        """Details, streams and laps of one activity, fetched concurrently."""
+        return self._result(self._submit_activity(activity_id, resolution))
+
+    def fetch_activities(self, activity_ids, resolution=None):
+        """
+        Yield (activity_id, {'details', 'streams', 'laps'}, error) in input order.
+
+        Requests run on the client's `concurrency` worker threads, and at most
+        that many activities are queued ahead of the one being yielded, so
+        memory stays bounded however long the list is. An activity whose
+        requests fail (e.g. a 404 for a bad id) comes with None and its
+        StravaAPIError, and the rest are still fetched; fatal errors (see
+        StravaAPIError.fatal) are raised.
+        """
+        pending = deque()
+        for activity_id in activity_ids:
+            pending.append((activity_id, self._submit_activity(activity_id, resolution)))
+            if len(pending) >= self.concurrency:
+                yield self._settle(*pending.popleft())
+        while pending:
+            yield self._settle(*pending.popleft())
+
+    def _settle(self, activity_id, futures):
+        try:
+            return activity_id, self._result(futures), None
+        except StravaAPIError as e:
+            if e.fatal:
+                raise
+            return activity_id, None, e
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
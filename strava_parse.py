@@ -4,104 +4,140 @@ Strava API version of parse script
 Fetches activity data from Strava API and calculates same metrics
 """
 
-import requests
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+from resident_worker import forward_to_worker
+forward_to_worker(__name__, __file__)
+
+from lazy_import import lazy_import
+from datetime import datetime
 import sys
-import json
-from config import FTP, HRMAX
+import argparse
+from athlete import DEFAULT_PROFILE
+from activity import Activity
+from power_curve import power_curve
+from power_bests import PowerBestsStore
+from zones import MAX_SAMPLE_GAP, zone_time
+from strava_client import StravaClient, StravaAPIError, DEFAULT_CONCURRENCY
+from strava_cache import StravaCache
+from strava_streams import RESOLUTIONS
+from tracing import span, count, session
+from report_output import add_output_arguments, report
+
+np = lazy_import('numpy')
+
+# Strava stream types and the Activity channels they fill
+STREAM_CHANNELS = {
+    'watts': 'power',
+    'heartrate': 'heart_rate',
+    'cadence': 'cadence',
+    'velocity_smooth': 'speed',
+    'temp': 'temperature',
+}
+
+# A gap of more than this many typical sample intervals is a pause
+PAUSE_SAMPLE_INTERVALS = 2
 
 class StravaParser:
-    def __init__(self, access_token):
+    def __init__(self, access_token, base_url=None, concurrency=DEFAULT_CONCURRENCY, cache=None,
+                 profile=DEFAULT_PROFILE):
         self.access_token = access_token
-        self.base_url = "https://www.strava.com/api/v3"
+        # Thresholds used unless a call passes another athlete's profile
+        self.profile = profile
+        # Pooled client shared by every request this parser makes; with a
+        # StravaCache, activities fetched before are served from disk
+        self.client = StravaClient(access_token, base_url, concurrency, cache=cache)
+        self.base_url = self.client.base_url
         self.headers = {'Authorization': f'Bearer {access_token}'}
     
     def get_activity_details(self, activity_id):
         """Get activity summary data"""
-        url = f"{self.base_url}/activities/{activity_id}"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self.client.activity_details(activity_id)
     
-    def get_activity_streams(self, activity_id):
-        """Get detailed second-by-second streams"""
-        url = f"{self.base_url}/activities/{activity_id}/streams"
-        
-        # Request all available streams
-        params = {
-            'keys': 'time,heartrate,cadence,watts,temp,velocity_smooth',
-            'key_by_type': True
-        }
-        
-        response = requests.get(url, headers=self.headers, params=params)
-        return response.json()
+    def get_activity_streams(self, activity_id, resolution=None):
+        """Get detailed second-by-second streams (resolution 'low'/'medium'/'high' for a coarse preview)"""
+        return self.client.activity_streams(activity_id, resolution=resolution)
     
     def get_activity_laps(self, activity_id):
         """Get lap/interval data"""
-        url = f"{self.base_url}/activities/{activity_id}/laps"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self.client.activity_laps(activity_id)
+    
+    def process_activity(self, activity_id, resolution=None, profile=None):
+        """Fetch details, streams and laps concurrently; returns (results, laps)"""
+        fetched = self.client.fetch_activity(activity_id, resolution)
+        results = self.process_activity_data(activity_id, fetched['details'], fetched['streams'], profile)
+        return results, self.process_laps(activity_id, fetched['laps'])
     
-    def process_activity_data(self, activity_id):
-        """Process activity data similar to parse script"""
+    def process_activities(self, activity_ids, resolution=None, profile=None):
+        """Yield (activity_id, results, laps, error) for each activity, fetching several at once; error is the StravaAPIError of an activity that couldn't be fetched"""
+        for activity_id, fetched, error in self.client.fetch_activities(activity_ids, resolution):
+            if error is not None:
+                yield activity_id, None, None, error
+                continue
+            results = self.process_activity_data(activity_id, fetched['details'], fetched['streams'], profile)
+            yield activity_id, results, self.process_laps(activity_id, fetched['laps']), None
+    
+    def close(self):
+        self.client.close()
+    
+    def process_activity_data(self, activity_id, details=None, streams=None, profile=None):
+        """Process activity data similar to parse script (pass details/streams if already fetched)"""
+        profile = profile or self.profile
         
         # Get activity details
-        details = self.get_activity_details(activity_id)
+        if details is None:
+            details = self.get_activity_details(activity_id)
         
         # Get streams for detailed analysis
-        streams = self.get_activity_streams(activity_id)
-        
-        # Create DataFrame from streams
-        df_data = {}
-        if 'time' in streams:
-            df_data['time'] = streams['time']['data']
-        if 'watts' in streams:
-            df_data['power'] = streams['watts']['data']
-        if 'heartrate' in streams:
-            df_data['heart_rate'] = streams['heartrate']['data']
-        if 'cadence' in streams:
-            df_data['cadence'] = streams['cadence']['data']
-        
-        if not df_data:
+        if streams is None:
+            streams = self.get_activity_streams(activity_id)
+        
+        # Build a columnar activity from the streams
+        if not any(key in streams for key in ('time', 'watts', 'heartrate', 'cadence')):
             print("No stream data available for this activity")
             return None
         
-        df = pd.DataFrame(df_data)
+        # On a uniform 1 Hz grid, so every sample is one second. Downsampled
+        # streams are spaced further apart than MAX_SAMPLE_GAP, so each of their
+        # samples is held until the next and only longer gaps count as pauses
+        with span('build_activity', activity_id=activity_id):
+            activity = Activity.from_streams(streams, STREAM_CHANNELS)
+            max_gap = max(MAX_SAMPLE_GAP, PAUSE_SAMPLE_INTERVALS * activity.sample_interval())
+            activity = activity.resample(profile.pauses, max_gap)
+        count(f"strava:{activity_id}", records=len(activity))
         
         # Duration (from details or calculate)
         duration_sec = details['elapsed_time']
         duration_min = duration_sec / 60
         
         # Core metrics from API details (when available)
-        avg_power = details.get('average_watts', df['power'].mean() if 'power' in df else None)
-        max_power = details.get('max_watts', df['power'].max() if 'power' in df else None)
+        avg_power = details.get('average_watts', activity.mean('power') if 'power' in activity else None)
+        max_power = details.get('max_watts', activity.max('power') if 'power' in activity else None)
         weighted_avg_power = details.get('weighted_average_watts')  # Similar to NP
         
         # Calculate normalized power if not provided
-        if 'power' in df and not weighted_avg_power:
-            np_power = (df['power'] ** 4).mean() ** 0.25
+        if 'power' in activity and not weighted_avg_power:
+            np_power = activity.normalized_power()
         else:
             np_power = weighted_avg_power
         
-        # Training metrics
-        if_val = np_power / FTP if np_power else None
+        # Training metrics, against the FTP in effect on the day of the ride
+        ftp = profile.ftp_on(details['start_date'])
+        if_val = np_power / ftp if np_power else None
         
         # TSS calculation (if not provided by Strava)
         if details.get('suffer_score'):  # Strava's relative effort
             tss = details['suffer_score']
-        elif np_power and 'power' in df:
-            tss = (len(df) * (np_power ** 2)) / (FTP ** 2 * 3600) * 100
+        elif np_power and 'power' in activity:
+            tss = (activity.count('power') * (np_power ** 2)) / (ftp ** 2 * 3600) * 100
         else:
             tss = None
         
         # Heart rate metrics
-        avg_hr = details.get('average_heartrate', df['heart_rate'].mean() if 'heart_rate' in df else None)
-        max_hr = details.get('max_heartrate', df['heart_rate'].max() if 'heart_rate' in df else None)
+        avg_hr = details.get('average_heartrate', activity.mean('heart_rate') if 'heart_rate' in activity else None)
+        max_hr = details.get('max_heartrate', activity.max('heart_rate') if 'heart_rate' in activity else None)
         
         # Cadence metrics
-        avg_cad = details.get('average_cadence', df['cadence'].mean() if 'cadence' in df else None)
-        max_cad = df['cadence'].max() if 'cadence' in df and not df['cadence'].empty else None
+        avg_cad = details.get('average_cadence', activity.mean('cadence') if 'cadence' in activity else None)
+        max_cad = activity.max('cadence') if 'cadence' in activity and len(activity) else None
         
         # Calculate zones if we have stream data
         results = {
@@ -124,54 +160,24 @@ class StravaParser:
         }
         
         # Calculate HR zones if we have stream data
-        if 'heart_rate' in df and not df['heart_rate'].empty:
-            df['hr_pct'] = df['heart_rate'] / HRMAX
-            hr_zones = {
-                'Z1 (<60%)': (0.0, 0.6),
-                'Z2 (60-70%)': (0.6, 0.7),
-                'Z3 (70-80%)': (0.7, 0.8),
-                'Z4 (80-90%)': (0.8, 0.9),
-                'Z5 (90-100%)': (0.9, 1.0),
-            }
-            hr_time = {
-                label: round(((df['hr_pct'] >= low) & (df['hr_pct'] < high)).sum() / 60, 1)
-                for label, (low, high) in hr_zones.items()
-            }
-            results['hr_zones'] = hr_time
+        if 'heart_rate' in activity and len(activity):
+            with span('zones', activity_id=activity_id):
+                results['hr_zones'] = zone_time(activity.heart_rate, profile.hr_zones, profile.hrmax)
             
             # HR drift
-            half = len(df) // 2
-            if half > 0:
-                hr_drift = round((df['heart_rate'].iloc[half:].mean() - 
-                                df['heart_rate'].iloc[:half].mean()) / 
-                               df['heart_rate'].iloc[:half].mean() * 100, 2)
-                results['hr_drift_pct'] = hr_drift
+            if len(activity) // 2 > 0:
+                results['hr_drift_pct'] = round(activity.hr_drift(), 2)
         
         # Calculate power zones if we have stream data
-        if 'power' in df and not df['power'].empty:
-            df['power_pct'] = df['power'] / FTP
-            power_zones = {
-                'Z1 (<55%)': (0.0, 0.55),
-                'Z2 (55-75%)': (0.55, 0.75),
-                'Z3 (76-90%)': (0.76, 0.90),
-                'Z4 (91-105%)': (0.91, 1.05),
-                'Z5 (106-120%)': (1.06, 1.20),
-                'Z6+ (>120%)': (1.20, float('inf')),
-            }
-            zone_time = {
-                label: round(((df['power_pct'] >= low) & (df['power_pct'] < high)).sum() / 60, 1)
-                for label, (low, high) in power_zones.items()
-            }
-            results['power_zone_time'] = zone_time
+        if 'power' in activity and len(activity):
+            with span('zones', activity_id=activity_id):
+                results['power_zone_time'] = zone_time(activity.power, profile.power_zones, ftp)
             
             # Power duration curve
-            durations = [5, 10, 15, 30, 60, 120, 180, 300, 600, 900, 1200, 1800, 2400, 3600]
-            power_curve = {}
-            for d in durations:
-                if len(df) >= d:
-                    power_curve[f"{d}s"] = round(df['power'].rolling(d).mean().max(), 1)
-            if power_curve:
-                results['power_curve'] = power_curve
+            with span('power_curve', activity_id=activity_id):
+                curve = power_curve(activity.values('power'))
+            if curve:
+                results['power_curve'] = curve
             
             # Efficiency Factor
             if avg_hr:
@@ -179,9 +185,10 @@ class StravaParser:
         
         return results
     
-    def process_laps(self, activity_id):
-        """Process lap/interval data similar to intervals script"""
-        laps = self.get_activity_laps(activity_id)
+    def process_laps(self, activity_id, laps=None):
+        """Process lap/interval data similar to intervals script (pass laps if already fetched)"""
+        if laps is None:
+            laps = self.get_activity_laps(activity_id)
         
         lap_summaries = []
         for i, lap in enumerate(laps, 1):
@@ -200,40 +207,128 @@ class StravaParser:
         
         return lap_summaries
 
+def print_results(results):
+    print("\n--- Ride Summary ---")
+    for k, v in results.items():
+        if isinstance(v, dict):
+            print(f"\n{k.replace('_', ' ').title()}:")
+            for subk, subv in v.items():
+                print(f"  {subk}: {subv}")
+        else:
+            if v is not None:
+                print(f"{k.replace('_', ' ').title()}: {v}")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Fetch Strava activities and calculate ride metrics',
+        epilog='To get an access token, create an app at https://www.strava.com/settings/api'
+    )
+    parser.add_argument(
+        'access_token',
+        type=str,
+        help='Strava API access token'
+    )
+    parser.add_argument(
+        'activity_ids',
+        type=str,
+        help='Activity ID, or a comma-separated list of IDs'
+    )
+    parser.add_argument(
+        '--bests-file',
+        type=str,
+        help='Season/all-time power bests store to merge power curves into',
+        default=None
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Fetch everything from the API instead of using the local response cache'
+    )
+    parser.add_argument(
+        '--resolution',
+        choices=RESOLUTIONS,
+        help='Fetch downsampled streams for a quick preview. Default: full resolution',
+        default=None
+    )
+    add_output_arguments(parser, 'strava')
+    parser.add_argument(
+        '--trace',
+        type=str,
+        help='Write request and metric timing spans to this Chrome trace file',
+        default=None
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Run under cProfile and tracemalloc and print the slowest functions and top allocation sites'
+    )
+    return parser.parse_args()
+
 def main():
-    if len(sys.argv) < 3:
-        print("Usage: python strava_parse.py <access_token> <activity_id>")
-        print("\nTo get an access token:")
-        print("1. Go to https://www.strava.com/settings/api")
-        print("2. Create an app and get your access token")
+    args = parse_arguments()
+    with session(args.trace, args.profile), report(args.output_format, args.output, 'strava') as writer:
+        failed = run(args, writer)
+    if failed:
         sys.exit(1)
+
+def write_activity(writer, activity_id, results, laps):
+    """Write an activity's ride metrics and laps as records."""
+    writer.write('rides', {'activity_id': activity_id, **results})
+    for lap in laps:
+        writer.write('laps', {'activity_id': activity_id, **lap})
+
+def run(args, writer=None):
+    activity_ids = [a for a in args.activity_ids.split(',') if a]
+    store = PowerBestsStore(args.bests_file) if args.bests_file else None
+    cache = None if args.no_cache else StravaCache()
     
-    access_token = sys.argv[1]
-    activity_id = sys.argv[2]
-    
-    parser = StravaParser(access_token)
+    parser = StravaParser(args.access_token, cache=cache)
     
-    # Get activity data
+    # Get activity data; several activities are fetched concurrently
     print("\n--- Fetching from Strava API ---")
-    results = parser.process_activity_data(activity_id)
-    
-    if results:
-        print("\n--- Ride Summary ---")
-        for k, v in results.items():
-            if isinstance(v, dict):
-                print(f"\n{k.replace('_', ' ').title()}:")
-                for subk, subv in v.items():
-                    print(f"  {subk}: {subv}")
+    failed = False
+    try:
+        for activity_id, results, laps, error in parser.process_activities(activity_ids, args.resolution):
+            if error is not None:
+                # One bad id doesn't stop the rest of the list
+                print(f"\nStrava API error for activity {activity_id}: {error}")
+                failed = True
+                continue
+            if not results:
+                continue
+            
+            if writer is not None:
+                write_activity(writer, activity_id, results, laps)
             else:
-                if v is not None:
-                    print(f"{k.replace('_', ' ').title()}: {v}")
-        
-        # Get lap data
-        laps = parser.process_laps(activity_id)
-        if laps:
-            print(f"\n--- Detected Laps ({len(laps)} total) ---")
-            for lap in laps:
-                print(f"Lap {lap['lap']}: {lap}")
+                if len(activity_ids) > 1:
+                    print(f"\n=== Activity {activity_id} ===")
+                print_results(results)
+            
+            # Merge the power curve into a season/all-time bests store
+            if store is not None and results.get('power_curve'):
+                ride_date = datetime.fromisoformat(results['start_date'].replace('Z', '+00:00'))
+                improved = store.update_from_curve(activity_id, ride_date, results['power_curve'])
+                if improved:
+                    print(f"\nNew power bests: {', '.join(improved)}")
+            
+            # Lap data
+            if laps and writer is None:
+                print(f"\n--- Detected Laps ({len(laps)} total) ---")
+                for lap in laps:
+                    print(f"Lap {lap['lap']}: {lap}")
+    except StravaAPIError as e:
+        print(f"\nStrava API error: {e}")
+        failed = True
+    finally:
+        parser.close()
+    
+    if store is not None:
+        store.save()
+    
+    print(f"\n{parser.client.scheduler.format_stats()}")
+    if cache is not None:
+        print(cache.format_stats())
+    return failed
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
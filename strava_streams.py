@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Strava Stream Decoding
+Decodes a key_by_type streams payload straight from the response bytes into
+typed NumPy arrays. Each numeric `data` array is parsed by NumPy's text reader
+without building a Python list; anything it can't handle goes through the JSON
+parser (orjson when installed, else the standard library).
+"""
+
+import json
+import re
+
+from lazy_import import lazy_import
+try:
+    import orjson
+except ImportError:  # optional, speeds up the fallback path
+    orjson = None
+
+np = lazy_import('numpy')
+
+
+# Strava's downsampled stream resolutions (omit for full resolution)
+RESOLUTIONS = ('low', 'medium', 'high')
+
+# A top-level stream object whose `data` array holds scalars only
+_STREAM_RE = re.compile(
+    rb'"(?P<type>\w+)"\s*:\s*\{[^{}\[\]]*?"data"\s*:\s*\[(?P<data>[^\[\]]*)\]'
+)
+
+# Anything in a data array that can't be part of a plain number (null, true, nesting)
+_NON_NUMERIC_RE = re.compile(rb'[^0-9eE+\-.,\s]')
+
+
+def loads(raw):
+    """Parse JSON bytes with the fastest parser available."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _parse_numbers(data):
+    """A comma-separated run of JSON numbers as float64, or None if it isn't one."""
+    if not data.strip():
+        return np.empty(0, dtype=float)
+    if _NON_NUMERIC_RE.search(data):
+        return None
+    values = np.fromstring(data.decode('ascii'), dtype=float, sep=',')
+    if len(values) != data.count(b',') + 1:
+        return None
+    return values
+
+
+def _from_parsed(payload):
+    """Streams from an already parsed payload (list or key_by_type dict)."""
+    if isinstance(payload, list):
+        payload = {stream['type']: stream for stream in payload}
+    streams = {}
+    for key, stream in payload.items():
+        data = stream.get('data') if isinstance(stream, dict) else None
+        if data is None:
+            continue
+        try:
+            # Missing samples come through as None; keep them as NaN
+            values = np.array(data, dtype=float)
+        except (TypeError, ValueError):
+            continue  # ragged or non-numeric series
+        streams[key] = {'data': values}
+    return streams
+
+
+def decode_streams(raw):
+    """
+    {stream_type: {'data': float64 array}} from a streams response body.
+
+    The fast path only accepts payloads whose every stream matched as a flat
+    numeric array, so a stream is never silently dropped or misparsed.
+    """
+    streams = {}
+    for match in _STREAM_RE.finditer(raw):
+        values = _parse_numbers(match.group('data'))
+        if values is None:
+            streams = None
+            break
+        streams[match.group('type').decode()] = {'data': values}
+
+    if streams and raw.count(b'"data"') == len(streams):
+        return streams
+    return _from_parsed(loads(raw))
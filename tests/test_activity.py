@@ -0,0 +1,24 @@
+import numpy as np
+
+from activity import Activity
+
+
+def test_zero_pauses_leave_unrecorded_channels_missing():
+    # An HR-only FIT ride carries every channel, the ones it lacks all NaN
+    nan = np.full(4, np.nan)
+    ride = Activity(np.array([0, 1, 60, 61]), power=nan, cadence=nan, heart_rate=[120, 121, 130, 131])
+    grid = ride.resample('zero')
+
+    assert len(grid) == 62
+    assert not grid.has_values('power') and not grid.has_values('cadence')
+    assert np.isnan(grid.heart_rate[2:60]).all()
+    assert not grid.mask_missing('power').has_values('heart_rate')
+
+
+def test_zero_pauses_fill_recorded_channels():
+    ride = Activity(np.array([0, 1, 60, 61]), power=[200, 210, 220, 230], heart_rate=[120, 121, 130, 131])
+    grid = ride.resample('zero')
+
+    assert (grid.power[2:60] == 0).all()
+    assert np.isnan(grid.heart_rate[2:60]).all()
+    assert grid.power[[0, 1, 60, 61]].tolist() == [200, 210, 220, 230]
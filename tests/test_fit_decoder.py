@@ -0,0 +1,148 @@
+import struct
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import fit_loader
+from activity import CHANNELS
+from benchmarks.synthetic import (FIT_EPOCH, UINT8, UINT16, UINT32, SyntheticRide, fit_bytes,
+                                  fit_container, write_fit)
+from fit_decoder import Unsupported, _decode, decode_fit
+from fit_loader import FitActivity
+
+WEEK1 = sorted((Path(__file__).parent.parent / 'week1').glob('*.fit'))
+
+STRING = 0x07
+START = int((datetime(2025, 8, 4, 7, 0) - FIT_EPOCH).total_seconds())
+
+
+def decode(path, monkeypatch, fast):
+    monkeypatch.setattr(fit_loader, 'FAST_DECODE', fast)
+    return FitActivity(path).decode()
+
+
+def definition(local_type, global_num, fields, dev_fields=()):
+    """Little-endian definition message; fields and dev_fields are (number, size, base type / index)."""
+    header = 0x40 | (0x20 if dev_fields else 0) | local_type
+    out = struct.pack('<BBBHB', header, 0, 0, global_num, len(fields))
+    out += b''.join(struct.pack('<BBB', *field) for field in fields)
+    if dev_fields:
+        out += bytes([len(dev_fields)]) + b''.join(struct.pack('<BBB', *field) for field in dev_fields)
+    return out
+
+
+def message(header, fmt, *values):
+    return struct.pack('<B' + fmt, header, *values)
+
+
+def ride_file(tmp_path, *messages):
+    """A FIT file of a file_id message followed by the given messages."""
+    body = definition(0, 0, [(0, 1, 0), (4, 4, UINT32)]) + message(0, 'BI', 4, START)
+    path = tmp_path / 'ride.fit'
+    path.write_bytes(fit_container(body + b''.join(messages)))
+    return path
+
+
+@pytest.mark.parametrize('path', WEEK1 + ['synthetic'], ids=lambda p: getattr(p, 'stem', p))
+def test_fast_decode_matches_fitparse(path, tmp_path, monkeypatch):
+    if path == 'synthetic':
+        path = write_fit(tmp_path / 'synthetic.fit', SyntheticRide(duration=1800, laps=4))
+    fast = decode(path, monkeypatch, True)
+    slow = decode(path, monkeypatch, False)
+
+    assert (fast.decoder, slow.decoder) == ('fast', 'fitparse')
+    np.testing.assert_array_equal(fast.records.timestamps, slow.records.timestamps)
+    for name in CHANNELS:
+        np.testing.assert_array_equal(getattr(fast.records, name), getattr(slow.records, name))
+    assert fast.time_created == slow.time_created
+    assert fast.session == slow.session
+    assert fast.laps == slow.laps
+
+
+def test_compressed_timestamps_go_to_fitparse(tmp_path, monkeypatch):
+    path = ride_file(
+        tmp_path,
+        definition(1, 20, [(253, 4, UINT32), (7, 2, UINT16)]),
+        message(1, 'IH', START, 200),
+        definition(2, 20, [(7, 2, UINT16)]),
+        message(0x80 | 2 << 5 | (START + 1) & 0x1F, 'H', 210),
+        message(0x80 | 2 << 5 | (START + 2) & 0x1F, 'H', 220),
+    )
+    with pytest.raises(Unsupported, match='compressed timestamp'):
+        _decode(path.read_bytes(), CHANNELS)
+
+    activity = decode(path, monkeypatch, True)
+    assert activity.decoder == 'fitparse'
+    assert np.diff(activity.records.timestamps).tolist() == [1, 1]
+    assert activity.records.power.tolist() == [200, 210, 220]
+
+
+def test_truncated_file_is_not_decoded():
+    data = fit_bytes(SyntheticRide(duration=300, laps=1))
+    with pytest.raises(Unsupported, match='unexpected file size'):
+        _decode(data[:-100], CHANNELS)
+    with pytest.raises(Unsupported, match='unexpected file size'):
+        _decode(data + data, CHANNELS)
+
+
+def test_truncated_file_returns_none(tmp_path):
+    path = tmp_path / 'ride.fit'
+    path.write_bytes(fit_bytes(SyntheticRide(duration=300, laps=1))[:-100])
+    assert decode_fit(path, CHANNELS) is None
+
+
+def test_array_field_goes_to_fitparse(tmp_path, monkeypatch):
+    path = ride_file(
+        tmp_path,
+        definition(1, 20, [(253, 4, UINT32), (7, 4, UINT16), (3, 1, UINT8)]),
+        message(1, 'IHHB', START, 200, 201, 140),
+        message(1, 'IHHB', START + 1, 210, 211, 141),
+    )
+    with pytest.raises(Unsupported, match='unexpected record field type'):
+        _decode(path.read_bytes(), CHANNELS)
+
+    activity = decode(path, monkeypatch, True)
+    assert activity.decoder == 'fitparse'
+    assert activity.records.heart_rate.tolist() == [140, 141]
+    assert np.isnan(activity.records.power).all()
+
+
+def test_developer_field_named_like_a_channel_goes_to_fitparse(tmp_path, monkeypatch):
+    path = ride_file(
+        tmp_path,
+        definition(1, 207, [(3, 1, UINT8)]),
+        message(1, 'B', 0),
+        definition(2, 206, [(0, 1, UINT8), (1, 1, UINT8), (2, 1, UINT8), (3, 8, STRING)]),
+        message(2, 'BBB8s', 0, 0, UINT16, b'power'),
+        definition(3, 20, [(253, 4, UINT32), (3, 1, UINT8)], dev_fields=[(0, 2, 0)]),
+        message(3, 'IBH', START, 140, 250),
+        message(3, 'IBH', START + 1, 141, 260),
+    )
+    with pytest.raises(Unsupported, match='developer field named like a channel'):
+        _decode(path.read_bytes(), CHANNELS)
+
+    activity = decode(path, monkeypatch, True)
+    assert activity.decoder == 'fitparse'
+    assert activity.records.heart_rate.tolist() == [140, 141]
+    assert activity.records.power.tolist() == [250, 260]
+
+
+def test_other_developer_fields_stay_on_the_fast_path(tmp_path, monkeypatch):
+    path = ride_file(
+        tmp_path,
+        definition(1, 207, [(3, 1, UINT8)]),
+        message(1, 'B', 0),
+        definition(2, 206, [(0, 1, UINT8), (1, 1, UINT8), (2, 1, UINT8), (3, 8, STRING)]),
+        message(2, 'BBB8s', 0, 0, UINT16, b'smo2'),
+        definition(3, 20, [(253, 4, UINT32), (7, 2, UINT16)], dev_fields=[(0, 2, 0)]),
+        message(3, 'IHH', START, 200, 55),
+        message(3, 'IHH', START + 1, 210, 56),
+    )
+    fast = decode(path, monkeypatch, True)
+    slow = decode(path, monkeypatch, False)
+
+    assert fast.decoder == 'fast'
+    np.testing.assert_array_equal(fast.records.timestamps, slow.records.timestamps)
+    assert fast.records.power.tolist() == slow.records.power.tolist() == [200, 210]
@@ -0,0 +1,157 @@
+import argparse
+import json
+import time
+
+import pytest
+
+import strava_client
+from benchmarks.strava_stub import StravaStub, etag
+from benchmarks.synthetic import SyntheticRide, strava_payloads
+from strava_client import (SHORT_WINDOW, RateLimitScheduler, StravaAPIError, StravaClient,
+                           StravaRateLimitError)
+from strava_cache import DETAILS_TTL, StravaCache
+
+
+@pytest.fixture
+def payloads():
+    return {i: strava_payloads(SyntheticRide(duration=600, laps=3, seed=i), i) for i in range(1, 6)}
+
+
+def test_fetch_activity_gets_details_streams_and_laps(payloads):
+    with StravaStub(payloads) as stub, StravaClient('token', stub.url) as client:
+        fetched = client.fetch_activity(1)
+
+    assert fetched['details'] == json.loads(payloads[1]['details'])
+    assert fetched['laps'] == json.loads(payloads[1]['laps'])
+    assert len(fetched['streams']['watts']['data']) == 600
+    assert stub.requests == 3
+    assert all(headers['Authorization'] == 'Bearer token' for _, headers in stub.log)
+
+
+def test_fetch_activities_yields_in_input_order(payloads):
+    ids = [5, 3, 1, 4, 2]
+    with StravaStub(payloads) as stub, StravaClient('token', stub.url, concurrency=2) as client:
+        fetched = list(client.fetch_activities(ids))
+
+    assert [activity_id for activity_id, _, _ in fetched] == ids
+    assert [activity['details']['id'] for _, activity, _ in fetched] == ids
+    assert all(error is None for _, _, error in fetched)
+    assert stub.requests == 3 * len(ids)
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(strava_client, 'BACKOFF_BASE', 0.001)
+
+
+def window_clock(seconds_left):
+    """Wall clock shifted to seconds_left before the next 15-minute rate-limit window."""
+    start = time.time()
+    shift = (start // SHORT_WINDOW + 1) * SHORT_WINDOW - seconds_left - start
+    return lambda: time.time() + shift
+
+
+def test_server_errors_are_retried(payloads, no_backoff):
+    failures = {'/activities/1': [503, 502], '/activities/1/laps': [429]}
+    with StravaStub(payloads, failures) as stub, StravaClient('token', stub.url) as client:
+        fetched = client.fetch_activity(1)
+
+    assert fetched['details']['id'] == 1
+    assert stub.requested('/activities/1') == 3
+    assert stub.requested('/activities/1/laps') == 2
+    assert client.scheduler.stats['retries'] == 3
+
+
+def test_failed_activity_is_reported_and_the_rest_fetched(payloads, no_backoff):
+    failures = {'/activities/2/streams': [500] * 3}
+    with StravaStub(payloads, failures) as stub, \
+            StravaClient('token', stub.url, concurrency=2, max_retries=2) as client:
+        fetched = list(client.fetch_activities([1, 2, 99, 3]))
+
+    assert [activity_id for activity_id, _, _ in fetched] == [1, 2, 99, 3]
+    errors = {activity_id: error for activity_id, _, error in fetched}
+    assert errors[2].status_code == 500 and not errors[2].fatal
+    assert errors[99].status_code == 404 and not errors[99].fatal
+    assert errors[1] is None and errors[3] is None
+    assert stub.requested('/activities/2/streams') == 3
+
+
+def test_rejected_token_stops_the_batch(payloads):
+    with StravaStub(payloads, {'/activities/2': [401]}) as stub, StravaClient('token', stub.url) as client:
+        with pytest.raises(StravaAPIError) as raised:
+            list(client.fetch_activities([1, 2, 3]))
+    assert raised.value.status_code == 401 and raised.value.fatal
+
+
+def test_run_reports_activity_errors_and_keeps_going(payloads, monkeypatch, capsys):
+    import strava_parse
+    with StravaStub(payloads) as stub:
+        monkeypatch.setenv('STRAVA_API_URL', stub.url)
+        args = argparse.Namespace(access_token='token', activity_ids='1,99,2', bests_file=None,
+                                  no_cache=True, resolution=None)
+        failed = strava_parse.run(args)
+
+    out = capsys.readouterr().out
+    assert failed
+    assert "Strava API error for activity 99" in out
+    assert "=== Activity 1 ===" in out and "=== Activity 2 ===" in out
+
+
+def test_low_budget_spreads_requests_over_the_window(payloads):
+    # 49 calls left in a window that resets in 10 s: about one every 0.2 s
+    scheduler = RateLimitScheduler(clock=window_clock(10))
+    with StravaStub(payloads, rate_limit=((1000, 100000), (950, 950))) as stub, \
+            StravaClient('token', stub.url, concurrency=1, scheduler=scheduler) as client:
+        started = time.monotonic()
+        client.fetch_activity(1)
+        client.fetch_activity(2)
+        elapsed = time.monotonic() - started
+
+    assert stub.requests == 6
+    assert scheduler.stats['throttled'] == 5
+    assert 0.15 < scheduler.stats['max_wait_seconds'] < 0.5
+    assert elapsed > 0.75
+
+
+def test_spent_budget_waits_for_the_window_then_gives_up(payloads):
+    # Every response reports the short-window budget as spent
+    scheduler = RateLimitScheduler(max_wait=5, clock=window_clock(0.5))
+    with StravaStub(payloads, rate_limit=((10, 1000), (10, 10))) as stub, \
+            StravaClient('token', stub.url, concurrency=1, scheduler=scheduler) as client:
+        with pytest.raises(StravaRateLimitError) as raised:
+            client.fetch_activity(1)
+
+    # The first window resets in half a second and is waited out; the next one isn't
+    assert stub.requests == 2
+    assert scheduler.stats['throttled'] == 1
+    assert 0.3 < scheduler.stats['wait_seconds'] < 1.0
+    assert raised.value.fatal
+
+
+def test_cached_responses_are_served_to_the_same_token_only(payloads, tmp_path):
+    path = tmp_path / 'strava.sqlite'
+    with StravaStub(payloads) as stub:
+        for token in ('alice', 'alice', 'bob'):
+            with StravaClient(token, stub.url, cache=StravaCache(path)) as client:
+                client.fetch_activity(1)
+
+    # alice's second run is served from disk; bob's token gets nothing of hers
+    assert stub.requests == 6
+    assert [headers['Authorization'] for _, headers in stub.log] == ['Bearer alice'] * 3 + ['Bearer bob'] * 3
+
+
+def test_stale_details_are_revalidated(payloads, tmp_path):
+    now = [time.time()]
+    cache = StravaCache(tmp_path / 'strava.sqlite', clock=lambda: now[0])
+    with StravaStub(payloads) as stub, StravaClient('token', stub.url, cache=cache) as client:
+        first = client.fetch_activity(1)
+        now[0] += DETAILS_TTL + 1
+        second = client.fetch_activity(1)
+
+        # Only the details expire; they come back as 304 and are served from the cache
+        assert stub.requests == 4
+        assert stub.log[-1][0] == '/activities/1'
+        assert stub.log[-1][1]['If-None-Match'] == etag(payloads[1]['details'])
+        assert cache.stats['revalidated'] == 1
+        assert second['details'] == first['details'] == json.loads(payloads[1]['details'])
+        assert second['laps'] == first['laps']
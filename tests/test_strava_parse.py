@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from benchmarks.synthetic import SyntheticRide, strava_payloads
+from strava_parse import StravaParser
+
+
+@pytest.fixture
+def parser():
+    parser = StravaParser('token', base_url='http://127.0.0.1:9')
+    yield parser
+    parser.close()
+
+
+@pytest.fixture
+def ride():
+    """Details and full-resolution streams of a steady two-hour ride at 200 W and 150 bpm."""
+    payloads = strava_payloads(SyntheticRide(duration=7200, laps=1), 1)
+    seconds = list(range(7200))
+    streams = {
+        'time': {'data': seconds},
+        'watts': {'data': [200] * len(seconds)},
+        'heartrate': {'data': [150] * len(seconds)},
+    }
+    return json.loads(payloads['details']), streams
+
+
+def downsampled(streams, every):
+    """Streams keeping every n-th sample, like Strava's low and medium resolutions."""
+    return {key: {'data': stream['data'][::every]} for key, stream in streams.items()}
+
+
+def zone_minutes(results):
+    return {**results['hr_zones'], **results['power_zone_time']}
+
+
+def test_coarse_streams_give_the_same_load_and_zones(parser, ride):
+    details, streams = ride
+    full = parser.process_activity_data(1, details, streams)
+
+    # medium (~1000 points) and low (~100 points) resolution
+    for every in (7, 72):
+        coarse = parser.process_activity_data(1, details, downsampled(streams, every))
+        # Off by at most the last sample's interval, which the stream can't tell
+        assert coarse['tss'] == pytest.approx(full['tss'], rel=0.02)
+        assert zone_minutes(coarse) == pytest.approx(zone_minutes(full), abs=1.5)
+
+
+def test_pauses_in_coarse_streams_are_still_skipped(parser, ride):
+    details, streams = ride
+    full = parser.process_activity_data(1, details, downsampled(streams, 72))
+
+    # A half-hour stop in the middle of the ride
+    paused = downsampled(streams, 72)
+    paused['time']['data'] = [t + 1800 if t >= 3600 else t for t in paused['time']['data']]
+    paused = parser.process_activity_data(1, details, paused)
+
+    # Only the sample before the stop loses its interval
+    assert paused['tss'] == pytest.approx(full['tss'], rel=0.02)
+    assert zone_minutes(paused) == pytest.approx(zone_minutes(full), abs=1.5)
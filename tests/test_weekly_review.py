@@ -0,0 +1,22 @@
+import pytest
+
+from activity_cache import ActivityCache
+from athlete import DEFAULT_PROFILE
+from benchmarks.synthetic import SyntheticRide, write_fit
+from fit_loader import FitActivity
+from weekly_review import extract_activity
+
+
+def test_ride_data_has_zone_minutes_and_is_cached(tmp_path):
+    path = write_fit(tmp_path / 'ride.fit', SyntheticRide(duration=1800, laps=4))
+    cache = ActivityCache(tmp_path / 'cache.sqlite', DEFAULT_PROFILE.thresholds())
+
+    ride_data, _ = extract_activity(FitActivity(path), cache)
+    cached, _ = extract_activity(FitActivity(path), cache)
+
+    assert sum(ride_data['hr_zones'].values()) == pytest.approx(30, abs=0.3)
+    # Power zones leave out the watts between one zone's bound and the next
+    assert 25 < sum(ride_data['power_zones'].values()) <= 30.1
+    assert cache.stats['hits'] == 1
+    assert cached['hr_zones'] == ride_data['hr_zones']
+    assert cached['power_zones'] == ride_data['power_zones']
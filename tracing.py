@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Tracing and Profiling
+Lightweight timing spans and per-file counters for the entry points, written
+as a Chrome trace (chrome://tracing, Perfetto), plus an optional cProfile and
+tracemalloc run that reports the slowest functions and top allocation sites.
+Spans cost a flag check when tracing is off.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class Tracer:
+    """
+    Collects completed spans and per-file counters.
+
+    Spans are Chrome trace 'complete' events with wall-clock start times, so
+    spans recorded in worker processes line up with the parent's when merged
+    back in with extend().
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.files = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def span(self, name, **args):
+        """Context manager timing a stage; a no-op while tracing is off."""
+        if not self.enabled:
+            return nullcontext()
+        return self._span(name, args)
+
+    @contextmanager
+    def _span(self, name, args):
+        start_us = time.time_ns() // 1000
+        started = time.perf_counter_ns()
+        try:
+            yield args
+        finally:
+            event = {
+                'name': name,
+                'ph': 'X',
+                'ts': start_us,
+                'dur': (time.perf_counter_ns() - started) / 1000,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'args': args,
+            }
+            with self._lock:
+                self.events.append(event)
+
+    def count(self, filepath, **counters):
+        """Add to (or set, for strings) the counters of one input file."""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self.files.setdefault(str(filepath), {})
+            for key, value in counters.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    entry[key] = entry.get(key, 0) + value
+                else:
+                    entry[key] = value
+
+    def drain(self):
+        """Take the collected events and counters (e.g. to send back from a worker)."""
+        with self._lock:
+            drained = {'events': self.events, 'files': self.files}
+            self.events, self.files = [], {}
+        return drained
+
+    def extend(self, drained):
+        """Merge what another Tracer drained."""
+        if not drained:
+            return
+        with self._lock:
+            self.events.extend(drained['events'])
+        for filepath, counters in drained['files'].items():
+            self.count(filepath, **counters)
+
+    def stage_totals(self):
+        """Total milliseconds per span name."""
+        totals = {}
+        for event in self.events:
+            totals[event['name']] = totals.get(event['name'], 0.0) + event['dur'] / 1000
+        return totals
+
+    def write(self, path):
+        trace = {
+            'traceEvents': sorted(self.events, key=lambda e: e['ts']),
+            'displayTimeUnit': 'ms',
+            'otherData': {
+                'stage_totals_ms': {k: round(v, 3) for k, v in self.stage_totals().items()},
+                'files': self.files,
+            },
+        }
+        with open(path, 'w') as f:
+            json.dump(trace, f, default=str)
+
+
+# Process-wide tracer used by the instrumented modules
+TRACER = Tracer()
+
+
+def span(name, **args):
+    return TRACER.span(name, **args)
+
+
+def count(filepath, **counters):
+    TRACER.count(filepath, **counters)
+
+
+def report_profile(profiler, snapshot, top=25, out=None):
+    """Print the functions with most cumulative time and the top allocation sites."""
+    import io
+    import pstats
+    out = out or sys.stderr
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(top)
+    print("\n--- Profile: top functions by cumulative time ---", file=out)
+    print(stream.getvalue().strip(), file=out)
+
+    print("\n--- Profile: top allocation sites ---", file=out)
+    for stat in snapshot.statistics('lineno')[:top]:
+        frame = stat.traceback[0]
+        print(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {frame.filename}:{frame.lineno}", file=out)
+
+
+@contextmanager
+def session(trace_path=None, profile=False):
+    """
+    Trace and/or profile the code run inside the block.
+
+    With trace_path, spans are collected and written there on exit. With
+    profile, the block runs under cProfile and tracemalloc and the report is
+    printed to stderr. Both are written even if the block exits early.
+    """
+    if trace_path:
+        TRACER.enable()
+    profiler = None
+    if profile:
+        import cProfile
+        import tracemalloc
+        tracemalloc.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield TRACER
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            report_profile(profiler, snapshot)
+        if trace_path:
+            TRACER.write(trace_path)
+            print(f"Trace written to {trace_path}", file=sys.stderr)
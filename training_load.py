@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Training Load Model
+Persistent daily TSS series with exponentially weighted fitness (CTL), fatigue
+(ATL) and form (TSB). New rides extend the series from the last computed day,
+and rides added out of order only recompute the days from theirs onwards.
+"""
+
+import json
+import math
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+
+LOAD_FILENAME = '.training_load.json'
+
+# Time constants (days) of the fitness and fatigue averages
+CTL_DAYS = 42
+ATL_DAYS = 7
+
+
+class TrainingLoadStore:
+    """
+    Daily TSS per ride and the CTL/ATL series computed from it.
+
+    TSS is kept per ride id, so re-running a review over the same rides replaces
+    their load instead of adding it twice. ctl/atl hold one value per day from
+    `start`; days at and after `dirty_from` are recomputed on the next update().
+    Only days up to today, or the last ride if later, are saved.
+    """
+
+    def __init__(self, path, ctl_days=CTL_DAYS, atl_days=ATL_DAYS):
+        self.path = str(path)
+        self.ctl_days = ctl_days
+        self.atl_days = atl_days
+        self.daily_tss = {}
+        self.start = None
+        self.ctl = []
+        self.atl = []
+        self.dirty_from = None
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                stored = json.load(f)
+            self.daily_tss = {
+                date.fromisoformat(day): rides for day, rides in stored['daily_tss'].items()
+            }
+            if stored.get('time_constants') == [ctl_days, atl_days] and stored.get('start'):
+                self.start = date.fromisoformat(stored['start'])
+                self.ctl = stored['ctl']
+                self.atl = stored['atl']
+            elif self.daily_tss:
+                # Series was computed with other time constants; rebuild it
+                self.dirty_from = min(self.daily_tss)
+
+    @classmethod
+    def for_folder(cls, folder_path):
+        return cls(Path(folder_path) / LOAD_FILENAME)
+
+    def add_ride(self, ride_id, ride_date, tss):
+        """Record (or replace) one ride's TSS; returns True if the day's load changed."""
+        tss = round(float(tss or 0), 1)
+        rides = self.daily_tss.setdefault(ride_date, {})
+        if rides.get(ride_id) == tss:
+            return False
+        rides[ride_id] = tss
+        if self.dirty_from is None or ride_date < self.dirty_from:
+            self.dirty_from = ride_date
+        return True
+
+    def day_tss(self, day):
+        return sum(self.daily_tss.get(day, {}).values())
+
+    def _end(self):
+        """Last day the series covers, or None when empty."""
+        return self.start + timedelta(days=len(self.ctl) - 1) if self.ctl else None
+
+    def update(self, through):
+        """
+        Bring the series up to date through `through`.
+
+        Only days from the earliest changed ride (or the day after the last
+        computed one) are recomputed.
+        """
+        first_ride = min(self.daily_tss) if self.daily_tss else None
+        if first_ride is None:
+            return
+        if self.start is None or first_ride < self.start:
+            # A ride before the series began; everything shifts, so start over
+            self.start, self.ctl, self.atl = first_ride, [], []
+            self.dirty_from = first_ride
+
+        end = max(through, self._end() or through, max(self.daily_tss))
+        begin = self.start + timedelta(days=len(self.ctl))
+        if self.dirty_from is not None:
+            begin = min(begin, self.dirty_from)
+
+        keep = (begin - self.start).days
+        del self.ctl[keep:]
+        del self.atl[keep:]
+        ctl = self.ctl[-1] if self.ctl else 0.0
+        atl = self.atl[-1] if self.atl else 0.0
+        ctl_decay = math.exp(-1 / self.ctl_days)
+        atl_decay = math.exp(-1 / self.atl_days)
+
+        day = begin
+        while day <= end:
+            tss = self.day_tss(day)
+            ctl = ctl * ctl_decay + tss * (1 - ctl_decay)
+            atl = atl * atl_decay + tss * (1 - atl_decay)
+            self.ctl.append(ctl)
+            self.atl.append(atl)
+            day += timedelta(days=1)
+        self.dirty_from = None
+
+    def at(self, day):
+        """
+        Load on one day: its TSS and end-of-day CTL/ATL, with TSB (form) as the
+        previous day's CTL - ATL. Days before the series are all zero.
+        """
+        self.update(day)
+        if self.start is None or day < self.start:
+            return {'date': day, 'tss': 0.0, 'ctl': 0.0, 'atl': 0.0, 'tsb': 0.0}
+        i = (day - self.start).days
+        prev_ctl = self.ctl[i - 1] if i > 0 else 0.0
+        prev_atl = self.atl[i - 1] if i > 0 else 0.0
+        return {
+            'date': day,
+            'tss': self.day_tss(day),
+            'ctl': self.ctl[i],
+            'atl': self.atl[i],
+            'tsb': prev_ctl - prev_atl,
+        }
+
+    def series(self, start, end):
+        """at() for every day from start to end inclusive."""
+        days = (end - start).days + 1
+        return [self.at(start + timedelta(days=i)) for i in range(max(days, 0))]
+
+    def save(self):
+        if self.dirty_from is not None and self._end() is not None:
+            self.update(self._end())
+        if self.ctl:
+            # Days still to come have no load yet; don't keep a projection of them
+            keep = (max(date.today(), *self.daily_tss) - self.start).days + 1
+            del self.ctl[keep:]
+            del self.atl[keep:]
+        stored = {
+            'time_constants': [self.ctl_days, self.atl_days],
+            'daily_tss': {day.isoformat(): rides for day, rides in sorted(self.daily_tss.items())},
+            'start': self.start.isoformat() if self.start else None,
+            'ctl': self.ctl,
+            'atl': self.atl,
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(stored, f)
+        os.replace(tmp_path, self.path)
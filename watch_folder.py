@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+FIT Folder Watcher
+Long-running ingestion for a folder of .fit files: each new or changed file is
+decoded as soon as it has finished landing, and its ride, lap, zone and
+power-curve metrics go into the folder's activity cache, with its ride summary
+in the activity catalog. weekly_review.py then only reads precomputed results.
+
+Changes come from inotify on Linux, or from polling the folder elsewhere.
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+from athlete import DEFAULT_PROFILE
+from fit_loader import FitActivity, fit_file_complete
+from weekly_review import open_cache, open_catalog, extract_activity, ride_id
+
+
+# inotify event bits (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Files still incomplete after this long (seconds) are handed over anyway, to be rejected by the decoder
+MAX_SETTLE_WAIT = 120
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Watch a folder and precompute ride metrics for each .fit file as it arrives'
+    )
+    parser.add_argument(
+        'folder_path',
+        type=str,
+        help='Path to folder containing .fit files'
+    )
+    parser.add_argument(
+        '--settle',
+        type=float,
+        help='Seconds a file must go unchanged before it is decoded. Default: 2',
+        default=2.0
+    )
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        help='Seconds between folder scans when polling. Default: 2',
+        default=2.0
+    )
+    parser.add_argument(
+        '--queue-size',
+        type=int,
+        help='Files waiting to be decoded before the watcher holds back new ones. Default: 64',
+        default=64
+    )
+    parser.add_argument(
+        '--polling',
+        action='store_true',
+        help='Poll the folder even where inotify is available'
+    )
+    parser.add_argument(
+        '--once',
+        action='store_true',
+        help='Ingest files that are new or changed since the last run, then exit'
+    )
+    return parser.parse_args()
+
+
+def fit_files(folder):
+    return [str(path) for path in Path(folder).glob('*.fit')]
+
+
+class InotifyWatcher:
+    """Reports .fit files in a folder that were created, written or moved in, via inotify."""
+
+    def __init__(self, folder):
+        self.folder = str(folder)
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not available")
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(self.folder), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"Could not watch {self.folder}")
+
+    def changes(self, timeout):
+        """Paths changed since the last call, waiting up to timeout seconds for the first."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        changed = set()
+        pos = 0
+        while pos + _EVENT_HEADER.size <= len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, pos)
+            pos += _EVENT_HEADER.size
+            name = data[pos:pos + length].rstrip(b'\0').decode(errors='replace')
+            pos += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; look at everything again
+                changed.update(fit_files(self.folder))
+            elif name.endswith('.fit'):
+                changed.add(os.path.join(self.folder, name))
+        return sorted(changed)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Reports .fit files whose size or mtime changed between scans of a folder."""
+
+    def __init__(self, folder, interval=2.0):
+        self.folder = str(folder)
+        self.interval = interval
+        self.seen = self._scan()
+
+    def _scan(self):
+        seen = {}
+        for path in fit_files(self.folder):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            seen[path] = (stat.st_mtime_ns, stat.st_size)
+        return seen
+
+    def changes(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        current = self._scan()
+        changed = [path for path, key in current.items() if self.seen.get(path) != key]
+        self.seen = current
+        return sorted(changed)
+
+    def close(self):
+        pass
+
+
+def open_watcher(folder, polling=False, interval=2.0):
+    """inotify where available, else polling."""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(folder)
+        except OSError as e:
+            print(f"Warning: inotify unavailable ({e}); polling every {interval:g}s instead")
+    return PollingWatcher(folder, interval)
+
+
+class Ingester:
+    """
+    Decodes queued files on a worker thread and stores their metrics in the cache.
+
+    The queue is bounded so a burst of new files holds the watcher back rather
+    than piling up. The thread owns the cache and catalog connections and
+    commits after every file, so reviews see results as soon as they're in.
+    """
+
+    def __init__(self, folder, profile=DEFAULT_PROFILE, queue_size=64):
+        self.folder = folder
+        self.profile = profile
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stopping = threading.Event()
+        self.stats = {'ingested': 0, 'current': 0, 'failed': 0}
+        self._thread = threading.Thread(target=self._run, name='ingest', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def offer(self, path):
+        """Queue a file; False if the queue is full."""
+        try:
+            self.queue.put_nowait(path)
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        cache = open_cache(self.folder, self.profile, shared=True)
+        catalog = open_catalog(self.folder, self.profile, shared=True)
+        try:
+            while True:
+                path = self.queue.get()
+                try:
+                    if path is None:
+                        return
+                    if not self.stopping.is_set():
+                        self.ingest(path, cache, catalog)
+                finally:
+                    self.queue.task_done()
+        finally:
+            for store in (cache, catalog):
+                if store is not None:
+                    store.close()
+
+    def ingest(self, path, cache, catalog=None):
+        try:
+            if all(store is None or store.is_current(path) for store in (cache, catalog)):
+                self.stats['current'] += 1
+                return
+            started = time.perf_counter()
+            ride_data, lap_data = extract_activity(FitActivity(path), cache, self.profile)
+            if cache is not None:
+                cache.commit()
+            if catalog is not None:
+                catalog.add(path, ride_data, ride_id(ride_data) if ride_data else None)
+                catalog.commit()
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            self.stats['failed'] += 1
+            print(f"Warning: Could not ingest {os.path.basename(path)}: {e}", flush=True)
+            return
+        self.stats['ingested'] += 1
+        summary = f"TSS {ride_data['tss']:.0f}, {len(lap_data)} laps" if ride_data else "no ride data"
+        print(f"Ingested {os.path.basename(path)}: {summary} "
+              f"({(time.perf_counter() - started) * 1000:.0f} ms)", flush=True)
+
+    def wait(self):
+        """Block until everything queued so far has been handled."""
+        self.queue.join()
+
+    def stop(self):
+        """Finish the file in progress, skip the rest of the queue and close the cache and catalog."""
+        self.stopping.set()
+        self.queue.put(None)
+        self._thread.join()
+
+    def format_stats(self):
+        return (f"Ingest: {self.stats['ingested']} decoded, {self.stats['current']} already cached, "
+                f"{self.stats['failed']} failed")
+
+
+def watch(watcher, ingester, settle, stop):
+    """
+    Feed settled files to the ingester until stop is set.
+
+    A file is settled once no change has been seen for `settle` seconds and it
+    holds all the data its FIT header announces; every new change restarts the
+    wait, so partial writes and copies in progress are never decoded.
+    """
+    pending = {}
+    for path in fit_files(ingester.folder):
+        pending[path] = (0.0, time.monotonic())
+
+    while not stop.is_set():
+        now = time.monotonic()
+        for path in watcher.changes(timeout=settle / 2 if pending else 1.0):
+            first_seen = pending.get(path, (now, now))[1]
+            pending[path] = (now, first_seen)
+
+        now = time.monotonic()
+        for path, (last_change, first_seen) in sorted(pending.items(), key=lambda item: item[1]):
+            if now - last_change < settle:
+                continue
+            if not fit_file_complete(path) and now - first_seen < MAX_SETTLE_WAIT:
+                if os.path.exists(path):
+                    continue
+            if not ingester.offer(path):
+                # Queue is full; the rest wait for the next round
+                break
+            del pending[path]
+
+
+def main():
+    args = parse_arguments()
+    if not Path(args.folder_path).is_dir():
+        print(f"Error: Folder {args.folder_path} does not exist")
+        sys.exit(1)
+
+    ingester = Ingester(args.folder_path, DEFAULT_PROFILE, args.queue_size)
+    ingester.start()
+
+    if args.once:
+        for path in sorted(fit_files(args.folder_path)):
+            if fit_file_complete(path):
+                ingester.queue.put(path)
+        ingester.wait()
+        ingester.stop()
+        print(ingester.format_stats())
+        return
+
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"\nReceived {signal.Signals(signum).name}, finishing the current file...", flush=True)
+        stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    watcher = open_watcher(args.folder_path, args.polling, args.poll_interval)
+    print(f"Watching {args.folder_path} ({type(watcher).__name__.replace('Watcher', '').lower()}); "
+          f"Ctrl-C to stop", flush=True)
+    try:
+        watch(watcher, ingester, args.settle, stop)
+    finally:
+        watcher.close()
+        ingester.stop()
+        print(ingester.format_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -5,16 +5,37 @@ Parses all .fit files for a given week and collects qualitative context via inte
 Outputs structured data for ChatGPT coaching review.
 """
 
-from fitparse import FitFile
-import pandas as pd
-import numpy as np
+from resident_worker import forward_to_worker
+forward_to_worker(__name__, __file__)
+
+from lazy_import import lazy_import
 from datetime import datetime, timedelta, date
 import sys
 import os
 import argparse
 from pathlib import Path
-from config import FTP, HRMAX
+from concurrent.futures import Future
+from athlete import DEFAULT_PROFILE
+from fit_loader import FitActivity, ensure_activity, load_fit_activity, peak_memory_mb
+from activity import lap_windows
+from activity_cache import ActivityCache
+from activity_catalog import ActivityCatalog
+from power_curve import power_curve, mean_max_power, DEFAULT_DURATIONS
+from power_bests import PowerBestsStore, BESTS_DURATIONS, ALL_TIME
+from training_load import TrainingLoadStore
+from zones import zone_time
+import sqlite3
 import json
+from tracing import TRACER, span, count, session
+from report_output import add_output_arguments, report
+
+np = lazy_import('numpy')
+
+# Report periods: the weekly review, or catalog reports over a month, a year or any range
+PERIODS = ('week', 'month', 'year', 'range')
+
+# Days of training load listed one by one; longer ranges list their last days only
+DAILY_LOAD_DAYS = 7
 
 
 def parse_arguments():
@@ -29,16 +50,81 @@ def parse_arguments():
     parser.add_argument(
         '--start',
         type=str,
-        help='Start date (YYYY-MM-DD). Default: last Monday',
+        help='Start date (YYYY-MM-DD). Default: last Monday; for --period month/year, '
+             'any day of the month or year to report',
         default=None
     )
     parser.add_argument(
         '--end',
         type=str,
-        help='End date (YYYY-MM-DD). Default: last Sunday',
+        help='End date (YYYY-MM-DD). Default: last Sunday, or the end of the month/year',
+        default=None
+    )
+    parser.add_argument(
+        '--period',
+        choices=PERIODS,
+        help='week: the weekly review with interview; month, year (default: last complete month, '
+             'this year to date) or range (--start to --end): totals, weekly/monthly breakdown '
+             'and hardest rides from the activity catalog. Default: week',
+        default='week'
+    )
+    parser.add_argument(
+        '--top',
+        type=int,
+        help='Hardest rides listed in month/year/range reports. Default: 5',
+        default=5
+    )
+    parser.add_argument(
+        '--sport',
+        type=str,
+        help='Only report rides of this sport (e.g. cycling) in month/year/range reports',
+        default=None
+    )
+    parser.add_argument(
+        '--catalog-file',
+        type=str,
+        help='Ride summary catalog. Default: .activity_catalog.sqlite in the folder',
+        default=None
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Decode every .fit file instead of using the cache in the folder'
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        help='Number of worker processes for decoding .fit files (0 = one per CPU). Default: 1',
+        default=1
+    )
+    parser.add_argument(
+        '--bests-file',
+        type=str,
+        help='Season/all-time power bests store. Default: .power_bests.json in the folder',
+        default=None
+    )
+    parser.add_argument(
+        '--load-file',
+        type=str,
+        help='Daily TSS and CTL/ATL/TSB history. Default: .training_load.json in the folder',
         default=None
     )
-    return parser.parse_args()
+    add_output_arguments(parser, 'weekly_review')
+    parser.add_argument(
+        '--trace',
+        type=str,
+        help='Write per-stage timing spans and per-file counters to this Chrome trace file',
+        default=None
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Run under cProfile and tracemalloc and print the slowest functions and top allocation sites'
+    )
+    args = parser.parse_args()
+    if args.period == 'range' and not (args.start and args.end):
+        parser.error("--period range needs --start and --end")
+    return args
 
 
 def get_week_dates(start_date=None, end_date=None):
@@ -55,39 +141,72 @@ def get_week_dates(start_date=None, end_date=None):
            datetime.combine(last_sunday, datetime.max.time())
 
 
-def find_fit_files(folder_path, start_date, end_date):
-    """Find all .fit files in folder within date range."""
+def get_period_dates(period='week', start_date=None, end_date=None):
+    """
+    Get start and end dates for a report period.
+
+    A month or year is the one containing start_date, by default the last
+    complete month or the current year to date; end_date cuts it short.
+    """
+    if period == 'week':
+        return get_week_dates(start_date, end_date)
+    
+    start = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+    end = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    today = date.today()
+    if period == 'month':
+        if start is None:
+            start = (today.replace(day=1) - timedelta(days=1))
+        start = start.replace(day=1)
+        next_month = (start + timedelta(days=31)).replace(day=1)
+        end = end or next_month - timedelta(days=1)
+    elif period == 'year':
+        if start is None:
+            start, end = date(today.year, 1, 1), end or today
+        else:
+            start = date(start.year, 1, 1)
+            end = end or date(start.year, 12, 31)
+    elif start is None or end is None:
+        raise ValueError("A range needs both a start and an end date")
+    
+    return datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.max.time())
+
+
+def find_fit_activities(folder_path, start_date, end_date):
+    """Find all .fit files in folder within date range, opened for a single decode."""
     folder = Path(folder_path)
     if not folder.exists():
         print(f"Error: Folder {folder_path} does not exist")
         sys.exit(1)
     
-    fit_files = []
+    activities = []
     for file in folder.glob('*.fit'):
         try:
-            fitfile = FitFile(str(file))
-            # Get file timestamp from first record
-            for record in fitfile.get_messages('file_id'):
-                time_created = record.get_value('time_created')
-                if time_created:
-                    if start_date <= time_created <= end_date:
-                        fit_files.append(str(file))
-                    break
+            activity = FitActivity(file)
+            # Get file timestamp from first file_id record
+            time_created = activity.read_time_created()
+            if time_created and start_date <= time_created <= end_date:
+                activities.append(activity)
         except Exception as e:
             print(f"Warning: Could not read {file}: {e}")
             continue
     
-    return sorted(fit_files)
+    return sorted(activities, key=lambda a: a.filepath)
+
+
+def find_fit_files(folder_path, start_date, end_date):
+    """Find all .fit files in folder within date range."""
+    return [a.filepath for a in find_fit_activities(folder_path, start_date, end_date)]
 
 
-def extract_ride_data(filepath):
-    """Extract comprehensive ride-level metrics from a .fit file."""
-    fitfile = FitFile(filepath)
+def extract_ride_data(activity, profile=DEFAULT_PROFILE):
+    """Extract comprehensive ride-level metrics from a .fit file or decoded FitActivity."""
+    activity = ensure_activity(activity)
     
     # Get session data
     session_data = {}
-    for session in fitfile.get_messages('session'):
-        vals = session.get_values()
+    if activity.session:
+        vals = activity.session
         session_data = {
             'start_time': vals.get('start_time'),
             'total_elapsed_time': vals.get('total_elapsed_time', 0),
@@ -97,108 +216,98 @@ def extract_ride_data(filepath):
             'total_ascent': vals.get('total_ascent', 0),
             'sport': vals.get('sport', 'cycling'),
         }
-        break
     
     # Get record data for detailed metrics
-    records = []
-    for record in fitfile.get_messages('record'):
-        vals = record.get_values()
-        records.append({
-            'timestamp': vals.get('timestamp'),
-            'power': vals.get('power'),
-            'heart_rate': vals.get('heart_rate'),
-            'cadence': vals.get('cadence'),
-            'speed': vals.get('speed'),
-            'altitude': vals.get('altitude'),
-            'temperature': vals.get('temperature'),
-        })
-    
-    if not records:
+    if not activity.record_count:
         return None
     
-    df = pd.DataFrame(records)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df.set_index('timestamp')
-    
-    # Clean data
-    for col in ['power', 'heart_rate', 'cadence', 'speed']:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    df = df.dropna(subset=['power'])
-    
-    if df.empty:
+    # Metrics run on a uniform 1 Hz grid and only count seconds with power
+    records = activity.records.resample(profile.pauses).mask_missing('power')
+    if not records.has_values('power'):
         return None
     
+    power = records.values('power')
+    first_timestamp = records.start_time()
+    
     # Calculate metrics
     ride_data = {
-        'date': session_data['start_time'].date() if session_data.get('start_time') else df.index[0].date(),
-        'start_time': session_data.get('start_time', df.index[0]).strftime('%Y-%m-%d %H:%M'),
+        'date': session_data['start_time'].date() if session_data.get('start_time') else first_timestamp.date(),
+        'start_time': session_data.get('start_time', first_timestamp).strftime('%Y-%m-%d %H:%M'),
         'duration_seconds': session_data.get('total_timer_time', 0),
         'distance_m': session_data.get('total_distance', 0),
         'elevation_gain_m': session_data.get('total_ascent', 0),
         'calories': session_data.get('total_calories', 0),
+        'sport': session_data.get('sport') or 'cycling',
     }
     
+    # FTP in effect on the day of the ride
+    ftp = profile.ftp_on(ride_data['date'])
+    
     # Power metrics
-    if 'power' in df.columns and not df['power'].isna().all():
-        ride_data['avg_power'] = df['power'].mean()
-        ride_data['max_power'] = df['power'].max()
-        ride_data['normalized_power'] = (df['power'] ** 4).mean() ** 0.25
-        ride_data['intensity_factor'] = ride_data['normalized_power'] / FTP
-        ride_data['tss'] = (ride_data['duration_seconds'] * (ride_data['normalized_power'] ** 2)) / (FTP ** 2 * 3600) * 100
+    if records.count('power'):
+        ride_data['avg_power'] = records.mean('power')
+        ride_data['max_power'] = records.max('power')
+        ride_data['normalized_power'] = records.normalized_power()
+        ride_data['intensity_factor'] = ride_data['normalized_power'] / ftp
+        ride_data['tss'] = (ride_data['duration_seconds'] * (ride_data['normalized_power'] ** 2)) / (ftp ** 2 * 3600) * 100
+        ride_data['power_curve'] = power_curve(power)
+        ride_data['mean_max_power'] = mean_max_power(power, BESTS_DURATIONS)
     else:
         ride_data['avg_power'] = 0
         ride_data['max_power'] = 0
         ride_data['normalized_power'] = 0
         ride_data['intensity_factor'] = 0
         ride_data['tss'] = 0
+        ride_data['power_curve'] = {}
+        ride_data['mean_max_power'] = None
     
     # Heart rate metrics
-    if 'heart_rate' in df.columns and not df['heart_rate'].isna().all():
-        ride_data['avg_hr'] = df['heart_rate'].mean()
-        ride_data['max_hr'] = df['heart_rate'].max()
+    if records.count('heart_rate'):
+        ride_data['avg_hr'] = records.mean('heart_rate')
+        ride_data['max_hr'] = records.max('heart_rate')
         
         # Calculate HR drift
-        midpoint = len(df) // 2
-        first_half_hr = df['heart_rate'].iloc[:midpoint].mean()
-        second_half_hr = df['heart_rate'].iloc[midpoint:].mean()
-        if first_half_hr > 0:
-            ride_data['hr_drift'] = ((second_half_hr - first_half_hr) / first_half_hr) * 100
-        else:
-            ride_data['hr_drift'] = 0
+        hr_drift = records.hr_drift()
+        ride_data['hr_drift'] = hr_drift if not np.isnan(hr_drift) else 0
     else:
         ride_data['avg_hr'] = 0
         ride_data['max_hr'] = 0
         ride_data['hr_drift'] = 0
     
+    # Minutes in each HR and power zone
+    ride_data['power_zones'] = zone_time(records.power, profile.power_zones, ftp)
+    if records.count('heart_rate'):
+        ride_data['hr_zones'] = zone_time(records.heart_rate, profile.hr_zones, profile.hrmax)
+    else:
+        ride_data['hr_zones'] = {}
+    
     # Speed and cadence
-    if 'speed' in df.columns and not df['speed'].isna().all():
-        ride_data['avg_speed_mps'] = df['speed'].mean()
+    if records.count('speed'):
+        ride_data['avg_speed_mps'] = records.mean('speed')
     else:
         ride_data['avg_speed_mps'] = 0
     
-    if 'cadence' in df.columns and not df['cadence'].isna().all():
-        ride_data['avg_cadence'] = df['cadence'].mean()
-        ride_data['max_cadence'] = df['cadence'].max()
+    if records.count('cadence'):
+        ride_data['avg_cadence'] = records.mean('cadence')
+        ride_data['max_cadence'] = records.max('cadence')
     else:
         ride_data['avg_cadence'] = 0
         ride_data['max_cadence'] = 0
     
     # Get ride name if available
-    ride_data['name'] = os.path.basename(filepath).replace('.fit', '')
+    ride_data['name'] = activity.name
     
     return ride_data
 
 
-def extract_lap_data(filepath):
-    """Extract lap-level metrics from a .fit file."""
-    fitfile = FitFile(filepath)
+def extract_lap_data(activity, profile=DEFAULT_PROFILE):
+    """Extract lap-level metrics from a .fit file or decoded FitActivity."""
+    activity = ensure_activity(activity)
+    ftp = profile.ftp_on(activity.session.get('start_time') or activity.time_created)
     
     # Get lap messages
     laps = []
-    for lap in fitfile.get_messages('lap'):
-        vals = lap.get_values()
+    for vals in activity.laps:
         lap_data = {
             'start_time': vals.get('start_time'),
             'total_elapsed_time': vals.get('total_elapsed_time', 0),
@@ -218,8 +327,8 @@ def extract_lap_data(filepath):
         
         # Calculate IF and TSS for lap
         if lap_data['normalized_power'] > 0:
-            lap_data['intensity_factor'] = lap_data['normalized_power'] / FTP
-            lap_data['tss'] = (lap_data['total_timer_time'] * (lap_data['normalized_power'] ** 2)) / (FTP ** 2 * 3600) * 100
+            lap_data['intensity_factor'] = lap_data['normalized_power'] / ftp
+            lap_data['tss'] = (lap_data['total_timer_time'] * (lap_data['normalized_power'] ** 2)) / (ftp ** 2 * 3600) * 100
         else:
             lap_data['intensity_factor'] = 0
             lap_data['tss'] = 0
@@ -228,33 +337,189 @@ def extract_lap_data(filepath):
     
     # If no normalized power in lap data, calculate from records
     if laps and all(lap['normalized_power'] == 0 for lap in laps):
-        records = []
-        for record in fitfile.get_messages('record'):
-            vals = record.get_values()
-            records.append({
-                'timestamp': vals.get('timestamp'),
-                'power': vals.get('power'),
-            })
-        
-        if records:
-            df = pd.DataFrame(records)
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.set_index('timestamp')
-            df['power'] = pd.to_numeric(df['power'], errors='coerce')
+        if activity.record_count:
+            records = activity.records.resample(profile.pauses).mask_missing('power')
+            starts, ends = lap_windows(laps)
             
-            for i, lap in enumerate(laps):
-                start_time = pd.to_datetime(lap['start_time'])
-                end_time = start_time + timedelta(seconds=lap['total_elapsed_time'])
-                
-                lap_df = df[(df.index >= start_time) & (df.index <= end_time)]
-                if not lap_df.empty and not lap_df['power'].isna().all():
-                    lap['normalized_power'] = (lap_df['power'] ** 4).mean() ** 0.25
-                    lap['intensity_factor'] = lap['normalized_power'] / FTP
-                    lap['tss'] = (lap['total_timer_time'] * (lap['normalized_power'] ** 2)) / (FTP ** 2 * 3600) * 100
+            # One searchsorted for all lap bounds, NP from a prefix sum of power^4
+            lo, hi = records.bounds(starts, ends)
+            np_power = records.range_summaries(lo, hi)['np_power']
+            
+            for lap, start, stop, lap_np in zip(laps, lo, hi, np_power):
+                if stop > start:
+                    lap['normalized_power'] = float(lap_np)
+                    lap['intensity_factor'] = lap['normalized_power'] / ftp
+                    lap['tss'] = (lap['total_timer_time'] * (lap['normalized_power'] ** 2)) / (ftp ** 2 * 3600) * 100
     
     return laps
 
 
+def lookup_cache(cache, filepath):
+    """cache.get() for a file, counted as a hit, recomputed (thresholds changed) or miss."""
+    with span('cache_lookup'):
+        cached = cache.get(filepath)
+    if cached is None:
+        count(filepath, cache='miss')
+    else:
+        count(filepath, cache='hit' if 'ride_data' in cached else 'recomputed')
+    return cached
+
+
+def extract_metrics(activity, profile=DEFAULT_PROFILE):
+    """Ride and lap data for a decoded (or to be decoded) activity."""
+    activity = ensure_activity(activity)
+    with span('ride_metrics'):
+        ride_data = extract_ride_data(activity, profile)
+    with span('lap_metrics'):
+        lap_data = extract_lap_data(activity, profile) if ride_data else []
+    return ride_data, lap_data
+
+
+def extract_activity(activity, cache=None, profile=DEFAULT_PROFILE):
+    """Extract ride and lap data for one activity, reusing cached results when possible."""
+    if cache is not None:
+        cached = lookup_cache(cache, activity.filepath)
+        if cached is not None:
+            if 'ride_data' in cached:
+                return cached['ride_data'], cached['lap_data']
+            # Thresholds changed; recompute from the cached decode
+            activity = cached['activity']
+    
+    ride_data, lap_data = extract_metrics(activity, profile)
+    
+    if cache is not None:
+        with span('cache_store'):
+            cache.put(activity, ride_data, lap_data)
+    
+    return ride_data, lap_data
+
+
+def process_fit_file(filepath, keep_activity=False, profile=DEFAULT_PROFILE, trace=False):
+    """
+    Decode and extract one .fit file; runs in a worker process.
+
+    Only the plain ride/lap dicts travel back to the parent, plus the decoded
+    activity when the parent needs it for the cache and the worker's spans
+    when the parent is tracing.
+    """
+    if trace:
+        TRACER.enable()
+    activity = load_fit_activity(filepath)
+    ride_data, lap_data = extract_metrics(activity, profile)
+    return ride_data, lap_data, (activity if keep_activity else None), (TRACER.drain() if trace else None)
+
+
+def jobs_count(jobs):
+    """Worker processes for a --jobs value (0 = one per CPU)."""
+    return jobs if jobs > 0 else (os.cpu_count() or 1)
+
+
+def submit_activities(activities, cache=None, pool=None, profile=DEFAULT_PROFILE):
+    """
+    Start extracting each activity; pass the result to gather_activities().
+
+    Cached results are looked up here in the parent. Without a pool everything
+    else is extracted in-process; with one, files still to decode are submitted
+    to it, so several callers can queue work on the same pool before waiting.
+    """
+    submitted = []
+    for activity in activities:
+        print(f"Processing: {os.path.basename(activity.filepath)}")
+        if pool is None:
+            submitted.append(extract_activity(activity, cache, profile))
+            continue
+        
+        cached = lookup_cache(cache, activity.filepath) if cache is not None else None
+        if cached is None:
+            submitted.append(pool.submit(process_fit_file, activity.filepath, cache is not None,
+                                         profile, TRACER.enabled))
+        elif 'ride_data' in cached:
+            submitted.append((cached['ride_data'], cached['lap_data']))
+        else:
+            # Thresholds changed; recomputing from the cached decode is cheap
+            ride_data, lap_data = extract_metrics(cached['activity'], profile)
+            with span('cache_store'):
+                cache.put(cached['activity'], ride_data, lap_data)
+            submitted.append((ride_data, lap_data))
+    return submitted
+
+
+def iter_activities(submitted, cache=None):
+    """Yield (ride_data, lap_data) for each submitted activity as it completes, in input order, caching new decodes."""
+    for item in submitted:
+        if isinstance(item, Future):
+            ride_data, lap_data, activity, trace = item.result()
+            TRACER.extend(trace)
+            if activity is not None:
+                cache.put(activity, ride_data, lap_data)
+            item = ride_data, lap_data
+        yield item
+
+
+def gather_activities(submitted, cache=None):
+    """(ride_data, lap_data) for each submitted activity, in input order, caching new decodes."""
+    return list(iter_activities(submitted, cache))
+
+
+def iter_extracted_activities(activities, cache=None, jobs=1, profile=DEFAULT_PROFILE):
+    """Yield (ride_data, lap_data) for each activity, in input order, as soon as it is extracted."""
+    jobs = jobs_count(jobs)
+    if jobs <= 1:
+        for activity in activities:
+            yield from iter_activities(submit_activities([activity], cache, profile=profile), cache)
+        return
+    
+    from concurrent.futures import ProcessPoolExecutor
+    # Worker processes are only started once a file actually needs decoding
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from iter_activities(submit_activities(activities, cache, pool, profile), cache)
+
+
+def extract_activities(activities, cache=None, jobs=1, profile=DEFAULT_PROFILE):
+    """Extract (ride_data, lap_data) for each activity, in input order."""
+    return list(iter_extracted_activities(activities, cache, jobs, profile))
+
+
+def open_cache(folder_path, profile=DEFAULT_PROFILE, shared=False):
+    """Open the activity cache for a folder, or return None if it can't be used."""
+    try:
+        return ActivityCache.for_folder(folder_path, profile.thresholds(), shared)
+    except sqlite3.Error as e:
+        print(f"Warning: Could not open cache in {folder_path}: {e}")
+        return None
+
+
+def open_catalog(folder_path, profile=DEFAULT_PROFILE, catalog_file=None, shared=False):
+    """Open the ride catalog of a folder (or catalog_file), or return None if it can't be used."""
+    athlete = profile.name or Path(folder_path).resolve().name
+    try:
+        if catalog_file:
+            return ActivityCatalog(catalog_file, profile.thresholds(), athlete, shared)
+        return ActivityCatalog.for_folder(folder_path, profile.thresholds(), athlete, shared)
+    except sqlite3.Error as e:
+        print(f"Warning: Could not open catalog in {folder_path}: {e}")
+        return None
+
+
+def catalog_rides(catalog, activities, results):
+    """Pass (ride_data, lap_data) pairs through, adding each ride to the catalog as it arrives."""
+    for activity, (ride_data, lap_data) in zip(activities, results):
+        catalog.add(activity.filepath, ride_data, ride_id(ride_data) if ride_data else None)
+        yield ride_data, lap_data
+
+
+def sync_catalog(catalog, folder_path, cache=None, jobs=1, profile=DEFAULT_PROFILE):
+    """
+    Bring the catalog up to date with a folder: files that are new, changed or
+    were summarized with other thresholds are extracted (through the cache) and
+    added, files that are gone are dropped. Up-to-date files are only stat'ed.
+    """
+    activities = [FitActivity(path) for path in catalog.stale_files(folder_path)]
+    for _ in catalog_rides(catalog, activities, iter_extracted_activities(activities, cache, jobs, profile)):
+        pass
+    return len(activities)
+
+
 def calculate_weekly_aggregates(rides):
     """Calculate weekly aggregate metrics."""
     if not rides:
@@ -282,6 +547,102 @@ def calculate_weekly_aggregates(rides):
     return aggregates
 
 
+def ride_id(ride):
+    """Identifier for a ride in the power bests store."""
+    return f"{ride['start_time']} {ride['name']}"
+
+
+def update_power_bests(store, rides):
+    """Merge each ride's mean-max power into the store and return bests set by these rides."""
+    for ride in sorted(rides, key=lambda x: x['start_time']):
+        if ride.get('mean_max_power') is not None:
+            store.update(ride_id(ride), ride['date'], ride['mean_max_power'])
+    return store.bests_set_by([ride_id(r) for r in rides], DEFAULT_DURATIONS)
+
+
+def update_training_load(store, rides, start_date, end_date):
+    """
+    Add each ride's TSS to the load history and return the day-by-day load for
+    the week, stopping at today (or the last ride, if later) so no load is
+    projected into days that haven't happened.
+    """
+    for ride in rides:
+        store.add_ride(ride_id(ride), ride['date'], ride['tss'])
+    last_day = max(date.today(), *store.daily_tss)
+    # Include the day before so the week's change in fitness can be reported
+    return store.series(start_date.date() - timedelta(days=1), min(end_date.date(), last_day))
+
+
+def collect_rides(results):
+    """Split extracted (ride_data, lap_data) pairs into rides and laps keyed by ride start time."""
+    rides = []
+    laps_by_ride = {}
+    for ride_data, lap_data in results:
+        if ride_data:
+            rides.append(ride_data)
+            if lap_data:
+                laps_by_ride[ride_data['start_time']] = lap_data
+    return rides, laps_by_ride
+
+
+def write_rides(writer, results):
+    """Pass (ride_data, lap_data) pairs through, writing each ride and its laps as records as they arrive."""
+    for ride_data, lap_data in results:
+        if ride_data:
+            rid = ride_id(ride_data)
+            writer.write('rides', {'ride_id': rid, **ride_data})
+            for number, lap in enumerate(lap_data, 1):
+                writer.write('laps', {'ride_id': rid, 'lap': number, **lap})
+        yield ride_data, lap_data
+
+
+def write_week(writer, start_date, end_date, aggregates, power_bests, training_load):
+    """Write the week's aggregates, new power bests and daily training load as records."""
+    writer.write('week', {'start_date': start_date.date(), 'end_date': end_date.date(), **aggregates})
+    for scope, entries in power_bests.items():
+        for duration, watts, rid in entries:
+            writer.write('power_bests', {'scope': scope, 'duration_s': duration, 'watts': watts, 'ride_id': rid})
+    for day in training_load:
+        writer.write('training_load', day)
+
+
+def summarize_week(folder_path, rides, start_date, end_date, bests_file=None, load_file=None):
+    """
+    Weekly aggregates, plus the week's new power bests and training load.
+
+    The power bests and training load stores (in the folder unless given) are
+    updated with the week's rides and saved. Returns (aggregates, power_bests,
+    training_load).
+    """
+    aggregates = calculate_weekly_aggregates(rides)
+    
+    # Update season and all-time power bests
+    bests_store = PowerBestsStore(bests_file) if bests_file else PowerBestsStore.for_folder(folder_path)
+    power_bests = update_power_bests(bests_store, rides)
+    bests_store.save()
+    
+    # Update the fitness/fatigue model with this week's rides
+    load_store = TrainingLoadStore(load_file) if load_file else TrainingLoadStore.for_folder(folder_path)
+    training_load = update_training_load(load_store, rides, start_date, end_date)
+    load_store.save()
+    
+    return aggregates, power_bests, training_load
+
+
+INTERVIEW_QUESTIONS = [
+    ("overall_feel", "How did you feel about your training week?"),
+    ("fatigue", "How would you rate your fatigue (1-10)?"),
+    ("form_fitness", "Did you feel stronger or weaker compared to last week?"),
+    ("highlights", "What was your best ride or workout and why?"),
+    ("struggles", "Any rides you found unexpectedly hard? Why?"),
+    ("recovery", "How was your sleep, nutrition, and recovery?"),
+    ("external_factors", "Any stress, illness, travel, or life events affecting training?"),
+    ("weather_conditions", "Did weather or environment play a role in performance?"),
+    ("equipment_notes", "Any bike, gear, or tech issues this week?"),
+    ("goals_checkin", "Did this week move you toward your long-term goals? Why or why not?"),
+]
+
+
 def conduct_interview():
     """Conduct the weekly review interview."""
     print("\n" + "="*60)
@@ -292,20 +653,7 @@ def conduct_interview():
     
     interview = {}
     
-    questions = [
-        ("overall_feel", "How did you feel about your training week?"),
-        ("fatigue", "How would you rate your fatigue (1-10)?"),
-        ("form_fitness", "Did you feel stronger or weaker compared to last week?"),
-        ("highlights", "What was your best ride or workout and why?"),
-        ("struggles", "Any rides you found unexpectedly hard? Why?"),
-        ("recovery", "How was your sleep, nutrition, and recovery?"),
-        ("external_factors", "Any stress, illness, travel, or life events affecting training?"),
-        ("weather_conditions", "Did weather or environment play a role in performance?"),
-        ("equipment_notes", "Any bike, gear, or tech issues this week?"),
-        ("goals_checkin", "Did this week move you toward your long-term goals? Why or why not?"),
-    ]
-    
-    for key, question in questions:
+    for key, question in INTERVIEW_QUESTIONS:
         print(f"\n{question}")
         answer = input("> ").strip()
         interview[key] = answer if answer else "No response"
@@ -313,6 +661,18 @@ def conduct_interview():
     return interview
 
 
+def load_interview(path=None):
+    """Interview answers from a JSON file of {question_key: answer}; unanswered questions get "No response"."""
+    answers = {}
+    if path:
+        with open(path) as f:
+            answers = json.load(f)
+    return {
+        key: str(answers[key]).strip() if str(answers.get(key) or '').strip() else "No response"
+        for key, _ in INTERVIEW_QUESTIONS
+    }
+
+
 def format_duration(seconds):
     """Format duration in seconds to hh:mm:ss or mm:ss."""
     if seconds < 3600:
@@ -324,7 +684,7 @@ def format_duration(seconds):
         return f"{hours}h {minutes:02d}m {secs:02d}s"
 
 
-def format_output(rides, laps_by_ride, aggregates, interview):
+def format_output(rides, laps_by_ride, aggregates, interview, power_bests=None, training_load=None):
     """Format all data as markdown for ChatGPT."""
     output = []
     output.append("```markdown")
@@ -359,6 +719,35 @@ def format_output(rides, laps_by_ride, aggregates, interview):
     
     output.append("")
     
+    # Fitness (CTL), fatigue (ATL) and form (TSB) over the week
+    if training_load and len(training_load) > 1:
+        before, days = training_load[0], training_load[1:]
+        last = days[-1]
+        change = "this week" if len(days) <= DAILY_LOAD_DAYS else f"since {days[0]['date']}"
+        output.append("## Training Load")
+        output.append(f"- Fitness (CTL): {last['ctl']:.1f} ({last['ctl'] - before['ctl']:+.1f} {change})")
+        output.append(f"- Fatigue (ATL): {last['atl']:.1f} ({last['atl'] - before['atl']:+.1f} {change})")
+        output.append(f"- Form (TSB): {last['tsb']:+.1f}")
+        if len(days) > DAILY_LOAD_DAYS:
+            output.append(f"- Last {DAILY_LOAD_DAYS} days:")
+        for day in days[-DAILY_LOAD_DAYS:]:
+            output.append(f"  - {day['date']:%a %Y-%m-%d}: TSS {day['tss']:.0f}, "
+                          f"CTL {day['ctl']:.1f}, ATL {day['atl']:.1f}, TSB {day['tsb']:+.1f}")
+        output.append("")
+    
+    # New season / all-time power bests
+    if power_bests:
+        rides_by_id = {ride_id(r): r for r in rides}
+        output.append("## New Power Bests")
+        for scope, entries in power_bests.items():
+            label = "All-Time" if scope == ALL_TIME else f"{scope} Season"
+            peaks = ", ".join(
+                f"{d}s {watts:.0f}W ({rides_by_id[source]['date']})"
+                for d, watts, source in entries
+            )
+            output.append(f"- {label}: {peaks}")
+        output.append("")
+    
     # Ride Details
     output.append("## Ride Details")
     
@@ -392,13 +781,23 @@ def format_output(rides, laps_by_ride, aggregates, interview):
         output.append(f"- Avg Cadence: {ride['avg_cadence']:.0f} rpm")
         output.append(f"- Max Cadence: {ride['max_cadence']:.0f} rpm")
         
+        if ride.get('power_curve'):
+            peaks = ", ".join(f"{d} {watts:.0f}W" for d, watts in ride['power_curve'].items())
+            output.append(f"- Power Curve: {peaks}")
+        
+        for label, key in (("Power Zones", 'power_zones'), ("HR Zones", 'hr_zones')):
+            minutes = ", ".join(f"{zone} {m:.0f} min" for zone, m in ride.get(key, {}).items() if m >= 0.5)
+            if minutes:
+                output.append(f"- {label}: {minutes}")
+        
         # Add laps if present
         ride_key = ride['start_time']
         if ride_key in laps_by_ride and laps_by_ride[ride_key]:
             output.append("")
             output.append("**Laps:**")
             for j, lap in enumerate(laps_by_ride[ride_key], 1):
-                lap_type = "Active" if lap['intensity'] == 'active' else lap['intensity'].title()
+                intensity = lap['intensity'] or 'active'
+                lap_type = "Active" if intensity == 'active' else intensity.title()
                 output.append(f"{j}. {lap_type} – {format_duration(lap['total_timer_time'])}, "
                             f"{lap['avg_power']:.0f}W avg, {lap['normalized_power']:.0f}W NP, "
                             f"IF {lap['intensity_factor']:.2f}, TSS {lap['tss']:.1f}, "
@@ -424,50 +823,151 @@ def format_output(rides, laps_by_ride, aggregates, interview):
     return "\n".join(output)
 
 
+def summarize_period(catalog, start_date, end_date, period, top=5, sport=None):
+    """
+    Totals, weekly totals (plus monthly ones beyond a single month) and the
+    hardest rides of a period, answered by the catalog without reading any files.
+    """
+    start, end = start_date.date(), end_date.date()
+    return {
+        'period': period,
+        'start_date': start,
+        'end_date': end,
+        'sport': sport,
+        'totals': catalog.totals(start, end, sport),
+        'months': catalog.totals_by('month', start, end, sport) if period != 'month' else [],
+        'weeks': catalog.totals_by('week', start, end, sport),
+        'top_rides': catalog.top_rides(start, end, top, sport),
+    }
+
+
+def write_period(writer, summary):
+    """Write a period's totals, monthly and weekly totals and hardest rides as records."""
+    writer.write('period', {key: summary[key] for key in ('period', 'start_date', 'end_date', 'sport')}
+                 | summary['totals'])
+    for month in summary['months']:
+        writer.write('months', month)
+    for week in summary['weeks']:
+        writer.write('weeks', week)
+    for rank, ride in enumerate(summary['top_rides'], 1):
+        writer.write('top_rides', {'rank': rank, **ride})
+
+
+def format_period_output(summary):
+    """Format a month, year or range report as markdown."""
+    totals = summary['totals']
+    title = {'month': "Monthly", 'year': "Yearly"}.get(summary['period'], "Period")
+    output = []
+    output.append("```markdown")
+    output.append(f"# {title} Cycling Review: {summary['start_date']} to {summary['end_date']}")
+    if summary['sport']:
+        output.append(f"Sport: {summary['sport']}")
+    output.append("")
+    
+    output.append("## Summary")
+    output.append(f"- Total Rides: {totals['rides']}")
+    output.append(f"- Total Time: {format_duration(totals['total_time_seconds'])}")
+    dist_km = totals['total_distance_m'] / 1000
+    output.append(f"- Total Distance: {dist_km:.1f} km ({dist_km * 0.621371:.1f} mi)")
+    output.append(f"- Total TSS: {totals['total_tss']:.0f}")
+    elev_m = totals['total_elevation_m']
+    output.append(f"- Elevation Gain: {elev_m:.0f} m ({elev_m * 3.28084:.0f} ft)")
+    output.append(f"- Average IF: {totals['avg_intensity_factor']:.2f}")
+    output.append("")
+    
+    for bucket, heading, label in (('months', "By Month", "Month"), ('weeks', "By Week", "Week of")):
+        if not summary[bucket]:
+            continue
+        output.append(f"## {heading}")
+        output.append(f"| {label} | Rides | Time | Distance | TSS | Avg IF |")
+        output.append("|---|---:|---:|---:|---:|---:|")
+        for row in summary[bucket]:
+            output.append(f"| {row[bucket[:-1]]} | {row['rides']} | {format_duration(row['total_time_seconds'])} | "
+                          f"{row['total_distance_m'] / 1000:.1f} km | {row['total_tss']:.0f} | "
+                          f"{row['avg_intensity_factor']:.2f} |")
+        output.append("")
+    
+    if summary['top_rides']:
+        output.append("## Hardest Rides")
+        for rank, ride in enumerate(summary['top_rides'], 1):
+            output.append(f"{rank}. {ride['date']} – {ride['name']}: {ride['tss']:.0f} TSS, "
+                          f"{format_duration(ride['duration_seconds'])}, "
+                          f"{ride['normalized_power']:.0f}W NP, IF {ride['intensity_factor']:.2f}")
+    
+    output.append("```")
+    
+    return "\n".join(output)
+
+
 def main():
     args = parse_arguments()
+    with session(args.trace, args.profile), report(args.output_format, args.output, 'weekly_review') as writer:
+        run_review(args, writer)
+
+
+def run_review(args, writer=None):
+    """The weekly review; with a writer, records are written to it instead of the interview and markdown."""
+    if args.period != 'week':
+        return run_period_report(args, writer)
     
     # Get date range
     start_date, end_date = get_week_dates(args.start, args.end)
     print(f"Analyzing rides from {start_date.date()} to {end_date.date()}")
     
     # Find .fit files
-    fit_files = find_fit_files(args.folder_path, start_date, end_date)
-    print(f"Found {len(fit_files)} .fit files in date range")
+    with span('scan'):
+        activities = find_fit_activities(args.folder_path, start_date, end_date)
+    print(f"Found {len(activities)} .fit files in date range")
     
-    if not fit_files:
+    if not activities:
         print("No .fit files found in the specified date range")
         sys.exit(0)
     
-    # Extract data from each file
-    rides = []
-    laps_by_ride = {}
-    
-    for filepath in fit_files:
-        print(f"Processing: {os.path.basename(filepath)}")
-        
-        # Extract ride data
-        ride_data = extract_ride_data(filepath)
-        if ride_data:
-            rides.append(ride_data)
-            
-            # Extract lap data
-            lap_data = extract_lap_data(filepath)
-            if lap_data:
-                laps_by_ride[ride_data['start_time']] = lap_data
+    # Extract data from each file, decoding it at most once
+    cache = None if args.no_cache else open_cache(args.folder_path)
+    catalog = open_catalog(args.folder_path, catalog_file=args.catalog_file)
+    with span('extract', files=len(activities)):
+        results = iter_extracted_activities(activities, cache, args.jobs)
+        if catalog is not None:
+            results = catalog_rides(catalog, activities, results)
+        if writer is not None:
+            results = write_rides(writer, results)
+        rides, laps_by_ride = collect_rides(results)
+    
+    if cache is not None:
+        print(cache.format_stats())
+        cache.close()
+    if catalog is not None:
+        catalog.close()
+    
+    peak_mb = peak_memory_mb()
+    if peak_mb is not None:
+        workers_mb = peak_memory_mb(children=True)
+        workers = f" (largest worker: {workers_mb:.1f} MB)" if workers_mb else ""
+        print(f"Peak memory: {peak_mb:.1f} MB{workers}")
     
     if not rides:
         print("No valid ride data found")
         sys.exit(0)
     
-    # Calculate weekly aggregates
-    aggregates = calculate_weekly_aggregates(rides)
+    # Weekly aggregates, power bests and training load
+    with span('summarize_week'):
+        aggregates, power_bests, training_load = summarize_week(
+            args.folder_path, rides, start_date, end_date, args.bests_file, args.load_file
+        )
+    
+    if writer is not None:
+        with span('format'):
+            write_week(writer, start_date, end_date, aggregates, power_bests, training_load)
+        return
     
     # Conduct interview
-    interview = conduct_interview()
+    with span('interview'):
+        interview = conduct_interview()
     
     # Format and output
-    output = format_output(rides, laps_by_ride, aggregates, interview)
+    with span('format'):
+        output = format_output(rides, laps_by_ride, aggregates, interview, power_bests, training_load)
     
     print("\n" + "="*60)
     print("WEEKLY REVIEW DATA (copy everything below)")
@@ -475,5 +975,48 @@ def main():
     print(output)
 
 
+def run_period_report(args, writer=None):
+    """A month, year or range report from the catalog, after adding any files it hasn't seen."""
+    start_date, end_date = get_period_dates(args.period, args.start, args.end)
+    print(f"Analyzing rides from {start_date.date()} to {end_date.date()}")
+    
+    if not Path(args.folder_path).is_dir():
+        print(f"Error: Folder {args.folder_path} does not exist")
+        sys.exit(1)
+    catalog = open_catalog(args.folder_path, catalog_file=args.catalog_file)
+    if catalog is None:
+        sys.exit(1)
+    
+    # Only new or changed files are extracted; the rest of the folder is just stat'ed
+    cache = None if args.no_cache else open_cache(args.folder_path)
+    with span('catalog_sync'):
+        sync_catalog(catalog, args.folder_path, cache, args.jobs)
+    if cache is not None:
+        print(cache.format_stats())
+        cache.close()
+    print(catalog.format_stats())
+    
+    with span('summarize_period'):
+        summary = summarize_period(catalog, start_date, end_date, args.period, args.top, args.sport)
+    catalog.close()
+    
+    if writer is not None:
+        with span('format'):
+            write_period(writer, summary)
+        return
+    
+    if not summary['totals']['rides']:
+        print("No rides found in the specified period")
+        sys.exit(0)
+    
+    with span('format'):
+        output = format_period_output(summary)
+    
+    print("\n" + "="*60)
+    print(f"{summary['period'].upper()} REVIEW DATA (copy everything below)")
+    print("="*60)
+    print(output)
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
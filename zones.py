@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Zone Time Engine
+Time-in-zone for heart rate and power with a single binning pass per channel
+instead of one boolean mask per zone.
+"""
+
+from lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+
+# Zones are {label: (low, high)} as fractions of HRMAX / FTP; low is inclusive, high exclusive.
+# Values falling between zones (e.g. 0.75-0.76 of FTP) aren't counted in any zone.
+HR_ZONES = {
+    'Z1 (<60%)': (0.0, 0.6),
+    'Z2 (60–70%)': (0.6, 0.7),
+    'Z3 (70–80%)': (0.7, 0.8),
+    'Z4 (80–90%)': (0.8, 0.9),
+    'Z5 (90–100%)': (0.9, 1.0),
+}
+
+POWER_ZONES = {
+    'Z1 (<55%)': (0.0, 0.55),
+    'Z2 (55–75%)': (0.55, 0.75),
+    'Z3 (76–90%)': (0.76, 0.90),
+    'Z4 (91–105%)': (0.91, 1.05),
+    'Z5 (106–120%)': (1.06, 1.20),
+    'Z6+ (>120%)': (1.20, float('inf')),
+}
+
+# Gaps between samples longer than this (seconds) are pauses, not riding time
+MAX_SAMPLE_GAP = 10
+
+
+def zone_lookup(zones):
+    """
+    Sorted bin edges for a set of zones and the zone index covering each bin.
+
+    Bin k spans [edges[k - 1], edges[k]); bin 0 and the last bin lie outside all
+    edges. Bins that fall in a gap between zones map to -1.
+    """
+    bounds = list(zones.values())
+    edges = np.array(sorted({b for bound in bounds for b in bound}), dtype=float)
+
+    lookup = np.full(len(edges) + 1, -1, dtype=int)
+    for k in range(1, len(edges)):
+        lo, hi = edges[k - 1], edges[k]
+        for i, (low, high) in enumerate(bounds):
+            if low <= lo and hi <= high:
+                lookup[k] = i
+                break
+    return edges, lookup
+
+
+def assign_zones(values, zones, scale=1.0):
+    """Zone index for every sample (-1 for NaN, out-of-range or in-gap values)."""
+    values = np.asarray(values, dtype=float) / scale
+    edges, lookup = zone_lookup(zones)
+    # side='right' puts a value equal to an edge in the bin that starts at that edge
+    bins = np.searchsorted(edges, values, side='right')
+    zone_idx = lookup[bins]
+    zone_idx[np.isnan(values)] = -1
+    return zone_idx
+
+
+def zone_time(values, zones, scale=1.0):
+    """
+    Minutes spent in each zone as {label: minutes}, rounded to 0.1.
+
+    Each sample counts as one second, so values should be on a 1 Hz grid (see Activity.resample).
+    """
+    return zone_minutes(assign_zones(values, zones, scale), zones)
+
+
+def zone_minutes(zone_idx, zones):
+    """zone_time() for precomputed zone indices, so they can be shared with zone_means()."""
+    counted = zone_idx >= 0
+    seconds = np.bincount(zone_idx[counted], minlength=len(zones))
+    return {label: round(float(s) / 60, 1) for label, s in zip(zones, seconds)}
+
+
+def zone_means(zone_idx, values, num_zones):
+    """Mean of values per zone for precomputed zone indices, NaN for empty zones."""
+    values = np.asarray(values, dtype=float)
+    counted = (zone_idx >= 0) & ~np.isnan(values)
+    sums = np.bincount(zone_idx[counted], weights=values[counted], minlength=num_zones)
+    counts = np.bincount(zone_idx[counted], minlength=num_zones)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts